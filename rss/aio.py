@@ -0,0 +1,180 @@
+""" Asyncio reads of zarr arrays.
+
+    zarr reads are synchronous. Here the chunks covering a selection are
+    fetched concurrently: straight from the async filesystem when the store
+    is an fsspec mapping over one (e.g. s3fs), from a thread otherwise. A
+    mounted rss.cache.SharedLRUCache or SharedMemoryCache is consulted with
+    peek, which never waits on the event loop for a chunk another process is
+    fetching, and filled on the way. A zarr.LRUStoreCache, the default of
+    the clients, is probed and filled under its own lock in the same way.
+    Chunks are decompressed in the default executor so the event loop stays
+    free.
+"""
+import asyncio
+import itertools
+import sys
+
+import numpy as np
+import zarr
+from zarr.storage import KVStore
+
+from rss.cache import CachedStore, CoalescingStore, lru_fill, lru_peek
+
+
+def _normalize(selection, shape):
+    """ Selection of ints and unit step slices as per axis (start, stop) and squeeze flags. """
+    if not isinstance(selection, tuple):
+        selection = (selection,)
+    selection = selection + (slice(None),) * (len(shape) - len(selection))
+
+    ranges, squeeze = [], []
+    for sel, n in zip(selection, shape):
+        if isinstance(sel, slice):
+            start, stop, step = sel.indices(n)
+            if step != 1:
+                raise RuntimeError("strided selections are not supported.")
+            ranges.append((start, max(start, stop)))
+            squeeze.append(False)
+        else:
+            index = int(sel)
+            if index < 0:
+                index += n
+            if index < 0 or index >= n:
+                raise IndexError(f"index {sel} out of bounds for axis of size {n}.")
+            ranges.append((index, index + 1))
+            squeeze.append(True)
+    return ranges, squeeze
+
+
+def chunk_key(array, coords):
+    """ The store key of a chunk of a zarr array. """
+    separator = getattr(array, "_dimension_separator", None) or "."
+    prefix = f"{array.path}/" if array.path else ""
+    return prefix + separator.join(str(i) for i in coords)
+
+
+def decode_chunk(array, data):
+    """ Decompress the bytes of a stored chunk, None gives the fill value. """
+    if data is None:
+        return np.full(array.chunks, array.fill_value, dtype=array.dtype)
+    if array.compressor is not None:
+        data = array.compressor.decode(data)
+    for codec in reversed(array.filters or []):
+        data = codec.decode(data)
+    return np.frombuffer(data, dtype=array.dtype).reshape(
+        array.chunks, order=array.order
+    )
+
+
+def _async_mapping(store):
+    """ The fsspec mapping under the cache layers, if its filesystem is async. """
+    base = store
+    while True:
+        if isinstance(base, KVStore):
+            base = base._mutable_mapping
+        elif isinstance(base, (CachedStore, CoalescingStore, zarr.LRUStoreCache)):
+            base = base._store
+        else:
+            break
+    # an fsspec mapping means fsspec is loaded already, don't import it for local stores
+    fsspec_mapping = sys.modules.get("fsspec.mapping")
+    if fsspec_mapping is None:
+        return None
+    if isinstance(base, fsspec_mapping.FSMap) and getattr(base.fs, "async_impl", False):
+        return base
+    return None
+
+
+def _from_cache(store, key):
+    if isinstance(store, CachedStore):
+        try:
+            # get could wait for another process, and claims what it misses
+            return store.cache.peek(store.name, key)
+        except KeyError:
+            return None
+    if isinstance(store, zarr.LRUStoreCache):
+        try:
+            return lru_peek(store, key)
+        except KeyError:
+            return None
+    return None
+
+
+def _to_cache(store, key, value):
+    if isinstance(store, CachedStore):
+        store.cache.count_miss()
+        store.cache.put(store.name, key, value)
+    elif isinstance(store, zarr.LRUStoreCache):
+        lru_fill(store, key, value)
+
+
+async def aget(store, key):
+    """ Fetch the bytes of one key, None if it is not stored. """
+    value = _from_cache(store, key)
+    if value is not None:
+        return value
+
+    mapping = _async_mapping(store)
+    if mapping is not None:
+        # s3fs coroutines belong to the filesystem's own loop
+        future = asyncio.run_coroutine_threadsafe(
+            mapping.fs._cat_file(mapping._key_to_str(key)), mapping.fs.loop
+        )
+        try:
+            value = await asyncio.wrap_future(future)
+        except FileNotFoundError:
+            # peek claims nothing, a failure leaves nothing to release
+            return None
+        _to_cache(store, key, value)
+        return value
+
+    loop = asyncio.get_running_loop()
+    try:
+        # the cache layers fill themselves on this path
+        return await loop.run_in_executor(None, store.__getitem__, key)
+    except KeyError:
+        return None
+
+
+async def aread(array, selection):
+    """
+    Read a selection of a zarr array, fetching every chunk concurrently.
+
+    Parameters
+    ----------
+    array : zarr.Array.
+    selection : tuple of ints and unit step slices.
+
+    Returns
+    -------
+    data : numpy array, as array[selection] would return.
+    """
+    ranges, squeeze = _normalize(selection, array.shape)
+    out = np.empty([stop - start for start, stop in ranges], dtype=array.dtype)
+
+    grid = [
+        range(start // size, -(-stop // size)) if stop > start else range(0)
+        for (start, stop), size in zip(ranges, array.chunks)
+    ]
+    chunks = list(itertools.product(*grid))
+
+    store = array.chunk_store
+    values = await asyncio.gather(
+        *[aget(store, chunk_key(array, coords)) for coords in chunks]
+    )
+
+    loop = asyncio.get_running_loop()
+    decoded = await asyncio.gather(
+        *[loop.run_in_executor(None, decode_chunk, array, value) for value in values]
+    )
+
+    for coords, chunk in zip(chunks, decoded):
+        chunk_selection, out_selection = [], []
+        for k, (start, stop), size in zip(coords, ranges, array.chunks):
+            lo = max(start, k * size)
+            hi = min(stop, (k + 1) * size)
+            chunk_selection.append(slice(lo - k * size, hi - k * size))
+            out_selection.append(slice(lo - start, hi - start))
+        out[tuple(out_selection)] = chunk[tuple(chunk_selection)]
+
+    return out[tuple(0 if s else slice(None) for s in squeeze)]
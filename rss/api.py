@@ -1,16 +1,18 @@
 from collections import defaultdict
-import ebcdic
 from itertools import chain
 from glob import glob
-from ibm2ieee import ibm2float32
+import io
 import json
 from numcodecs import LZ4
 import numpy as np
 import os
 import struct
-import tqdm
 import zarr
 
+from rss.profile import stage
+from rss.segy import (decode_traces, decode_samples, sample_dtype, sample_dtypes,
+                      trace_header_fields, unpack_headers)
+
 # SEGY definitions
 headers_offset = 3600
 trace_header_size = 240
@@ -18,6 +20,10 @@ size_of_float = 4
 
 segy_units = {0: "unknown", 1: "meters", 2: "feet"}
 
+# the 240 byte trace headers staged by read_trace_data, and traces per chunk of the stored columns
+staged_headers = "trace_headers.bin"
+headers_chunk_size = 65536
+
 segy_format = {
     1: "4-byte IBM floating-point",
     2: "4-byte, twos complement integer",
@@ -38,10 +44,20 @@ byte_locations = {
 }
 apply_spatial_scalar_to = ["cdpx", "cdpy"]
 
+# offset, or angle, of the traces of prestack gathers
+offset_location = (37, 4, ">i")
+
 # default compression
 compressor = LZ4()
 
 
+def _progress_bar(*args, **kwargs):
+    """ tqdm.tqdm, imported on first use so readers of rss.api don't pay for it. """
+    import tqdm
+
+    return tqdm.tqdm(*args, **kwargs)
+
+
 def parse_ebcdic(segy_file):
     with open(segy_file, "rb") as fp:
         ebcdic_bytes = fp.read(3200).decode("cp1140")
@@ -56,16 +72,26 @@ def parse_binary_header(segy_file):
         fp.seek(3200)
         binary_header = fp.read(400)
 
-    sample_rate_ms = struct.unpack(">H", binary_header[16:18])[0] / 1000.0
-    ns = struct.unpack(">H", binary_header[20:22])[0]
+    # little-endian files show up as an unknown format code
+    byteorder = ">"
     float_format = struct.unpack(">H", binary_header[24:26])[0]
-    spatial_units = struct.unpack(">H", binary_header[54:56])[0]
+    if float_format not in segy_format:
+        swapped = struct.unpack("<H", binary_header[24:26])[0]
+        if swapped in segy_format:
+            byteorder, float_format = "<", swapped
+
+    def unpack(start):
+        return struct.unpack(f"{byteorder}H", binary_header[start : start + 2])[0]
 
-    if float_format not in (1, 5):
-        fmt = segy_format[float_format]
+    sample_rate_ms = unpack(16) / 1000.0
+    ns = unpack(20)
+    spatial_units = unpack(54)
+
+    if float_format not in sample_dtypes:
+        fmt = segy_format.get(float_format, float_format)
         raise RuntimeError(f"binary format {fmt} not supported.")
 
-    size_of_trace = ns * 4 + 240
+    size_of_trace = ns * sample_dtype(float_format).itemsize + 240
 
     file_size = os.path.getsize(segy_file)
 
@@ -76,9 +102,18 @@ def parse_binary_header(segy_file):
         "sample_rate_ms": sample_rate_ms,
         "ns": ns,
         "float_format": float_format,
-        "units": segy_units[spatial_units],
+        "units": segy_units.get(spatial_units, "unknown"),
         "size_of_trace": size_of_trace,
         "num_traces": (file_size - 3600) // size_of_trace,
+        "byteorder": byteorder,
+    }
+
+
+def with_byteorder(byte_locations, byteorder):
+    """ byte_locations with the struct formats in the given byte order. """
+    return {
+        key: (val[0], val[1], byteorder + val[2].lstrip("<>!=@"))
+        for key, val in byte_locations.items()
     }
 
 
@@ -114,19 +149,101 @@ def parse_header(trace_as_bytes,
     return hdr
 
 
-def parse_trace(trace_as_bytes, binary_format, override_byteswap=False):
+def parse_trace(trace_as_bytes, binary_format, override_byteswap=False, byteorder=">"):
+    """
+    Decode the samples of one trace to float32, see rss.segy.decode_traces
+    for blocks of traces. override_byteswap reads little-endian samples.
+    """
+    if override_byteswap:
+        byteorder = "<"
+    if binary_format not in sample_dtypes:
+        fmt = segy_format.get(binary_format, binary_format)
+        raise RuntimeError(f"binary format {fmt} not supported.")
+
     trace_data = trace_as_bytes[trace_header_size:]
+    ns = len(trace_data) // sample_dtype(binary_format).itemsize
+    return decode_samples(trace_data, binary_format, ns, byteorder)[0]
 
-    if binary_format == 1:
-        trace_data = ibm2float32(np.frombuffer(trace_data, dtype=">u4"))
-    elif binary_format == 5:
-        trace_data = np.frombuffer(trace_data, dtype=">f")
-        if not override_byteswap:
-            trace_data = trace_data.byteswap()
-    else:
-        fmt = segy_format[float_format]
-        raise RuntimeError(f"binary format {fmt} not supported.")
-    return trace_data
+
+def read_blocks(segy_file, binary_header, traces_per_block=1024, byteorder=None,
+                profiler=None):
+    """
+    Iterate over a SEGY file in blocks of traces, decoding all their samples at once.
+    The read and decode stages are timed by the optional rss.profile.StageProfiler.
+
+    Yields
+    ------
+    start : int, index of the first trace of the block.
+    raw : memoryview of the bytes of the whole traces in the block.
+    traces : float32 array (n_traces, ns) of the block.
+    """
+    if byteorder is None:
+        byteorder = binary_header.get("byteorder", ">")
+
+    trace_size = binary_header["size_of_trace"]
+    num_traces = binary_header["num_traces"]
+
+    with open(segy_file, "rb") as fp:
+        fp.seek(3600)
+        for start in range(0, num_traces, traces_per_block):
+            count = min(traces_per_block, num_traces - start)
+            with stage(profiler, "read", bytes_out=count * trace_size):
+                raw = fp.read(count * trace_size)
+            with stage(profiler, "decode", bytes_in=len(raw)) as decode:
+                traces = decode_traces(
+                    raw, binary_header["float_format"], binary_header["ns"], byteorder
+                )
+                decode.bytes_out = traces.nbytes
+            yield start, memoryview(raw), traces
+
+
+def _stage_headers(fp, raw, trace_size, profiler=None):
+    """ Append the trace headers of a block of raw traces to the staging file. """
+    with stage(profiler, "stage", bytes_out=len(raw) // trace_size * trace_header_size):
+        block = np.frombuffer(raw, dtype=np.uint8).reshape(-1, trace_size)
+        block[:, :trace_header_size].tofile(fp)
+
+
+def write_headers(root, filename, byteorder=">", chunk_size=headers_chunk_size,
+                  append=False, fields=trace_header_fields):
+    """
+    Store the trace headers staged by read_trace_data as a compressed column
+    per standard field (rss.segy.trace_header_fields) in root['headers'],
+    chunked by trace and in file order like the coords.
+
+    Parameters
+    ----------
+    root : writable zarr group.
+    filename : the staging folder of read_trace_data.
+    byteorder : '>' for big-endian or '<' for little-endian headers.
+    chunk_size : int, traces per chunk.
+    append : bool, add the staged traces after the stored ones.
+    fields : dict of field name to (1-based byte, type), the columns to store.
+
+    Returns
+    -------
+    num_traces : int, the number of traces written.
+    """
+    path = os.path.join(filename, staged_headers)
+    num_traces = os.path.getsize(path) // trace_header_size
+    if num_traces:
+        staged = np.memmap(path, dtype=np.uint8, mode="r", shape=(num_traces, trace_header_size))
+
+    headers = root.require_group("headers")
+    first = 0
+    for name, (byte, fmt) in fields.items():
+        if append:
+            first = headers[name].shape[0]
+            headers[name].resize(first + num_traces)
+        else:
+            headers.zeros(name, shape=num_traces, chunks=chunk_size, dtype=fmt,
+                          compressor=compressor, overwrite=True)
+
+    for start in range(0, num_traces, chunk_size):
+        columns = unpack_headers(staged[start : start + chunk_size], fields, byteorder)
+        for name, column in columns.items():
+            headers[name][first + start : first + start + len(column)] = column
+    return num_traces
 
 
 def read_trace_data(
@@ -136,14 +253,27 @@ def read_trace_data(
     apply_spatial_scalar_to=apply_spatial_scalar_to,
     scalco=None,
     sort_order="inline",
+    profiler=None,
+    offset_location=offset_location,
 ):
+    """
+    Stage the traces of a SEGY file by line for compressed_zarr.
+
+    The 'gather' sort order stages prestack traces by inline with the
+    crossline and offset of every trace, read from the header at
+    offset_location (byte, length, format), e.g. (37, 4, '>i') for the
+    source-receiver offset or another byte holding the angle.
+    """
     sort_order = sort_order.lower()
-    if sort_order not in ("inline", "crossline"):
+    if sort_order not in ("inline", "crossline", "gather"):
         raise RuntimeError(
-            f"{sort_order} not supported, sort order should be on of inline or crossline."
+            f"{sort_order} not supported, sort order should be on of inline, crossline or gather."
         )
 
-    if sort_order == "inline":
+    if sort_order == "gather":
+        byte_locations = dict(byte_locations, offset=offset_location)
+        orthogonal_line = "crossline"
+    elif sort_order == "inline":
         orthogonal_line = "crossline"
     else:
         orthogonal_line = "inline"
@@ -167,26 +297,35 @@ def read_trace_data(
     cdpx = np.zeros(binary_header["num_traces"], dtype=int)
     cdpy = np.zeros(binary_header["num_traces"], dtype=int)
 
-    with open(segy_file, "rb") as fp:
-        fp.seek(3600)
-        for trac in tqdm.tqdm(range(0, binary_header["num_traces"])):
-            raw_bytes = fp.read(binary_header["size_of_trace"])
-
-            hdr = parse_header(raw_bytes, 
-                               scalco, 
-                               byte_locations=byte_locations,
-                               apply_spatial_scalar_to=apply_spatial_scalar_to)
-            
-            trace = parse_trace(raw_bytes, binary_header["float_format"])
-
-            # Dumbest possible impl
-            line_number = hdr[sort_order]
-            folder = os.path.join(filename, f"{sort_order}s", f"{line_number}")
-            if not os.path.exists(folder):
-                os.makedirs(folder)
-            with open(os.path.join(folder, "traces.bin"), "ba") as gp:
-                trace.tofile(gp)
-            line_coords[hdr[sort_order]].append(hdr[orthogonal_line])
+    byte_locations = with_byteorder(byte_locations, binary_header.get("byteorder", ">"))
+
+    headers_fp = open(os.path.join(filename, staged_headers), "wb")
+    progress = _progress_bar(total=binary_header["num_traces"])
+    for start, raw, traces in read_blocks(segy_file, binary_header, profiler=profiler):
+        progress.update(len(traces))
+        _stage_headers(headers_fp, raw, trace_size, profiler)
+        for i, trace in enumerate(traces):
+            trac = start + i
+            raw_bytes = raw[i * trace_size : (i + 1) * trace_size]
+
+            with stage(profiler, "headers", bytes_in=trace_header_size):
+                hdr = parse_header(raw_bytes, 
+                                   scalco, 
+                                   byte_locations=byte_locations,
+                                   apply_spatial_scalar_to=apply_spatial_scalar_to)
+
+            # Dumbest possible impl, gathers are staged by inline
+            line_number = hdr["inline" if sort_order == "gather" else sort_order]
+            with stage(profiler, "stage", bytes_out=trace.nbytes):
+                folder = os.path.join(filename, f"{sort_order}s", f"{line_number}")
+                if not os.path.exists(folder):
+                    os.makedirs(folder)
+                with open(os.path.join(folder, "traces.bin"), "ba") as gp:
+                    trace.tofile(gp)
+            if sort_order == "gather":
+                line_coords[line_number].append((hdr["crossline"], hdr["offset"]))
+            else:
+                line_coords[line_number].append(hdr[orthogonal_line])
 
             # save all the inlines
             inlines[trac] = hdr["inline"]
@@ -194,6 +333,8 @@ def read_trace_data(
 
             cdpx[trac] = hdr["cdpx"]
             cdpy[trac] = hdr["cdpy"]
+    progress.close()
+    headers_fp.close()
 
     np.save(os.path.join(filename, "inlines.npy"), inlines)
     np.save(os.path.join(filename, "crosslines.npy"), crosslines)
@@ -201,6 +342,13 @@ def read_trace_data(
     np.save(os.path.join(filename, "cdpx.npy"), cdpx)
     np.save(os.path.join(filename, "cdpy.npy"), cdpy)
 
+    if sort_order == "gather":
+        # the crossline and offset of every staged trace
+        for key, val in line_coords.items():
+            np.save(os.path.join(filename, "gathers", f"{key}", "keys.npy"),
+                    np.array(val, dtype=np.int64))
+        return
+
     inlines = np.unique(inlines)
     crosslines = np.unique(crosslines)
 
@@ -234,7 +382,7 @@ def read_trace_data(
             valid_crosslines.tofile(gp)
 
 def read_trace_data_unstructured(segy_file, binary_header, 
-    byte_locations=byte_locations, override_byteswap=False):
+    byte_locations=byte_locations, override_byteswap=False, profiler=None):
     """ Read all the data in the file but dont assume structure."""
 
     filename = os.path.splitext(os.path.basename(segy_file))[0]
@@ -251,39 +399,299 @@ def read_trace_data_unstructured(segy_file, binary_header,
     header_values = {key : np.zeros(binary_header["num_traces"], dtype=int) for 
                         key in byte_locations.keys()}
 
-    with open(segy_file, "rb") as fp:
-        fp.seek(3600)
-        for trac in tqdm.tqdm(range(0, binary_header["num_traces"])):
-            raw_bytes = fp.read(binary_header["size_of_trace"])
+    byte_locations = with_byteorder(byte_locations, binary_header.get("byteorder", ">"))
+    byteorder = "<" if override_byteswap else binary_header.get("byteorder", ">")
 
-            hdr = parse_header(raw_bytes, 
-                               byte_locations=byte_locations, 
-                               apply_spatial_scalar_to=[])
+    headers_fp = open(os.path.join(filename, staged_headers), "wb")
+    progress = _progress_bar(total=binary_header["num_traces"])
+    for start, raw, traces in read_blocks(segy_file, binary_header, byteorder=byteorder,
+                                          profiler=profiler):
+        progress.update(len(traces))
+        _stage_headers(headers_fp, raw, trace_size, profiler)
+        for i, trace in enumerate(traces):
+            trac = start + i
+            raw_bytes = raw[i * trace_size : (i + 1) * trace_size]
+
+            with stage(profiler, "headers", bytes_in=trace_header_size):
+                hdr = parse_header(raw_bytes, 
+                                   byte_locations=byte_locations, 
+                                   apply_spatial_scalar_to=[])
 
-            trace = parse_trace(raw_bytes, binary_header["float_format"], 
-                                    override_byteswap=override_byteswap)
             # Dumbest possible impl
-            folder = os.path.join(filename, "data")
-            if not os.path.exists(folder):
-                os.makedirs(folder)
+            with stage(profiler, "stage", bytes_out=trace.nbytes):
+                folder = os.path.join(filename, "data")
+                if not os.path.exists(folder):
+                    os.makedirs(folder)
 
-            with open(os.path.join(folder, "traces.bin"), "ba") as gp:
-                trace.tofile(gp)
+                with open(os.path.join(folder, "traces.bin"), "ba") as gp:
+                    trace.tofile(gp)
 
             for key in header_values.keys():
                 header_values[key][trac] = hdr[key]
+    progress.close()
+    headers_fp.close()
 
     for key in header_values.keys():
         np.save(os.path.join(filename, f"{key}.npy"), header_values[key])
 
 
-def compressed_zarr(segy_file, sort_order="inline"):
+def quantize(traces, mask=None):
+    """
+    Quantize float data to uint16 over its dynamic range, zero is reserved
+    for padding.
+
+    Parameters
+    ----------
+    traces : float array.
+    mask : optional boolean array, True marks padding which is written as zero
+           and ignored when computing the dynamic range.
+
+    Returns
+    -------
+    traces : uint16 array in [1, 65535], or zero for padding.
+    scalers : tuple (min_val, max_val), invert with (q - 1) * max_val / (65535 - 1) + min_val.
+    """
+    traces = np.asarray(traces, dtype=np.float32)
+
+    live = traces if mask is None else traces[~mask]
+    if live.size == 0:
+        return np.zeros(traces.shape, dtype=np.uint16), (0.0, 0.0)
+
+    min_val = live.min()
+    traces = traces - min_val
+
+    max_val = (traces if mask is None else traces[~mask]).max()
+    if max_val != 0:
+        # could the entire line be zero?
+        traces = (65535 - 1) * traces / max_val
+
+    # zero isn't an invalid number
+    traces += 1
+
+    traces = traces.astype(np.uint16)
+    if mask is not None:
+        traces[mask] = 0
+    return traces, (float(min_val), float(max_val))
+
+
+def pack_live(inlines, crosslines):
+    """
+    A bitmap of the il/xl cells that hold a trace.
+
+    Parameters
+    ----------
+    inlines : int array, the inline of every trace.
+    crosslines : int array, the crossline of every trace.
+
+    Returns
+    -------
+    live : uint8 array (n_inlines, ceil(n_crosslines / 8)), bits packed along
+           the crosslines, see rss.client.unpack_live.
+    """
+    min_inline, min_crossline = inlines.min(), crosslines.min()
+    live = np.zeros(
+        (inlines.max() - min_inline + 1, crosslines.max() - min_crossline + 1),
+        dtype=bool,
+    )
+    live[inlines - min_inline, crosslines - min_crossline] = True
+    return np.packbits(live, axis=1)
+
+
+def consolidate(root):
+    """
+    Write the metadata of every group and array of a store into .zmetadata and
+    pack the small arrays clients read on open into one blob, so a client opens
+    a remote store in two requests. Run again after any change to the store.
+
+    .zmetadata is written before the blob and rss.client.open_root reads them
+    in the other order, so a reader opening while a store is appended to never
+    sees the new bounds, coordinates and scalers of the blob with the old, too
+    small array shapes. At worst it sees the old blob with the grown arrays,
+    which covers the lines it already knew.
+
+    Parameters
+    ----------
+    root : the writable zarr root group of an rss or FORGE store.
+    """
+    from rss.client import packed_arrays, packed_meta_key
+
+    store = root.store
+
+    # walk the hierarchy rather than listing every chunk of the store
+    paths = []
+    root.visit(paths.append)
+    metadata = {}
+    for prefix in [""] + [f"{path}/" for path in paths]:
+        for key in (".zgroup", ".zarray", ".zattrs"):
+            if prefix + key in store:
+                metadata[prefix + key] = json.loads(store[prefix + key])
+
+    arrays = {key: root[key][:] for key in packed_arrays if key in root}
+    if "binary_header" in arrays:
+        # the FORGE binary header is an array of json objects
+        arrays["binary_header"] = np.array(json.dumps(list(arrays["binary_header"])))
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, **arrays)
+
+    # the shapes first, the values indexing into them last
+    store[".zmetadata"] = json.dumps(
+        {"zarr_consolidated_format": 1, "metadata": metadata},
+        indent=4, sort_keys=True,
+    ).encode()
+    store[packed_meta_key] = buffer.getvalue()
+
+
+def _offset_bins(values, offsets):
+    """ The index of the nearest of the sorted offsets for every value. """
+    if len(offsets) == 1:
+        return np.zeros(len(values), dtype=int)
+    right = np.clip(np.searchsorted(offsets, values), 1, len(offsets) - 1)
+    left = right - 1
+    return np.where(values - offsets[left] <= offsets[right] - values, left, right)
+
+
+def _write_gathers(root, filename, ns, bounds, offsets=None, gathers_per_chunk=2,
+                   profiler=None):
+    """
+    Write the prestack gathers staged by read_trace_data to root['gather'].
+
+    seismic is (ns, n_offsets, n_inlines, n_crosslines), a chunk holds every
+    offset of a gathers_per_chunk square of gathers so a gather, or a small
+    neighbourhood of them, is one fetch. Each gather is quantized over its own
+    range, the scalers are (n_inlines, n_crosslines, 2), missing offsets and
+    gathers are padding. Chunks are written one at a time, reading only their
+    traces from the staged inlines, so memory is bounded by a chunk. Two traces
+    of a gather in the same offset bin raise a RuntimeError.
+    """
+    folders = glob(os.path.join(filename, "gathers", "*"))
+    keys = {
+        int(os.path.basename(folder)): np.load(os.path.join(folder, "keys.npy"))
+        for folder in folders
+    }
+    if offsets is None:
+        offsets = np.unique(np.concatenate([key[:, 1] for key in keys.values()]))
+    offsets = np.sort(np.asarray(offsets))
+
+    min_inline, min_crossline, max_inline, max_crossline = bounds
+    num_inlines = int(max_inline - min_inline + 1)
+    num_crosslines = int(max_crossline - min_crossline + 1)
+    size = int(gathers_per_chunk)
+
+    # the gather and offset bin of every staged trace, checked before writing
+    bins = {}
+    for line_number, key in keys.items():
+        crossline = key[:, 0] - min_crossline
+        offset = _offset_bins(key[:, 1], offsets)
+        duplicates = len(crossline) - len(np.unique(crossline * len(offsets) + offset))
+        if duplicates:
+            raise RuntimeError(
+                f"{duplicates} traces of inline {line_number} fall in the offset bin of "
+                "another trace of their gather, pass finer offsets."
+            )
+        bins[line_number] = (crossline, offset)
+
+    gather_root = root.create_group("gather", overwrite=True)
+    seismic = gather_root.zeros(
+        "seismic",
+        shape=(ns, len(offsets), num_inlines, num_crosslines),
+        chunks=(ns, len(offsets), size, size),
+        compressor=compressor,
+        dtype=np.uint16,
+        overwrite=True,
+        write_empty_chunks=False,
+    )
+    scalers = gather_root.zeros(
+        "scalers", shape=(num_inlines, num_crosslines, 2), dtype=float
+    )
+    gather_root.create_dataset("offsets", data=offsets, overwrite=True)
+
+    for first in _progress_bar(range(0, num_inlines, size)):
+        count = min(size, num_inlines - first)
+        # the staged traces of this row of chunks, read a chunk at a time
+        staged = {}
+        for i in range(count):
+            line_number = int(min_inline) + first + i
+            if line_number in bins:
+                staged[i] = np.memmap(
+                    os.path.join(filename, "gathers", f"{line_number}", "traces.bin"),
+                    dtype="<f4", mode="r",
+                ).reshape(-1, ns)
+
+        for first_crossline in range(0, num_crosslines, size):
+            num = min(size, num_crosslines - first_crossline)
+            block = np.zeros((ns, len(offsets), count, num), dtype=np.uint16)
+            block_scalers = np.zeros((count, num, 2))
+            for i, line_traces in staged.items():
+                crossline, offset = bins[int(min_inline) + first + i]
+                rows = np.flatnonzero(
+                    (crossline >= first_crossline) & (crossline < first_crossline + num)
+                )
+                if len(rows) == 0:
+                    continue
+
+                with stage(profiler, "read") as read:
+                    traces = np.asarray(line_traces[rows])
+                    read.bytes_out = traces.nbytes
+
+                with stage(profiler, "quantize", bytes_in=traces.nbytes):
+                    gather = crossline[rows] - first_crossline
+
+                    # the range of every gather
+                    min_val = np.full(num, np.inf)
+                    max_val = np.full(num, -np.inf)
+                    np.minimum.at(min_val, gather, traces.min(axis=1))
+                    np.maximum.at(max_val, gather, traces.max(axis=1))
+                    live = np.isfinite(min_val)
+                    max_val[live] -= min_val[live]
+                    scale = np.zeros(num)
+                    scale[max_val > 0] = (65535 - 1) / max_val[max_val > 0]
+
+                    # zero is reserved for padding
+                    quantized = (traces - min_val[gather, None]) * scale[gather, None] + 1
+                    block[:, offset[rows], i, gather] = quantized.astype(np.uint16).T
+                    block_scalers[i, live, 0] = min_val[live]
+                    block_scalers[i, live, 1] = max_val[live]
+
+            # compression only, the time spent writing chunks is the write stage
+            with stage(profiler, "compress", bytes_in=block.nbytes):
+                seismic[:, :, first : first + count,
+                        first_crossline : first_crossline + num] = block
+            scalers[first : first + count, first_crossline : first_crossline + num] = block_scalers
+        del staged
+
+
+def compressed_zarr(segy_file, sort_order="inline", layout="dense", tile_size=64,
+                    profiler=None, offsets=None, gathers_per_chunk=2):
+    """
+    Write the traces staged by read_trace_data to a compressed rss store.
+
+    Parameters
+    ----------
+    segy_file : str, the ingested SEGY file.
+    sort_order : one of inline, crossline or gather, the line the chunks are
+                 laid out along or prestack gathers, see _write_gathers.
+    layout : 'dense' stores one chunk per line across the whole bounding box,
+             'sparse' splits lines into tiles of tile_size traces and stores
+             only the tiles holding live traces, for irregular footprints.
+             Chunks of gathers without traces are never stored.
+    tile_size : int, traces per tile of the sparse layout.
+    profiler : optional rss.profile.StageProfiler timing the read, quantize,
+               compress and write stages.
+    offsets : optional sorted offset (or angle) bins of the gather sort order,
+              traces go to the nearest, the distinct staged offsets by default.
+    gathers_per_chunk : int, the inlines and crosslines of the square of
+                        gathers stored in one chunk.
+    """
     sort_order = sort_order.lower()
-    if sort_order not in ("inline", "crossline"):
+    if sort_order not in ("inline", "crossline", "gather"):
         raise RuntimeError(
-            f"{sort_order} not supported, sort order should be on of inline or crossline."
+            f"{sort_order} not supported, sort order should be on of inline, crossline or gather."
         )
 
+    layout = layout.lower()
+    if layout not in ("dense", "sparse"):
+        raise RuntimeError(f"{layout} not supported, layout should be one of dense or sparse.")
+
     if sort_order == "inline":
         orthogonal_line = "crossline"
     else:
@@ -315,14 +723,22 @@ def compressed_zarr(segy_file, sort_order="inline"):
 
     # always read whole traces:
 
+    num_orth_lines = int(max_orth_line - min_orth_line + 1)
+    if layout == "sparse":
+        tile_size = min(int(tile_size), num_orth_lines)
+    else:
+        tile_size = num_orth_lines
+
     chunks = [
         int(binary_header["ns"]),
-        int(max_orth_line - min_orth_line + 1),
+        tile_size,
         1,
     ]
 
     # folder = f'{filename}/traces.zarr'
     store = zarr.DirectoryStore(f"{filename}")
+    if profiler is not None:
+        store = profiler.store(store)
     root = zarr.group(store)
 
     bounds = root.create_dataset(
@@ -337,6 +753,9 @@ def compressed_zarr(segy_file, sort_order="inline"):
         overwrite=True,
     )
 
+    # sample rate, format and units, needed to write the data back out as SEGY
+    root.attrs["binary_header"] = binary_header
+
     coords_root = root.create_group("coords", overwrite=True)
 
     inline_coord = coords_root.create_dataset(
@@ -352,6 +771,27 @@ def compressed_zarr(segy_file, sort_order="inline"):
         "cdpy", data=cdpy, dtype=float, overwrite=True
     )
 
+    # which il/xl cells hold a trace, one bit per cell
+    live = root.create_dataset(
+        "live",
+        data=pack_live(inlines, crosslines),
+        compressor=compressor,
+        dtype=np.uint8,
+        overwrite=True,
+    )
+    live.attrs["num_crosslines"] = int(crosslines.max() - crosslines.min() + 1)
+
+    if os.path.exists(os.path.join(filename, staged_headers)):
+        write_headers(root, filename, binary_header.get("byteorder", ">"))
+        # as large as the store itself for short traces, read_trace_data stages it again
+        os.remove(os.path.join(filename, staged_headers))
+
+    if sort_order == "gather":
+        _write_gathers(root, filename, binary_header["ns"], bounds[:], offsets,
+                       gathers_per_chunk, profiler)
+        consolidate(root)
+        return
+
     line_root = root.create_group(sort_order, overwrite=True)
 
     seismic = line_root.zeros(
@@ -365,42 +805,44 @@ def compressed_zarr(segy_file, sort_order="inline"):
         compressor=compressor,
         dtype=np.uint16,
         overwrite=True,
+        # a dense chunk is a whole line holding a trace, only sparse tiles can be empty
+        write_empty_chunks=layout == "dense",
     )
 
     scalers = line_root.zeros(
-        "scalers", shape=(max_line - min_line + 1, 2), dtype=int
+        "scalers", shape=(max_line - min_line + 1, 2), dtype=float
     )
 
+    # which tiles of every line hold a live trace, only these are stored
+    num_tiles = -(-num_orth_lines // tile_size)
+    tiles = np.zeros((max_line - min_line + 1, num_tiles), dtype=bool)
+    line_root.attrs["layout"] = layout
+    line_root.attrs["tile_size"] = tile_size
+
     folder = os.path.join(filename, f"{sort_order}s", "*")
-    for line in tqdm.tqdm(glob(folder)):
+    for line in _progress_bar(glob(folder)):
         line_number = int(os.path.basename(line))
 
         # FIXME rerun little endian
-        traces = np.fromfile(
-            os.path.join(
-                filename, f"{sort_order}s", f"{line_number}", "traces.bin"
-            ),
-            dtype="<f4",
-        )
-        indx = np.fromfile(
-            os.path.join(
-                filename, f"{sort_order}s", f"{line_number}", "index.bin"
-            ),
-            dtype=bool,
-        )
-
-        min_val = traces.min()
-        traces -= min_val
-
-        max_val = traces.max()
-        if max_val != 0:
-            # could the entire line be zero?
-            traces = (65535 - 1) * traces / max_val
-
-        # zero isn't an invalid number
-        traces += 1
-
-        traces.shape = (-1, binary_header["ns"])
+        with stage(profiler, "read") as read:
+            traces = np.fromfile(
+                os.path.join(
+                    filename, f"{sort_order}s", f"{line_number}", "traces.bin"
+                ),
+                dtype="<f4",
+            )
+            indx = np.fromfile(
+                os.path.join(
+                    filename, f"{sort_order}s", f"{line_number}", "index.bin"
+                ),
+                dtype=bool,
+            )
+            read.bytes_out = traces.nbytes + indx.nbytes
+
+        with stage(profiler, "quantize", bytes_in=traces.nbytes) as quantizing:
+            traces, (min_val, max_val) = quantize(traces)
+            traces.shape = (-1, binary_header["ns"])
+            quantizing.bytes_out = traces.nbytes
 
         _traces = np.zeros(
             (binary_header["ns"], max_orth_line - min_orth_line + 1),
@@ -409,6 +851,249 @@ def compressed_zarr(segy_file, sort_order="inline"):
 
         _traces[:, np.where(indx)[0]] = traces.T
 
-        seismic[..., line_number - min_line] = _traces
+        # compression only, the time spent writing chunks is the write stage
+        with stage(profiler, "compress", bytes_in=_traces.nbytes):
+            seismic[..., line_number - min_line] = _traces
 
         scalers[line_number - min_line, :] = [min_val, max_val]
+
+        tiles[line_number - min_line, np.where(indx)[0] // tile_size] = True
+
+    line_root.create_dataset(
+        "tiles", data=tiles, compressor=compressor, dtype=bool, overwrite=True
+    )
+    consolidate(root)
+
+
+def _append_lines(root, sort_order, filename, old_bounds, bounds, ns):
+    """ Write the staged lines of one sort order into a resized store. """
+    from rss.client import dequantize
+
+    line_root = root[sort_order]
+
+    # keep empty tiles of the sparse layout unstored
+    seismic = zarr.open_array(
+        root.store, mode="r+", path=f"{sort_order}/seismic", write_empty_chunks=False
+    )
+    scalers = line_root["scalers"]
+
+    axis = 0 if sort_order == "inline" else 1
+    min_line, max_line = bounds[axis], bounds[axis + 2]
+    min_orth, max_orth = bounds[1 - axis], bounds[3 - axis]
+    num_old_lines = old_bounds[axis + 2] - old_bounds[axis] + 1
+
+    seismic.resize(ns, max_orth - min_orth + 1, max_line - min_line + 1)
+    scalers.resize(max_line - min_line + 1, 2)
+
+    tiles = line_root["tiles"] if "tiles" in line_root else None
+    if tiles is not None:
+        tile_size = line_root.attrs.get("tile_size", seismic.chunks[1])
+        tiles.resize(max_line - min_line + 1, -(-seismic.shape[1] // tile_size))
+
+    # the staged index.bin is relative to the first line of the new file
+    orth_lines = np.load(
+        os.path.join(filename, "crosslines.npy" if sort_order == "inline" else "inlines.npy")
+    )
+    offset = orth_lines[orth_lines > 0].min() - min_orth
+
+    folder = os.path.join(filename, f"{sort_order}s", "*")
+    for line in _progress_bar(glob(folder)):
+        line_number = int(os.path.basename(line))
+        index = line_number - min_line
+
+        traces = np.fromfile(os.path.join(line, "traces.bin"), dtype="<f4")
+        traces.shape = (-1, ns)
+        indx = np.fromfile(os.path.join(line, "index.bin"), dtype=bool)
+        position = np.where(indx)[0] + offset
+
+        _traces = np.zeros(seismic.shape[:2], dtype=np.float32)
+        mask = np.ones(seismic.shape[:2], dtype=bool)
+        if index < num_old_lines:
+            # an existing line, merge and quantize it again
+            min_val, max_val = scalers[index, :]
+            old = seismic[:, :, index]
+            _traces, mask = dequantize(old, min_val, max_val, mask_val=0.0, dtype=np.float32)
+        _traces[:, position] = traces.T
+        mask[:, position] = False
+
+        quantized, (min_val, max_val) = quantize(_traces, mask=mask)
+        seismic[:, :, index] = quantized
+        scalers[index, :] = [min_val, max_val]
+
+        if tiles is not None:
+            tiles[index, position // tile_size] = True
+
+
+def append_zarr(segy_file, store):
+    """
+    Append the traces staged by read_trace_data for segy_file to an existing
+    rss store, e.g. new inlines of a growing survey.
+
+    Every stored sort order is extended, so read_trace_data has to be run for
+    each of them first. The arrays are resized in place and only lines holding
+    new traces are written (existing lines they extend are quantized again),
+    the bounds are written last so readers never see lines before their data.
+    The survey can only grow to higher inline/crossline numbers, computed
+    attributes are not extended.
+
+    Parameters
+    ----------
+    segy_file : str, the SEGY file to add.
+    store : path to an rss folder or a writable zarr store.
+    """
+    # the client pulls in its read dependencies, only needed here
+    from rss.client import unpack_live
+
+    filename = os.path.splitext(os.path.basename(segy_file))[0]
+
+    with open(os.path.join(filename, "binary_header.json"), "r") as fp:
+        binary_header = json.loads(fp.read())
+
+    inlines = np.load(os.path.join(filename, "inlines.npy"))
+    crosslines = np.load(os.path.join(filename, "crosslines.npy"))
+    cdpx = np.load(os.path.join(filename, "cdpx.npy"))
+    cdpy = np.load(os.path.join(filename, "cdpy.npy"))
+
+    if isinstance(store, str):
+        store = zarr.DirectoryStore(store)
+    root = zarr.open_group(store, mode="r+")
+    if "gather" in root:
+        raise RuntimeError("appending to a store of prestack gathers is not supported.")
+
+    sort_orders = [i for i in ("inline", "crossline") if i in root]
+    ns = root[sort_orders[0]]["seismic"].shape[0]
+    if binary_header["ns"] != ns:
+        raise RuntimeError(f"{binary_header['ns']} samples per trace, the store has {ns}.")
+
+    old_bounds = root["bounds"][:]
+    bounds = np.array([
+        min(old_bounds[0], inlines.min()),
+        min(old_bounds[1], crosslines.min()),
+        max(old_bounds[2], inlines.max()),
+        max(old_bounds[3], crosslines.max()),
+    ])
+    if bounds[0] < old_bounds[0] or bounds[1] < old_bounds[1]:
+        raise RuntimeError(
+            "append can only extend a survey to higher inline/crossline numbers, "
+            f"the store starts at {old_bounds[:2].tolist()}."
+        )
+
+    for sort_order in sort_orders:
+        if not os.path.exists(os.path.join(filename, f"{sort_order}s")):
+            raise RuntimeError(f"run read_trace_data for the {sort_order} sort order first.")
+        _append_lines(root, sort_order, filename, old_bounds, bounds, ns)
+
+    coords_root = root["coords"]
+    for key, values in (("inlines", inlines), ("crosslines", crosslines),
+                        ("cdpx", cdpx), ("cdpy", cdpy)):
+        coords = coords_root[key]
+        num_traces = coords.shape[0]
+        coords.resize(num_traces + len(values))
+        coords[num_traces:] = values
+
+    # stores ingested before the trace headers were kept stay without
+    if "headers" in root and os.path.exists(os.path.join(filename, staged_headers)):
+        write_headers(root, filename, binary_header.get("byteorder", ">"), append=True)
+        os.remove(os.path.join(filename, staged_headers))
+
+    if "live" in root:
+        packed = root["live"]
+        old_live = unpack_live(packed[:], packed.attrs["num_crosslines"])
+        live = np.zeros((bounds[2] - bounds[0] + 1, bounds[3] - bounds[1] + 1), dtype=bool)
+        live[: old_live.shape[0], : old_live.shape[1]] = old_live
+        live[inlines - bounds[0], crosslines - bounds[1]] = True
+        live = np.packbits(live, axis=1)
+        packed.resize(*live.shape)
+        packed[:] = live
+        packed.attrs["num_crosslines"] = int(bounds[3] - bounds[1] + 1)
+
+    # the header of the first file, counting every trace stored
+    root.attrs["binary_header"] = dict(
+        root.attrs.get("binary_header", binary_header),
+        num_traces=int(coords_root["inlines"].shape[0]),
+    )
+
+    # readers index lines through the bounds, so these go last
+    root["bounds"][:] = bounds
+    consolidate(root)
+
+
+def write_clipped(store, blocks, ilxl, xy, binary_header, sort_order="inline"):
+    """
+    Write clipped traces, e.g. rss.client.rssClient.extract_polygon, to a new
+    rss store, a line at a time.
+
+    Parameters
+    ----------
+    store : path or zarr store of the new rss store.
+    blocks : iterable of (line_number, orth_lines, traces), traces a float
+             array (ns, len(orth_lines)) of the traces of a line.
+    ilxl : int array (n, 2), the inline/crossline of every clipped trace.
+    xy : float array (n, 2), the cdp x/y of every clipped trace.
+    binary_header : dict, the binary header of the clipped traces, num_traces is
+                    set to their count.
+    sort_order : one of inline or crossline, the sort order of the blocks.
+
+    Returns
+    -------
+    root : zarr group of the new store.
+    """
+    sort_order = sort_order.lower()
+    if sort_order not in ("inline", "crossline"):
+        raise RuntimeError(
+            f"{sort_order} not supported, sort order should be on of inline or crossline."
+        )
+    axis = 0 if sort_order == "inline" else 1
+
+    ilxl = np.asarray(ilxl, dtype=int)
+    inlines, crosslines = ilxl[:, 0], ilxl[:, 1]
+    bounds = [int(inlines.min()), int(crosslines.min()),
+              int(inlines.max()), int(crosslines.max())]
+    min_line, min_orth_line = bounds[axis], bounds[1 - axis]
+    num_lines = bounds[axis + 2] - min_line + 1
+    num_orth_lines = bounds[3 - axis] - min_orth_line + 1
+    ns = int(binary_header["ns"])
+
+    if isinstance(store, str):
+        store = zarr.DirectoryStore(store)
+    root = zarr.group(store, overwrite=True)
+    root.create_dataset("bounds", data=bounds, dtype=int)
+    root.attrs["binary_header"] = dict(binary_header, num_traces=len(ilxl))
+
+    coords_root = root.create_group("coords")
+    coords_root.create_dataset("inlines", data=inlines, dtype=int)
+    coords_root.create_dataset("crosslines", data=crosslines, dtype=int)
+    coords_root.create_dataset("cdpx", data=xy[:, 0], dtype=float)
+    coords_root.create_dataset("cdpy", data=xy[:, 1], dtype=float)
+
+    live = root.create_dataset(
+        "live", data=pack_live(inlines, crosslines), compressor=compressor, dtype=np.uint8
+    )
+    live.attrs["num_crosslines"] = int(bounds[3] - bounds[1] + 1)
+
+    line_root = root.create_group(sort_order)
+    seismic = line_root.zeros(
+        "seismic",
+        shape=(ns, num_orth_lines, num_lines),
+        chunks=(ns, num_orth_lines, 1),
+        compressor=compressor,
+        dtype=np.uint16,
+    )
+    scalers = line_root.zeros("scalers", shape=(num_lines, 2), dtype=float)
+    tiles = np.zeros((num_lines, 1), dtype=bool)
+    line_root.attrs["layout"] = "dense"
+    line_root.attrs["tile_size"] = num_orth_lines
+
+    for line_number, orth_lines, traces in blocks:
+        index = line_number - min_line
+        _traces = np.zeros((ns, num_orth_lines), dtype=np.float32)
+        mask = np.ones((ns, num_orth_lines), dtype=bool)
+        _traces[:, orth_lines - min_orth_line] = traces
+        mask[:, orth_lines - min_orth_line] = False
+
+        seismic[..., index], scalers[index, :] = quantize(_traces, mask)
+        tiles[index] = True
+
+    line_root.create_dataset("tiles", data=tiles, compressor=compressor, dtype=bool)
+    consolidate(root)
+    return root
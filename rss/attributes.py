@@ -0,0 +1,184 @@
+""" Chunk parallel attribute computation.
+
+    A kernel is mapped over the stored lines of the seismic volume and the
+    result is quantized with the same scheme as compressed_zarr and written
+    back to the rss store under <sort_order>/attributes/<name>, where
+    rssClient.line(..., attribute=name) can read it.
+
+    A kernel is called as kernel(traces, mask) with a float32 block of shape
+    (ns, n_orth, 2 * halo + 1), centred on the output line with padding set
+    to zero, and returns the (ns, n_orth) attribute of the centre line.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import functools
+import numpy as np
+import os
+from scipy.ndimage import uniform_filter1d
+from scipy.signal import butter, hilbert, sosfiltfilt
+import tqdm
+import zarr
+
+from rss.api import compressor, consolidate, quantize
+from rss.client import dequantize
+
+
+def _centre(traces):
+    return traces[..., traces.shape[-1] // 2]
+
+
+def rms(traces, mask, window=11):
+    """ Moving RMS amplitude over a window of samples. """
+    return np.sqrt(uniform_filter1d(_centre(traces) ** 2, window, axis=0))
+
+
+def envelope(traces, mask):
+    """ Amplitude of the analytic trace. """
+    return np.abs(hilbert(_centre(traces), axis=0))
+
+
+def instantaneous_phase(traces, mask):
+    """ Phase of the analytic trace in radians. """
+    return np.angle(hilbert(_centre(traces), axis=0))
+
+
+def bandpass(traces, mask, lowcut, highcut, sample_rate_ms, order=5):
+    """ Zero phase Butterworth bandpass, corners in Hz. """
+    fs = 1000.0 / sample_rate_ms
+    sos = butter(order, [lowcut, highcut], btype="band", fs=fs, output="sos")
+    return sosfiltfilt(sos, _centre(traces), axis=0)
+
+
+def line_mean(traces, mask):
+    """ Mean of the live traces across the neighbouring lines of the halo. """
+    live = (~mask).sum(axis=-1)
+    return traces.sum(axis=-1) / np.maximum(live, 1)
+
+
+builtin_attributes = {
+    "rms": rms,
+    "envelope": envelope,
+    "phase": instantaneous_phase,
+    "bandpass": bandpass,
+    "line_mean": line_mean,
+}
+
+
+def _compute_lines(seismic, scalers, output, kernel, halo, start, stop):
+    num_lines = seismic.shape[-1]
+
+    # read the lines of the task once, with the halo on either side
+    first = max(start - halo, 0)
+    last = min(stop + halo, num_lines)
+    block = seismic[..., first:last]
+    line_scalers = scalers[first:last, :]
+    traces, mask = dequantize(
+        block, line_scalers[:, 0], line_scalers[:, 1], mask_val=0.0,
+        dtype=np.float32,
+    )
+
+    # lines beyond the survey are all padding
+    pad = ((0, 0), (0, 0), (first - (start - halo), (stop + halo) - last))
+    traces = np.pad(traces, pad)
+    mask = np.pad(mask, pad, constant_values=True)
+
+    width = 2 * halo + 1
+    output_scalers = np.zeros((stop - start, 2))
+    for i in range(start, stop):
+        j = i - start
+        centre_mask = mask[..., j + halo]
+        if np.all(centre_mask):
+            continue
+        result = kernel(traces[..., j : j + width], mask[..., j : j + width])
+        result = np.asarray(result, dtype=np.float32)
+        result[centre_mask] = 0.0
+
+        quantized, line_scalers = quantize(result, mask=centre_mask)
+        output[..., i] = quantized
+        output_scalers[j, :] = line_scalers
+    return output_scalers
+
+
+def compute_attribute(store, name, kernel, sort_order="inline", halo=0,
+                      workers=None, lines_per_task=8, **kwargs):
+    """
+    Compute an attribute of the seismic volume and write it to the store.
+
+    Parameters
+    ----------
+    store : path to an rss folder or a writable zarr store.
+    name : str, name of the output attribute.
+    kernel : callable kernel(traces, mask, **kwargs) or the name of a built-in,
+             one of rms, envelope, phase, bandpass or line_mean.
+    sort_order : the stored sort order to read and write.
+    halo : int, number of neighbouring lines passed to the kernel on each side.
+    workers : number of threads, defaults to os.cpu_count().
+    lines_per_task : number of consecutive lines a worker reads at a time.
+    kwargs : passed to the kernel, e.g. window for rms.
+
+    Returns
+    -------
+    attribute : the zarr group holding the seismic and scalers of the attribute.
+    """
+    sort_order = sort_order.lower()
+    if sort_order not in ("inline", "crossline"):
+        raise RuntimeError(
+            f"{sort_order} not supported, sort order should be on of inline or crossline."
+        )
+
+    if isinstance(kernel, str):
+        if kernel not in builtin_attributes:
+            raise RuntimeError(
+                f"{kernel} not supported, attribute should be one of "
+                f"{', '.join(builtin_attributes)}."
+            )
+        kernel = builtin_attributes[kernel]
+
+    if kwargs:
+        kernel = functools.partial(kernel, **kwargs)
+
+    if isinstance(store, str):
+        store = zarr.DirectoryStore(store)
+    root = zarr.open(store, mode="a")
+
+    line_root = root[sort_order]
+    seismic = line_root["seismic"]
+    scalers = line_root["scalers"]
+
+    attribute = line_root.require_group("attributes").create_group(
+        name, overwrite=True
+    )
+    output = attribute.zeros(
+        "seismic",
+        shape=seismic.shape,
+        chunks=seismic.chunks,
+        compressor=compressor,
+        dtype=np.uint16,
+        write_empty_chunks=False,
+    )
+    attribute.attrs["halo"] = halo
+
+    # tasks own whole chunks, so no two threads write the same chunk
+    lines_per_chunk = seismic.chunks[-1]
+    lines_per_task = -(-lines_per_task // lines_per_chunk) * lines_per_chunk
+
+    num_lines = seismic.shape[-1]
+    tasks = [
+        (start, min(start + lines_per_task, num_lines))
+        for start in range(0, num_lines, lines_per_task)
+    ]
+
+    # decompression, numpy and scipy release the GIL, threads are enough
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        futures = [
+            pool.submit(_compute_lines, seismic, scalers, output, kernel,
+                        halo, start, stop)
+            for start, stop in tasks
+        ]
+        output_scalers = np.zeros(scalers.shape)
+        for (start, stop), future in tqdm.tqdm(zip(tasks, futures),
+                                                total=len(tasks)):
+            output_scalers[start:stop] = future.result()
+
+    attribute.create_dataset("scalers", data=output_scalers, dtype=float)
+    consolidate(root)
+    return attribute
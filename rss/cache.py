@@ -0,0 +1,687 @@
+""" Chunk caches that can be shared by many open stores.
+
+    zarr.LRUStoreCache gives each store its own byte budget. A SharedLRUCache
+    holds one budget for every store mounted on it, evicting the least
+    recently used chunk whichever survey it belongs to.
+
+    A CoalescingStore sits under either cache so that threads missing the
+    cache on the same key at the same time share a single fetch. lru_peek and
+    lru_fill let async reads fetch around a zarr.LRUStoreCache and fill it.
+
+    A SharedMemoryCache holds the chunks in a shared memory segment that
+    every process on a node attaches to by name, e.g. gunicorn workers or a
+    multiprocessing pool, so a chunk is held and downloaded once per node.
+
+    These hold compressed chunks, a DecodedCache sits above them and holds
+    the dequantized lines and windows the clients return, so a hot line
+    skips decompression and conversion altogether.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+import hashlib
+import os
+import sys
+import tempfile
+from threading import Lock
+import time
+
+import numpy as np
+from zarr.storage import Store, listdir
+
+
+class SharedLRUCache:
+    def __init__(self, max_size):
+        """
+        A least recently used cache of chunk bytes with one global byte budget.
+
+        Parameters
+        ----------
+        max_size : int, the budget in bytes for all mounted stores together.
+        """
+        self.max_size = max_size
+        self.current_size = 0
+        self.hits = self.misses = 0
+        self._values = OrderedDict()
+        self._mutex = Lock()
+        self._num_mounts = 0
+
+    def mount(self, store, name=None):
+        """
+        Wrap a store so its reads go through this cache.
+
+        Parameters
+        ----------
+        store : the zarr store to cache.
+        name : str, the namespace of the store in the cache, unique per mount
+               by default.
+
+        Returns
+        -------
+        store : CachedStore, pass this to zarr.open.
+        """
+        with self._mutex:
+            self._num_mounts += 1
+            if name is None:
+                name = f"mount-{self._num_mounts}"
+        return CachedStore(store, self, name)
+
+    def get(self, name, key):
+        with self._mutex:
+            value = self._values[(name, key)]
+            self._values.move_to_end((name, key))
+            self.hits += 1
+            return value
+
+    # never waits, see SharedMemoryCache.peek
+    peek = get
+
+    def count_miss(self):
+        with self._mutex:
+            self.misses += 1
+
+    def contains(self, name, key):
+        with self._mutex:
+            return (name, key) in self._values
+
+    def put(self, name, key, value):
+        size = len(value)
+        if size > self.max_size:
+            return
+        with self._mutex:
+            if (name, key) in self._values:
+                return
+            while self.current_size + size > self.max_size:
+                _, old = self._values.popitem(last=False)
+                self.current_size -= len(old)
+            self._values[(name, key)] = value
+            self.current_size += size
+
+    def invalidate(self, name, key=None):
+        """ Drop one key, or every key of a mounted store if key is None. """
+        with self._mutex:
+            if key is not None:
+                keys = [(name, key)] if (name, key) in self._values else []
+            else:
+                keys = [i for i in self._values if i[0] == name]
+            for i in keys:
+                self.current_size -= len(self._values.pop(i))
+
+    def sizes(self):
+        """ Bytes held per mounted store. """
+        sizes = {}
+        with self._mutex:
+            for (name, _), value in self._values.items():
+                sizes[name] = sizes.get(name, 0) + len(value)
+        return sizes
+
+
+class CachedStore(Store):
+    def __init__(self, store, cache, name):
+        """ A store whose reads go through a shared cache, see SharedLRUCache.mount. """
+        self._store = store
+        self.cache = cache
+        self.name = name
+
+    def __getitem__(self, key):
+        try:
+            return self.cache.get(self.name, key)
+        except KeyError:
+            pass
+        try:
+            value = self._store[key]
+        except BaseException:
+            # missing or failed, e.g. a timeout, nothing for others to wait for
+            # as a shared memory cache claims misses
+            self.cache.invalidate(self.name, key)
+            raise
+        self.cache.count_miss()
+        self.cache.put(self.name, key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        self._store[key] = value
+        self.cache.invalidate(self.name, key)
+
+    def __delitem__(self, key):
+        del self._store[key]
+        self.cache.invalidate(self.name, key)
+
+    def __contains__(self, key):
+        if self.cache.contains(self.name, key):
+            return True
+        return key in self._store
+
+    def getitems(self, keys, *, contexts=None):
+        # a missing chunk is a KeyError, no need to ask the store first
+        values = {}
+        for key in keys:
+            try:
+                values[key] = self[key]
+            except KeyError:
+                pass
+        return values
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self):
+        return len(self._store)
+
+    def listdir(self, path=None):
+        return listdir(self._store, path)
+
+    def close(self):
+        # detach only, the cached chunks may serve other clients and processes
+        if hasattr(self._store, "close"):
+            self._store.close()
+
+
+class CoalescingStore(Store):
+    def __init__(self, store):
+        """
+        A thread safe read through wrapper that deduplicates fetches in flight:
+        a thread asking for a key another thread is already fetching waits for
+        that result instead of fetching it again.
+
+        Parameters
+        ----------
+        store : the zarr store to read from.
+        """
+        self._store = store
+        self._in_flight = {}
+        self._mutex = Lock()
+        self.fetches = self.coalesced = 0
+
+    def __getitem__(self, key):
+        with self._mutex:
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._in_flight[key] = future
+                self.fetches += 1
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            # raises the KeyError of the owner for missing keys
+            return future.result()
+
+        try:
+            value = self._store[key]
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            with self._mutex:
+                del self._in_flight[key]
+
+    def getitems(self, keys, *, contexts=None):
+        values = {}
+        for key in keys:
+            try:
+                values[key] = self[key]
+            except KeyError:
+                pass
+        return values
+
+    def __setitem__(self, key, value):
+        self._store[key] = value
+
+    def __delitem__(self, key):
+        del self._store[key]
+
+    def __contains__(self, key):
+        return key in self._store
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self):
+        return len(self._store)
+
+    def listdir(self, path=None):
+        return listdir(self._store, path)
+
+
+def lru_peek(store, key):
+    """ A hit of a zarr.LRUStoreCache, a KeyError instead of reading through on a miss. """
+    with store._mutex:
+        value = store._values_cache[key]
+        store.hits += 1
+        store._values_cache.move_to_end(key)
+    return value
+
+
+def lru_fill(store, key, value):
+    """ Cache a value fetched around a zarr.LRUStoreCache, as its own misses do. """
+    with store._mutex:
+        store.misses += 1
+        if key not in store._values_cache:
+            store._cache_value(key, value)
+
+
+# the layout of a SharedMemoryCache segment: a header, one index entry per slot, the slots
+_shared_magic = 0x7273734361636865
+_shared_header = np.dtype([("magic", "<u8"), ("num_sets", "<i8"), ("ways", "<i8"),
+                           ("slot_size", "<i8")])
+_shared_entry = np.dtype([("name", "<u8"), ("key", "<u8", 2), ("length", "<i8"),
+                          ("used", "<i8")])
+
+
+def _digest(text, size):
+    """ Non zero unsigned 64 bit words hashing text, zero marks an empty slot. """
+    words = np.frombuffer(hashlib.blake2b(text.encode(), digest_size=8 * size).digest(), "<u8")
+    return np.maximum(words, 1)
+
+
+_tracker_lock = Lock()
+# a byte of the lock file past the stripes
+_tracker_byte = 1 << 30
+
+
+@contextmanager
+def _tracker_order(lock_path):
+    """
+    One process at a time registers and unregisters a segment with the
+    resource tracker the processes of a pool share, a name unregistered twice
+    in a row makes the tracker print a KeyError.
+    """
+    import fcntl
+
+    with _tracker_lock:
+        fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.lockf(fd, fcntl.LOCK_EX, 1, _tracker_byte)
+            yield
+        finally:
+            os.close(fd)
+
+
+def _segment(name, lock_path, create=False, size=0):
+    """ A named shared memory segment that outlives every process using it. """
+    from multiprocessing import resource_tracker, shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    # the tracker unlinks the segments of a process when it exits (python < 3.13)
+    with _tracker_order(lock_path):
+        shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _store_name(store):
+    """ A name for a store that is the same in every process, from its path or url. """
+    while True:
+        if hasattr(store, "_store"):
+            store = store._store
+        elif hasattr(store, "_mutable_mapping"):
+            store = store._mutable_mapping
+        else:
+            break
+    name = getattr(store, "path", None) or getattr(store, "root", None)
+    if name is None:
+        raise RuntimeError("name the store when mounting it, the name has to match across processes.")
+    return str(name)
+
+
+class SharedMemoryCache:
+    def __init__(self, name, size=1024 ** 3, slot_size=8 * 1024 ** 2, ways=8,
+                 num_stripes=64, fetch_timeout=30.0):
+        """
+        A cache of chunk bytes in a named shared memory segment, one per node.
+
+        The first process creates the segment, the others attach to it with
+        the same name (their size arguments are then ignored). The segment is
+        set associative: a key maps to a set of ways slots of slot_size bytes,
+        replacing the least recently used slot of its set. Sets are guarded by
+        striped locks, a thread lock and an fcntl byte range lock on a lock
+        file, so processes only contend on keys in the same stripe.
+
+        A miss claims its slot until the chunk is put, processes missing the
+        same key meanwhile wait for it, so a cold chunk is fetched once for
+        all of them. Chunks larger than slot_size aren't cached. POSIX only.
+
+        Parameters
+        ----------
+        name : str, the name of the segment, shared by every process.
+        size : int, the bytes of all the slots.
+        slot_size : int, the largest compressed chunk cached.
+        ways : int, slots per set.
+        num_stripes : int, the locks guarding the sets.
+        fetch_timeout : float, seconds after which a claimed chunk is fetched
+                        again, e.g. when the process fetching it died.
+        """
+        import fcntl
+
+        self._fcntl = fcntl
+        self.name = name
+        self.fetch_timeout = fetch_timeout
+        self.hits = self.misses = 0
+        self._mutex = Lock()
+        # the keys this process claimed and is fetching
+        self._claims = set()
+
+        self._lock_path = os.path.join(tempfile.gettempdir(), f"{name}.lock")
+        num_sets = int(size) // (int(slot_size) * int(ways))
+        if num_sets < 1:
+            raise RuntimeError(f"size {size} holds less than one set of {ways} slots of {slot_size} bytes.")
+        index_size = _shared_header.itemsize + num_sets * ways * _shared_entry.itemsize
+        try:
+            self._shm = _segment(name, self._lock_path, create=True,
+                                 size=index_size + num_sets * ways * int(slot_size))
+            header = np.ndarray((), dtype=_shared_header, buffer=self._shm.buf)
+            header["num_sets"], header["ways"], header["slot_size"] = num_sets, ways, slot_size
+            # written last, attaching processes wait for it
+            header["magic"] = _shared_magic
+            self.created = True
+        except FileExistsError:
+            self._shm = _segment(name, self._lock_path)
+            header = np.ndarray((), dtype=_shared_header, buffer=self._shm.buf)
+            for _ in range(1000):
+                if header["magic"] == _shared_magic:
+                    break
+                time.sleep(0.001)
+            else:
+                raise RuntimeError(f"shared memory {name} is not an rss cache.")
+            self.created = False
+
+        self.num_sets, self.ways = int(header["num_sets"]), int(header["ways"])
+        self.slot_size = int(header["slot_size"])
+        self.max_size = self.num_sets * self.ways * self.slot_size
+        self._index = np.ndarray(
+            (self.num_sets, self.ways), dtype=_shared_entry, buffer=self._shm.buf,
+            offset=_shared_header.itemsize,
+        )
+        self._data_offset = _shared_header.itemsize + self._index.nbytes
+        del header
+
+        self.num_stripes = min(int(num_stripes), self.num_sets)
+        self._locks = [Lock() for _ in range(self.num_stripes)]
+        self._lock_fd = os.open(self._lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def mount(self, store, name=None):
+        """
+        Wrap a store so its reads go through this cache.
+
+        Parameters
+        ----------
+        store : the zarr store to cache.
+        name : str, the namespace of the store in the cache, the same in every
+               process, the path or url of the store by default.
+
+        Returns
+        -------
+        store : CachedStore, pass this to zarr.open.
+        """
+        return CachedStore(store, self, _store_name(store) if name is None else name)
+
+    def _locate(self, name, key):
+        name_hash = _digest(name, 1)[0]
+        key_hash = _digest(f"{name}/{key}", 2)
+        return name_hash, key_hash, int(key_hash[0] % self.num_sets)
+
+    def _lock(self, set_index):
+        stripe = set_index % self.num_stripes
+        self._locks[stripe].acquire()
+        self._fcntl.lockf(self._lock_fd, self._fcntl.LOCK_EX, 1, stripe)
+        return stripe
+
+    def _unlock(self, stripe):
+        self._fcntl.lockf(self._lock_fd, self._fcntl.LOCK_UN, 1, stripe)
+        self._locks[stripe].release()
+
+    def _find(self, entries, name_hash, key_hash):
+        ways = np.flatnonzero(
+            (entries["name"] == name_hash) & (entries["key"] == key_hash).all(axis=1)
+        )
+        return int(ways[0]) if len(ways) else None
+
+    def _slot(self, set_index, way):
+        start = self._data_offset + (set_index * self.ways + way) * self.slot_size
+        return self._shm.buf[start : start + self.slot_size]
+
+    def _victim(self, entries):
+        """ The least recently used way that isn't being fetched, None if all are. """
+        stale = time.monotonic_ns() - entries["used"] > self.fetch_timeout * 1e9
+        free = np.flatnonzero((entries["length"] >= 0) | stale)
+        if len(free) == 0:
+            return None
+        # an empty slot has never been used
+        return int(free[np.argmin(entries["used"][free])])
+
+    def _claim(self, entries, way, name_hash, key_hash):
+        """
+        Mark a slot as being fetched by this process, a length of -1. None
+        when every way of the set is claimed, the chunk is then not cached.
+        """
+        if way is None:
+            way = self._victim(entries)
+            if way is None:
+                return None
+        entries["name"][way] = name_hash
+        entries["key"][way] = key_hash
+        entries["length"][way] = -1
+        entries["used"][way] = time.monotonic_ns()
+        with self._mutex:
+            self._claims.add((name_hash, tuple(key_hash)))
+        return way
+
+    def _release(self, name_hash, key_hash):
+        with self._mutex:
+            self._claims.discard((name_hash, tuple(key_hash)))
+
+    def get(self, name, key):
+        """ The bytes of key, a KeyError claims it for the caller to fetch and put. """
+        name_hash, key_hash, set_index = self._locate(name, key)
+        wait = 0.0005
+        while True:
+            stripe = self._lock(set_index)
+            try:
+                entries = self._index[set_index]
+                way = self._find(entries, name_hash, key_hash)
+                now = time.monotonic_ns()
+                if way is not None and entries["length"][way] >= 0:
+                    entries["used"][way] = now
+                    value = bytes(self._slot(set_index, way)[: entries["length"][way]])
+                    break
+                with self._mutex:
+                    # threads of this process coalesce under the cache instead
+                    own = (name_hash, tuple(key_hash)) in self._claims
+                if way is None or own or now - entries["used"][way] > self.fetch_timeout * 1e9:
+                    self._claim(entries, way, name_hash, key_hash)
+                    raise KeyError(key)
+            finally:
+                self._unlock(stripe)
+            # another process is fetching it
+            time.sleep(wait)
+            wait = min(2 * wait, 0.01)
+        with self._mutex:
+            self.hits += 1
+        return value
+
+    def peek(self, name, key):
+        """
+        The bytes of key without waiting or claiming, a KeyError when it is
+        missing or another process is fetching it. For callers that can't
+        block, e.g. an event loop.
+        """
+        name_hash, key_hash, set_index = self._locate(name, key)
+        stripe = self._lock(set_index)
+        try:
+            entries = self._index[set_index]
+            way = self._find(entries, name_hash, key_hash)
+            if way is None or entries["length"][way] < 0:
+                raise KeyError(key)
+            entries["used"][way] = time.monotonic_ns()
+            value = bytes(self._slot(set_index, way)[: entries["length"][way]])
+        finally:
+            self._unlock(stripe)
+        with self._mutex:
+            self.hits += 1
+        return value
+
+    def count_miss(self):
+        with self._mutex:
+            self.misses += 1
+
+    def contains(self, name, key):
+        name_hash, key_hash, set_index = self._locate(name, key)
+        stripe = self._lock(set_index)
+        try:
+            entries = self._index[set_index]
+            way = self._find(entries, name_hash, key_hash)
+            return way is not None and entries["length"][way] >= 0
+        finally:
+            self._unlock(stripe)
+
+    def put(self, name, key, value):
+        value = memoryview(value).cast("B")
+        if value.nbytes > self.slot_size:
+            # release the claim, the waiting processes fetch it themselves
+            self.invalidate(name, key)
+            return
+        name_hash, key_hash, set_index = self._locate(name, key)
+        stripe = self._lock(set_index)
+        try:
+            entries = self._index[set_index]
+            way = self._find(entries, name_hash, key_hash)
+            if way is not None and entries["length"][way] >= 0:
+                self._release(name_hash, key_hash)
+                return
+            if way is None:
+                way = self._claim(entries, way, name_hash, key_hash)
+            if way is not None:
+                self._slot(set_index, way)[: value.nbytes] = value
+                entries["length"][way] = value.nbytes
+                entries["used"][way] = time.monotonic_ns()
+        finally:
+            self._unlock(stripe)
+        self._release(name_hash, key_hash)
+
+    def invalidate(self, name, key=None):
+        """ Drop one key, or every key of a mounted store if key is None. """
+        if key is not None:
+            name_hash, key_hash, set_index = self._locate(name, key)
+            sets = [set_index]
+        else:
+            name_hash, key_hash, sets = _digest(name, 1)[0], None, range(self.num_sets)
+        for set_index in sets:
+            stripe = self._lock(set_index)
+            try:
+                entries = self._index[set_index]
+                drop = entries["name"] == name_hash
+                if key_hash is not None:
+                    drop &= (entries["key"] == key_hash).all(axis=1)
+                entries[drop] = 0
+            finally:
+                self._unlock(stripe)
+        with self._mutex:
+            self._claims = {i for i in self._claims if i[0] != name_hash
+                            or (key_hash is not None and i[1] != tuple(key_hash))}
+
+    @property
+    def current_size(self):
+        """ Bytes held by all processes, read without locking. """
+        lengths = self._index["length"][self._index["name"] != 0]
+        return int(lengths[lengths > 0].sum())
+
+    def close(self):
+        """ Detach this process, the segment stays for the others. """
+        self._index = None
+        self._shm.close()
+        os.close(self._lock_fd)
+
+    def unlink(self):
+        """ Remove the segment once every process is done with it. """
+        if sys.version_info >= (3, 13):
+            self._shm.unlink()
+        else:
+            from multiprocessing import resource_tracker
+
+            # unlink unregisters the segment, untracked since it was attached
+            with _tracker_order(self._lock_path):
+                resource_tracker.register(self._shm._name, "shared_memory")
+                self._shm.unlink()
+        try:
+            os.remove(self._lock_path)
+        except FileNotFoundError:
+            pass
+
+
+class DecodedCache:
+    def __init__(self, max_size):
+        """
+        A least recently used cache of dequantized client results with its
+        own byte budget, see the decoded_cache option of the clients.
+
+        Cached arrays are returned read-only as every caller shares them,
+        copy one before modifying it.
+
+        Parameters
+        ----------
+        max_size : int, the budget in bytes of the cached arrays.
+        """
+        self.max_size = max_size
+        self.current_size = 0
+        self.hits = self.misses = 0
+        self._values = OrderedDict()
+        self._sizes = {}
+        self._mutex = Lock()
+        self._num_names = 0
+
+    def namespace(self, name=None):
+        """ A namespace for the keys of one client, unique by default. """
+        with self._mutex:
+            self._num_names += 1
+            return f"client-{self._num_names}" if name is None else name
+
+    def get(self, key):
+        with self._mutex:
+            try:
+                value = self._values[key]
+            except KeyError:
+                self.misses += 1
+                raise
+            self._values.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """ Cache a tuple of arrays, or an array, making them read-only. """
+        arrays = value if isinstance(value, tuple) else (value,)
+        for array in arrays:
+            array.flags.writeable = False
+        size = sum(array.nbytes for array in arrays)
+        if size > self.max_size:
+            return value
+        with self._mutex:
+            if key in self._values:
+                return value
+            while self.current_size + size > self.max_size:
+                old, _ = self._values.popitem(last=False)
+                self.current_size -= self._sizes.pop(old)
+            self._values[key] = value
+            self._sizes[key] = size
+            self.current_size += size
+        return value
+
+    def cached(self, key, read):
+        """ The cached value of key, or the result of read() cached. """
+        try:
+            return self.get(key)
+        except KeyError:
+            return self.put(key, read())
+
+    def invalidate(self, name=None):
+        """ Drop the keys of one namespace, or everything if name is None. """
+        with self._mutex:
+            keys = [i for i in self._values if name is None or i[0] == name]
+            for key in keys:
+                del self._values[key]
+                self.current_size -= self._sizes.pop(key)
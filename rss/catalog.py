@@ -0,0 +1,126 @@
+""" Many open surveys over one filesystem session and one cache budget. """
+from threading import Lock
+
+import zarr
+
+from rss.cache import SharedLRUCache
+
+
+class rssCatalog:
+    def __init__(self, client_kwargs=None, cache_size=1024 * (1024 ** 2), anon=None):
+        """
+        A manager for many rss and FORGE stores mounted at once.
+
+        Every S3 store shares one s3fs.S3FileSystem (and its connection pool),
+        and every client shares one SharedLRUCache, so memory stays bounded by
+        cache_size however many surveys are open.
+
+        Parameters
+        ----------
+        client_kwargs : dict containing aws_access_key_id and aws_secret_access_key or None.
+        cache_size : int, the byte budget of the cache shared by all surveys.
+        anon : bool, anonymous S3 access, defaults to client_kwargs is None.
+        """
+        self.client_kwargs = client_kwargs
+        self.anon = client_kwargs is None if anon is None else anon
+        self.cache = SharedLRUCache(cache_size)
+        self.surveys = {}
+        self._uris = {}
+        self._s3 = None
+        self._mutex = Lock()
+        # guards surveys, clients are built outside of it
+        self._surveys_lock = Lock()
+
+    @property
+    def s3(self):
+        """ The pooled S3 filesystem, created on first use. """
+        import s3fs
+
+        with self._mutex:
+            if self._s3 is None:
+                self._s3 = s3fs.S3FileSystem(
+                    anon=self.anon, client_kwargs=self.client_kwargs
+                )
+            return self._s3
+
+    def store(self, uri):
+        """ A zarr store for an s3:// uri or a local folder. """
+        if uri.startswith("s3://"):
+            import s3fs
+
+            return s3fs.S3Map(root=uri, s3=self.s3, check=False)
+        return zarr.DirectoryStore(uri)
+
+    def open(self, name, uri, kind="rss"):
+        """
+        Mount a survey.
+
+        Parameters
+        ----------
+        name : str, the name to look the survey up by.
+        uri : s3:// uri or local path of the store.
+        kind : one of 'rss' or 'forge'.
+
+        Returns
+        -------
+        client : rssClient or rssFORGEClient reading through the shared cache.
+        """
+        kind = kind.lower()
+        if kind not in ("rss", "forge"):
+            raise RuntimeError(f"{kind} not supported, kind should be one of rss or forge.")
+
+        with self._surveys_lock:
+            if name in self.surveys:
+                return self._mounted(name, uri)
+
+        # opening reads the metadata, other surveys needn't wait for it
+        store = self.store(uri)
+        if kind == "rss":
+            from rss.client import rssClient
+
+            client = rssClient(store, cache=self.cache, name=name)
+        else:
+            from rss.forge_client import rssFORGEClient
+
+            client = rssFORGEClient(store, cache=self.cache, name=name)
+
+        with self._surveys_lock:
+            if name not in self.surveys:
+                self.surveys[name] = client
+                self._uris[name] = uri
+                return client
+        # another thread mounted it first
+        client.cache.close()
+        with self._surveys_lock:
+            return self._mounted(name, uri)
+
+    def _mounted(self, name, uri):
+        if self._uris[name] != uri:
+            raise RuntimeError(f"{name} is mounted from {self._uris[name]}, not {uri}.")
+        return self.surveys[name]
+
+    def close(self, name):
+        """ Unmount a survey and release its share of the cache. """
+        with self._surveys_lock:
+            self.surveys.pop(name)
+            self._uris.pop(name)
+            self.cache.invalidate(name)
+
+    def __getitem__(self, name):
+        return self.surveys[name]
+
+    def __contains__(self, name):
+        return name in self.surveys
+
+    def __len__(self):
+        return len(self.surveys)
+
+    def stats(self):
+        """ The shared cache usage, in total and per survey. """
+        return {
+            "max_size": self.cache.max_size,
+            "current_size": self.cache.current_size,
+            "hits": self.cache.hits,
+            "misses": self.cache.misses,
+            "surveys": self.cache.sizes(),
+        }
@@ -1,10 +1,29 @@
-from IPython.display import clear_output
+import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
 import numpy as np
 import os
-import s3fs
-from scipy.spatial import KDTree
+import sys
+import threading
+import warnings
 import zarr
 
+from rss.aio import aread
+from rss.cache import CachedStore, CoalescingStore
+
+
+def clear_output():
+    """ Clears the notebook cell output, when running under IPython. """
+    # IPython takes longer to import than a line takes to read, only load it
+    # when a notebook is already running
+    if "IPython" not in sys.modules:
+        return
+    from IPython.display import clear_output as _clear_output
+
+    _clear_output()
+
 
 def load_trace(seismic, scalers, bounds, inline, crossline):
     """
@@ -37,19 +56,96 @@ def load_trace(seismic, scalers, bounds, inline, crossline):
         )
 
     trace = seismic[:, crossline - min_crossline, inline - min_inline]
-    mask = trace < 1
     min_val, max_val = scalers[inline - min_inline, :]
-    trace -= 1
-    trace = trace.astype(float) * max_val / (65535 - 1)
-    trace += min_val
+    return dequantize(trace, min_val, max_val, mask_val=None)
+
+
+def line_index(bounds, line_number, sort_order="inline"):
+    """
+    The index of a line along the last axis of a stored sort order.
+
+    Parameters
+    ----------
+    bounds : min/max values for the inline/crossline coords.
+    line_number : int, the line number to access.
+    sort_order : str, the sort order of the seismic array.
+
+    Returns
+    -------
+    index : int.
+    """
+
+    sort_order = sort_order.lower()
+    if sort_order not in ("inline", "crossline"):
+        raise RuntimeError(
+            f"{sort_order} not supported, sort order should be on of inline or crossline."
+        )
+
+    min_inline, min_crossline, max_inline, max_crossline = bounds
+
+    if sort_order == "inline":
+        min_line = min_inline
+        max_line = max_inline
+    else:
+        min_line = min_crossline
+        max_line = max_crossline
+
+    if line_number < min_line or line_number > max_line:
+        raise RuntimeError(
+            f"{line_number} out of bounds [{min_line}, {max_line}]."
+        )
+
+    return int(line_number - min_line)
+
+
+def tile_runs(live_tiles):
+    """
+    Runs of consecutive live tiles.
+
+    Parameters
+    ----------
+    live_tiles : 1-D boolean array, True for the stored tiles of a line.
+
+    Returns
+    -------
+    runs : list of (start, stop) tile indices.
+    """
+    edges = np.diff(np.concatenate([[0], np.asarray(live_tiles, dtype=np.int8), [0]]))
+    return list(zip(np.where(edges == 1)[0], np.where(edges == -1)[0]))
 
-    is_live = np.all(~mask)
 
-    return trace, mask
+def tile_selections(seismic, index, live_tiles):
+    """ The selections of a stored line covering its live tiles, see tile_runs. """
+    tile_size = seismic.chunks[1]
+    return [
+        (slice(None), slice(start * tile_size, min(stop * tile_size, seismic.shape[1])), index)
+        for start, stop in tile_runs(live_tiles)
+    ]
+
+
+def read_tiles(seismic, index, live_tiles):
+    """
+    Read a line of the sparse layout, fetching only its live tiles.
+
+    Parameters
+    ----------
+    seismic : array like object containing sort order.
+    index : int, the index of the line along the last axis.
+    live_tiles : 1-D boolean array, True for the stored tiles of the line.
+
+    Returns
+    -------
+    traces : 2-D uint16 array (ns, n_orth), zero in the tiles not stored.
+    """
+    traces = np.zeros(seismic.shape[:2], dtype=seismic.dtype)
+    for selection in tile_selections(seismic, index, live_tiles):
+        traces[:, selection[1]] = seismic[selection]
+    return traces
 
 
 def load_line(
-    seismic, scalers, bounds, line_number, mask_val=np.nan, sort_order="inline"
+    seismic, scalers, bounds, line_number, mask_val=np.nan, sort_order="inline",
+    tiles=None,
 ):
     """
     Loads a line from the input seismic array and resizes it to a standardized size, with
@@ -63,6 +159,8 @@ def load_line(
     line_number : int, the line number to access.
     mask_val : scalar, a value to use in padding.
     sort_order : str, the sort order of the seismic array input.
+    tiles : 2-D boolean array (n_lines, n_tiles) of live tiles for the sparse
+            layout, None reads the whole line.
 
     Returns
     -------
@@ -70,38 +168,421 @@ def load_line(
     mask : 2-D boolean array, True value indicated data that has been added by padding.
     """
 
-    sort_order = sort_order.lower()
-    if sort_order not in ("inline", "crossline"):
+    index = line_index(bounds, line_number, sort_order)
+
+    if tiles is None:
+        traces = seismic[:, :, index]
+    else:
+        traces = read_tiles(seismic, index, tiles[index])
+    min_val, max_val = scalers[index, :]
+    return dequantize(traces, min_val, max_val, mask_val=mask_val)
+
+
+def load_lines(seismic, scalers, indices, mask_val=np.nan, dtype=np.float32,
+               tiles=None, workers=None):
+    """
+    Loads many lines into one preallocated cube, fetching their chunks
+    concurrently and dequantizing straight into the output.
+
+    Parameters
+    ----------
+    seismic : zarr array with lines on the last axis.
+    scalers : array like object containing the dynamic range of each line.
+    indices : int array, the indices of the lines along the last axis, in the
+              order of the output, repeats allowed.
+    mask_val : scalar written to the padding, None leaves it unmasked.
+    dtype : floating point type of the output.
+    tiles : 2-D boolean array (n_lines, n_tiles) of live tiles for the sparse
+            layout, None reads whole lines.
+    workers : number of threads fetching chunks, the ThreadPoolExecutor default
+              when None.
+
+    Returns
+    -------
+    traces : float array (..., len(indices)), a line per index in request order.
+    mask : boolean array, True value indicated data that has been added by padding.
+    """
+    indices = np.asarray(indices, dtype=np.int64).ravel()
+    shape = seismic.shape[:-1] + (len(indices),)
+    if not len(indices):
+        return np.empty(shape, dtype=dtype), np.ones(shape, dtype=bool)
+
+    first = int(indices.min())
+    scalers = np.asarray(scalers[first : int(indices.max()) + 1], dtype=np.float64)
+    min_val, max_val = scalers[indices - first, 0], scalers[indices - first, 1]
+
+    mask = np.ones(shape, dtype=bool)
+    if tiles is None:
+        traces = np.empty(shape, dtype=dtype)
+    elif mask_val is not None:
+        traces = np.full(shape, mask_val, dtype=dtype)
+    else:
+        # the unstored tiles read as quantized zeros
+        traces = np.empty(shape, dtype=dtype)
+        traces[...] = min_val - max_val / (65535 - 1)
+
+    # the requested lines of every stored chunk, so each chunk is fetched once
+    chunk = indices // seismic.chunks[-1]
+    groups = {}
+    for position in np.argsort(chunk, kind="stable"):
+        groups.setdefault(chunk[position], []).append(position)
+
+    tasks = []
+    for positions in groups.values():
+        lines = indices[positions]
+        start, stop = int(lines.min()), int(lines.max()) + 1
+        if tiles is None:
+            tasks.append((positions, start, stop, slice(None)))
+            continue
+        tile_size = seismic.chunks[1]
+        for run_start, run_stop in tile_runs(tiles[start:stop].any(axis=0)):
+            orth = slice(run_start * tile_size, min(run_stop * tile_size, seismic.shape[1]))
+            tasks.append((positions, start, stop, orth))
+
+    def read(positions, start, stop, orth):
+        block = seismic[(slice(None),) * (seismic.ndim - 2) + (orth, slice(start, stop))]
+        for position in positions:
+            dequantize(
+                block[..., indices[position] - start],
+                min_val[position],
+                max_val[position],
+                mask_val=mask_val,
+                out=traces[..., orth, position],
+                mask=mask[..., orth, position],
+            )
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(read, *task) for task in tasks]:
+            future.result()
+    return traces, mask
+
+
+horizon_reducers = {
+    "rms": lambda x: np.sqrt(np.nanmean(x ** 2, axis=-1)),
+    "mean": lambda x: np.nanmean(x, axis=-1),
+    "max": lambda x: np.nanmax(x, axis=-1),
+    "min": lambda x: np.nanmin(x, axis=-1),
+}
+
+
+def extract_horizon(seismic, scalers, horizon, window=0, reducer="rms", workers=None):
+    """
+    Samples along a horizon, reduced over a window, fetching every chunk
+    holding a horizon node once.
+
+    Parameters
+    ----------
+    seismic : zarr array (ns, n_orth, n_lines).
+    scalers : array like object containing the dynamic range of each line.
+    horizon : float array (n_orth, n_lines), the fractional sample of every
+              node, NaN where the horizon is not picked.
+    window : int or (above, below), the samples either side of the horizon.
+    reducer : one of rms, mean, max or min, or a function reducing the last axis.
+    workers : number of threads fetching chunks.
+
+    Returns
+    -------
+    values : float32 array (n_orth, n_lines), NaN where the horizon is not
+             picked, over padding or where any sample of the window is outside
+             the trace.
+    """
+    horizon = np.asarray(horizon, dtype=np.float64)
+    if horizon.shape != seismic.shape[1:]:
+        raise RuntimeError(f"horizon shape {horizon.shape} should be {seismic.shape[1:]}.")
+    if callable(reducer):
+        reduce = reducer
+    elif reducer in horizon_reducers:
+        reduce = horizon_reducers[reducer]
+    else:
         raise RuntimeError(
-            f"{sort_order} not supported, sort order should be on of inline or crossline."
+            f"{reducer} not supported, reducer should be one of {list(horizon_reducers)}."
         )
+    above, below = (window, window) if np.isscalar(window) else window
+    offsets = np.arange(-int(above), int(below) + 1)
 
-    min_inline, min_crossline, max_inline, max_crossline = bounds
+    ns = seismic.shape[0]
+    scalers = np.asarray(scalers[:], dtype=np.float64)
+    values = np.full(horizon.shape, np.nan, dtype=np.float32)
+    picked = np.isfinite(horizon)
 
-    if sort_order == "inline":
-        min_line = min_inline
-        max_line = max_inline
+    def read(start, stop):
+        orth, lines = np.nonzero(picked[:, start:stop])
+        times = horizon[orth, lines + start][:, None] + offsets
+        outside = (times < 0) | (times > ns - 1)
+        times = np.clip(times, 0, ns - 1)
+
+        # linear interpolation between the two samples around every time
+        lower = np.minimum(np.floor(times).astype(np.int64), max(ns - 2, 0))
+        upper = np.minimum(lower + 1, ns - 1)
+        fraction = (times - lower).astype(np.float32)
+
+        # only the samples and traces spanned by the nodes of this chunk
+        first, last = int(lower.min()), int(upper.max()) + 1
+        orth_first, orth_last = int(orth.min()), int(orth.max()) + 1
+        block, _ = dequantize(
+            seismic[first:last, orth_first:orth_last, start:stop],
+            scalers[start:stop, 0], scalers[start:stop, 1], dtype=np.float32,
+        )
+
+        traces = ((orth - orth_first)[:, None], lines[:, None])
+        samples = block[(lower - first,) + traces]
+        samples += fraction * (block[(upper - first,) + traces] - samples)
+        samples[outside] = np.nan
+        reduced = reduce(samples)
+        # no partial windows at the ends of the trace
+        reduced[outside.any(axis=1)] = np.nan
+        values[orth, lines + start] = reduced
+
+    step = seismic.chunks[-1]
+    chunks = [
+        (start, min(start + step, horizon.shape[1]))
+        for start in range(0, horizon.shape[1], step)
+        if picked[:, start : start + step].any()
+    ]
+    with warnings.catch_warnings(), ThreadPoolExecutor(max_workers=workers) as executor:
+        # nodes over padding reduce to NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        for future in [executor.submit(read, *chunk) for chunk in chunks]:
+            future.result()
+    return values
+
+
+def dequantize(traces, min_val, max_val, mask_val=np.nan, dtype=float, out=None,
+               mask=None):
+    """
+    Converts quantized uint16 traces back to floating point.
+
+    Parameters
+    ----------
+    traces : uint16 array, zero marks padding.
+    min_val, max_val : scalars or arrays broadcasting against traces, the
+                       dynamic range stored in the scalers.
+    mask_val : scalar written to the padding, None leaves it unmasked.
+    dtype : floating point type of the output.
+    out, mask : optional float and boolean arrays shaped as traces to write
+                into, e.g. views of a larger output, dtype is then out.dtype.
+
+    Returns
+    -------
+    traces : float array.
+    mask : boolean array, True value indicated data that has been added by padding.
+    """
+    # in place whole array ufuncs, these release the GIL for concurrent readers
+    if mask is None:
+        mask = np.less(traces, 1)
     else:
-        min_line = min_crossline
-        max_line = max_crossline
+        np.less(traces, 1, out=mask)
+    if out is None:
+        out = traces.astype(dtype)
+    else:
+        np.copyto(out, traces, casting="unsafe")
+        dtype = out.dtype
+    np.subtract(out, 1, out=out)
+    np.multiply(out, np.asarray(max_val, dtype=dtype) / (65535 - 1), out=out)
+    np.add(out, np.asarray(min_val, dtype=dtype), out=out)
+    if mask_val is not None:
+        np.copyto(out, mask_val, where=mask)
+    return out, mask
 
-    if line_number < min_line or line_number > max_line:
+
+def _dequantize_block(block, scalers, mask_val, dtype, block_info=None):
+    # lines are always the last axis of a stored volume
+    start, stop = block_info[0]["array-location"][-1]
+    min_val, max_val = scalers[start:stop, 0], scalers[start:stop, 1]
+    return dequantize(block, min_val, max_val, mask_val=mask_val, dtype=dtype)[0]
+
+
+def to_dask_array(seismic, scalers, mask_val=np.nan, dtype=np.float32):
+    """
+    Lazy dask array over a stored uint16 volume, chunked as it is stored.
+
+    Parameters
+    ----------
+    seismic : zarr array with lines on the last axis.
+    scalers : array like object containing the dynamic range of each line.
+    mask_val : scalar written to the padding.
+    dtype : floating point type of the output.
+
+    Returns
+    -------
+    array : dask array, dequantization and masking happen per chunk.
+    """
+    try:
+        import dask.array as da
+    except ImportError:
         raise RuntimeError(
-            f"{line_number} out of bounds [{min_line}, {max_line}]."
+            "dask is required for to_dask, pip install 'dask[array]'."
         )
 
-    traces = seismic[:, :, line_number - min_line]
-    mask = traces < 1
-    min_val, max_val = scalers[line_number - min_line, :]
-    traces -= 1
-    traces = traces.astype(float) * max_val / (65535 - 1)
-    traces += min_val
-    traces[mask] = mask_val
-    return traces, mask
+    # the scalers are tiny, read them once and ship them with the graph
+    scalers = np.asarray(scalers[:], dtype=np.float64)
+
+    volume = da.from_array(seismic, chunks=seismic.chunks)
+    return volume.map_blocks(
+        _dequantize_block, scalers, mask_val, dtype, dtype=dtype
+    )
+
+
+def _predicate(column, condition):
+    """ The traces of a header column meeting a condition, see query_headers. """
+    if callable(condition):
+        return np.asarray(condition(column), dtype=bool)
+    if isinstance(condition, tuple):
+        low, high = condition
+        return (column >= low) & (column <= high)
+    if isinstance(condition, (list, set, np.ndarray)):
+        return np.isin(column, list(condition))
+    return column == condition
+
+
+def query_headers(headers, where, workers=None):
+    """
+    The traces whose stored headers meet every condition, scanning the
+    header columns chunk by chunk without reading any samples.
+
+    Parameters
+    ----------
+    headers : zarr group of header columns, see rss.api.write_headers.
+    where : dict of field name to a condition, one of a value (equality), a
+            (low, high) tuple (inclusive range), a list or array of values
+            (membership) or a callable taking the column and returning a
+            boolean array.
+    workers : number of threads scanning chunks.
+
+    Returns
+    -------
+    index : int array, the matching trace indices in increasing order.
+    """
+    missing = [key for key in where if key not in headers]
+    if missing:
+        raise RuntimeError(f"headers {', '.join(missing)} not stored.")
+
+    columns = [headers[key] for key in where]
+    if not columns:
+        raise RuntimeError("query without any condition.")
+    num_traces, chunk_size = columns[0].shape[0], columns[0].chunks[0]
+
+    def scan(start):
+        stop = min(start + chunk_size, num_traces)
+        match = np.ones(stop - start, dtype=bool)
+        for column, condition in zip(columns, where.values()):
+            match &= _predicate(column[start:stop], condition)
+            if not match.any():
+                break
+        return np.nonzero(match)[0] + start
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        found = list(executor.map(scan, range(0, num_traces, chunk_size)))
+    return np.concatenate(found + [np.zeros(0, dtype=np.int64)])
+
+
+# the small arrays clients read on open, packed into one blob by rss.api.consolidate
+packed_meta_key = "meta.npz"
+packed_arrays = [
+    "bounds", "coords/inlines", "coords/crosslines", "coords/cdpx", "coords/cdpy",
+    "live", "binary_header", "RECMD", "sample_events", "segy_filenames", "gather/offsets",
+    "time_index",
+]
+
+
+def open_root(store):
+    """
+    Opens a store read-only, from its consolidated metadata when it has some.
+
+    Parameters
+    ----------
+    store : zarr store.
+
+    Returns
+    -------
+    root : zarr group.
+    meta : dict of the arrays packed by rss.api.consolidate, empty for stores
+           written without.
+    """
+    # the blob before the shapes, rss.api.consolidate writes them the other way
+    # round, so arrays are never smaller than the packed bounds index
+    try:
+        data = store[packed_meta_key]
+    except KeyError:
+        data = None
+
+    try:
+        root = zarr.open_consolidated(store, mode="r")
+    except KeyError:
+        return zarr.open(store, mode="r"), {}
+
+    if data is None:
+        return root, {}
+    with np.load(io.BytesIO(data)) as npz:
+        meta = {key: npz[key] for key in npz.files}
+    if "binary_header" in meta:
+        meta["binary_header"] = json.loads(str(meta["binary_header"]))
+    return root, meta
+
+
+def reopen(root, chunk_store):
+    """ The group root reading its chunks from chunk_store, e.g. a cache, without
+        reading the metadata again when it is consolidated.
+    """
+    if isinstance(root.store, zarr.storage.ConsolidatedMetadataStore):
+        return zarr.open_group(root.store, mode="r", chunk_store=chunk_store)
+    return zarr.open(chunk_store, mode="r")
+
+
+def points_in_polygon(points, polygon):
+    """
+    Which points lie inside a polygon, by counting the edges a ray from
+    every point crosses, vectorized over the points.
+
+    Parameters
+    ----------
+    points : (n, 2) float array of x/y.
+    polygon : (m, 2) float array of the x/y of the vertices, open or closed.
+
+    Returns
+    -------
+    inside : (n,) boolean array.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    polygon = np.asarray(polygon, dtype=np.float64)
+    if polygon.ndim != 2 or polygon.shape[1] != 2 or len(polygon) < 3:
+        raise RuntimeError("the polygon should be an (n, 2) array of at least 3 vertices.")
+
+    # only the points in the bounding box can be inside
+    inside = np.zeros(len(points), dtype=bool)
+    candidates = np.flatnonzero(
+        np.all((points >= polygon.min(axis=0)) & (points <= polygon.max(axis=0)), axis=1)
+    )
+    x, y = points[candidates, 0], points[candidates, 1]
+    crossings = np.zeros(len(candidates), dtype=bool)
+    for (x0, y0), (x1, y1) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        if y0 == y1:
+            continue
+        straddles = (y0 > y) != (y1 > y)
+        crossings ^= straddles & (x < x0 + (y - y0) * (x1 - x0) / (y1 - y0))
+    inside[candidates] = crossings
+    return inside
+
+
+def unpack_live(packed, num_crosslines):
+    """
+    Unpacks the live trace bitmap written by rss.api.pack_live.
+
+    Parameters
+    ----------
+    packed : uint8 array (n_inlines, ceil(n_crosslines / 8)).
+    num_crosslines : int, the number of crosslines in the survey.
+
+    Returns
+    -------
+    live : 2-D boolean array (n_inlines, n_crosslines), True where there is a trace.
+    """
+    return np.unpackbits(packed, axis=1, count=num_crosslines).astype(bool)
 
 
 class rssClient:
-    def __init__(self, store, cache_size=512 * (1024 ** 2)):
+    def __init__(self, store, cache_size=512 * (1024 ** 2), cache=None, name=None,
+                 decoded_cache=None):
         """
         rss format data access.
 
@@ -110,43 +591,93 @@ class rssClient:
         store - Instance of s ZArr storage object,
                 see s3fs.S3Map for remote s3 storage, or zarr.DirectoryStore as common
                 types of store.
+        cache_size - max size of the private LRU cache in bytes.
+        cache - a cache shared with other clients, e.g. rss.cache.SharedLRUCache,
+                used instead of a private LRU cache.
+        name - the namespace of this store in a shared cache.
+        decoded_cache - optional rss.cache.DecodedCache of dequantized lines, may be
+                        shared with other clients, its lines are returned read-only.
         """
 
-        # don't cache meta-data read once
-        self.root = zarr.open(store, mode="r")
+        # kept to open the store again, see reopen
+        self._store = store
+        self._open_kwargs = dict(cache_size=cache_size, cache=cache, name=name,
+                                 decoded_cache=decoded_cache)
+
+        # don't cache meta-data read once, a consolidated store opens in two requests
+        self.root, self.meta = open_root(store)
 
         clear_output()
         print("Mounting line access.")
 
-        cache = zarr.LRUStoreCache(store, max_size=cache_size)
+        # concurrent misses on the same chunk share one fetch
+        if cache is None:
+            cache = zarr.LRUStoreCache(CoalescingStore(store), max_size=cache_size)
+        else:
+            cache = cache.mount(CoalescingStore(store), name=name)
+        self.cache = cache
 
-        inline_root = zarr.open(cache, mode="r")
-        self.inline_root = inline_root["inline"]
+        # prestack stores may hold only the gathers, poststack ones only lines
+        cached_root = reopen(self.root, cache)
 
-        crossline_root = zarr.open(cache, mode="r")
-        self.crossline_root = crossline_root["crossline"]
+        # hot lines come back without decompressing them again
+        self.decoded_cache = decoded_cache
+        if decoded_cache is not None:
+            self._decoded_name = decoded_cache.namespace(name)
+        self.inline_root = cached_root["inline"] if "inline" in cached_root else None
+        self.crossline_root = cached_root["crossline"] if "crossline" in cached_root else None
+        self.gather_root = cached_root["gather"] if "gather" in cached_root else None
 
         clear_output()
         print("Configuring meta-data.")
 
-        self.bounds = self.root["bounds"]
+        self.bounds = self._meta("bounds")
 
         self.ilxl = np.vstack(
-            [
-                self.root["coords"]["inlines"][:],
-                self.root["coords"]["crosslines"][:],
-            ]
+            [self._meta("coords/inlines"), self._meta("coords/crosslines")]
         ).T
 
-        self.xy = np.vstack(
-            [self.root["coords"]["cdpx"][:], self.root["coords"]["cdpy"][:]]
-        ).T
+        self.xy = np.vstack([self._meta("coords/cdpx"), self._meta("coords/cdpy")]).T
+
+        # the offset (or angle) of every trace of a prestack gather
+        self.offsets = None if self.gather_root is None else self._meta("gather/offsets")
 
         self.kdtree = None
+        self._kdtree_lock = threading.Lock()
+
+        # the live trace bitmap, read on first use
+        self._live = None
+        self._live_lock = threading.Lock()
+
+        # the live tiles of sparse layouts, per sort order
+        self._tiles = {}
+        self._tiles_lock = threading.Lock()
 
         clear_output()
         print("Connection complete.")
 
+    def _meta(self, key):
+        """ A small array read on open, from the packed blob when there is one. """
+        if key in self.meta:
+            return self.meta[key]
+        return self.root[key][:]
+
+    def reopen(self):
+        """
+        A new client of the same store reading its metadata again, e.g. after
+        traces were appended in place. The chunks and lines cached for this
+        store are dropped, appending rewrites some of them.
+
+        Returns
+        -------
+        client : rssClient.
+        """
+        if isinstance(self.cache, CachedStore):
+            self.cache.cache.invalidate(self.cache.name)
+        if self.decoded_cache is not None:
+            self.decoded_cache.invalidate(self._decoded_name)
+        return rssClient(self._store, **self._open_kwargs)
+
     def query_by_xy(self, xy, k=4):
         """
         Query k inline/crossline coordinates closest to this x/y coordinate.
@@ -162,19 +693,62 @@ class rssClient:
         ilxl - list, a list of inline/crossling coordinate nearest to the point x/y.
         """
 
-        if self.kdtree is None:
-            print(
-                "Assembling a tree to map il/xl to x/y. \n"
-                + "This could take a couple of minutes, \n"
-                + "But only happens one time."
-            )
-            self.kdtree = KDTree(data=self.xy)
+        with self._kdtree_lock:
+            if self.kdtree is None:
+                from scipy.spatial import KDTree
+
+                print(
+                    "Assembling a tree to map il/xl to x/y. \n"
+                    + "This could take a couple of minutes, \n"
+                    + "But only happens one time."
+                )
+                self.kdtree = KDTree(data=self.xy)
 
         dist, index = self.kdtree.query(np.atleast_2d(xy), k=k)
         ilxl = [self.ilxl[i, :] for i in index]
         return dist, ilxl
 
-    def line(self, line_number, sort_order="inline"):
+    def _line_root(self, sort_order, attribute=None):
+        sort_order = sort_order.lower()
+        if sort_order not in ("inline", "crossline"):
+            raise RuntimeError(
+                f"{sort_order} not supported, sort order should be on of inline or crossline."
+            )
+
+        if sort_order == "inline":
+            line_root = self.inline_root
+        else:
+            line_root = self.crossline_root
+        if line_root is None:
+            raise RuntimeError(f"{sort_order} sort order not stored.")
+
+        if attribute is not None:
+            if attribute not in self.attributes(sort_order):
+                raise RuntimeError(
+                    f"attribute {attribute} not found in the {sort_order} sort order."
+                )
+            line_root = line_root["attributes"][attribute]
+        return line_root
+
+    def tiles(self, sort_order="inline"):
+        """
+        The live tiles of a sort order stored with the sparse layout.
+
+        Returns
+        -------
+        tiles : 2-D boolean array (n_lines, n_tiles) or None for the dense layout.
+        """
+        sort_order = sort_order.lower()
+        with self._tiles_lock:
+            if sort_order not in self._tiles:
+                line_root = self.root[sort_order]
+                if line_root.attrs.get("layout", "dense") == "sparse":
+                    self._tiles[sort_order] = line_root["tiles"][:]
+                else:
+                    self._tiles[sort_order] = None
+            return self._tiles[sort_order]
+
+    def line(self, line_number, sort_order="inline", attribute=None):
         """
         Read a line from the rss data.
 
@@ -182,6 +756,8 @@ class rssClient:
         ----------
         line_number : the line number to read.
         sort_order : one of 'inline' or 'crossline' depending on your preference.
+        attribute : name of a computed attribute to read instead of the seismic,
+                    see rss.attributes.compute_attribute.
 
         Returns
         -------
@@ -189,21 +765,326 @@ class rssClient:
         mask : 2-D boolean array, False value indicated data that has been added by padding.
         """
 
-        sort_order = sort_order.lower()
-        if sort_order not in ("inline", "crossline"):
-            raise RuntimeError(
-                f"{sort_order} not supported, sort order should be on of inline or crossline."
+        line_root = self._line_root(sort_order, attribute)
+        seismic = line_root["seismic"]
+        scalers = line_root["scalers"]
+
+        def read():
+            return load_line(
+                seismic, scalers, self.bounds, line_number, sort_order=sort_order,
+                tiles=self.tiles(sort_order),
             )
 
-        if sort_order == "inline":
-            seismic = self.inline_root["seismic"]
-            scalers = self.inline_root["scalers"]
+        if self.decoded_cache is None:
+            return read()
+        key = self._decoded_key(seismic, line_index(self.bounds, line_number, sort_order))
+        return self.decoded_cache.cached(key, read)
+
+    def _decoded_key(self, seismic, index, dtype=float):
+        """ The key of a dequantized result in the decoded cache. """
+        return (self._decoded_name, seismic.path, index, np.dtype(dtype).str)
+
+    def _headers(self):
+        if "headers" not in self.root:
+            raise RuntimeError("trace headers not stored, ingest the survey again to keep them.")
+        return self.root["headers"]
+
+    def trace_headers(self, fields=None, index=None):
+        """
+        Stored trace header columns, in the order of the traces in the SEGY file.
+
+        Parameters
+        ----------
+        fields : list of header names (rss.segy.trace_header_fields), all by default.
+        index : optional int array of trace indices, e.g. from query.
+
+        Returns
+        -------
+        headers : dict of field name to an int array, coordinates are not scaled.
+        """
+        headers = self._headers()
+        fields = sorted(headers.array_keys()) if fields is None else fields
+        if index is None:
+            return {key: headers[key][:] for key in fields}
+        index = np.asarray(index, dtype=np.int64)
+        return {key: headers[key].get_coordinate_selection(index) for key in fields}
+
+    def query(self, where, output="ilxl", workers=None):
+        """
+        Find the traces whose headers meet conditions, without reading samples.
+
+        Parameters
+        ----------
+        where : dict of header name to a condition, see rss.client.query_headers,
+                e.g. {'offset': (0, 500), 'trid': 1}.
+        output : 'ilxl' for the inline/crossline of the traces or 'index' for
+                 their trace indices.
+        workers : number of threads scanning header chunks.
+
+        Returns
+        -------
+        traces : int array (n, 2) of inline/crossline or (n,) of trace indices.
+        """
+        if output not in ("ilxl", "index"):
+            raise RuntimeError(f"{output} not supported, output should be one of ilxl or index.")
+        index = query_headers(self._headers(), where, workers=workers)
+        return self.ilxl[index] if output == "ilxl" else index
+
+    def lines(self, line_numbers, sort_order="inline", attribute=None,
+              mask_val=np.nan, dtype=np.float32, workers=None):
+        """
+        Read many lines at once into one cube, fetching their chunks concurrently.
+
+        Parameters
+        ----------
+        line_numbers : list of line numbers, repeats allowed.
+        sort_order : one of 'inline' or 'crossline'.
+        attribute : name of a computed attribute to read instead of the seismic.
+        mask_val : scalar written to the padding.
+        dtype : floating point type of the output.
+        workers : number of threads fetching chunks.
+
+        Returns
+        -------
+        traces : 3-D float array (ns, n_orth, len(line_numbers)), the lines in request order.
+        mask : 3-D boolean array, True value indicated data that has been added by padding.
+        """
+        line_root = self._line_root(sort_order, attribute)
+        indices = [line_index(self.bounds, i, sort_order) for i in line_numbers]
+
+        return load_lines(
+            line_root["seismic"], line_root["scalers"], indices, mask_val=mask_val,
+            dtype=dtype, tiles=self.tiles(sort_order), workers=workers,
+        )
+
+    def _gathers(self, inlines, crosslines, offsets, mask_val, dtype):
+        """ Dequantized gathers over inclusive (first, last) inline and crossline ranges. """
+        if self.gather_root is None:
+            raise RuntimeError("prestack gathers not stored, ingest with the gather sort order.")
+
+        first_inline, last_inline = [line_index(self.bounds, i, "inline") for i in inlines]
+        first_crossline, last_crossline = [
+            line_index(self.bounds, i, "crossline") for i in crosslines
+        ]
+        window = (slice(first_inline, last_inline + 1), slice(first_crossline, last_crossline + 1))
+
+        # only the chunks of the window are fetched
+        traces = self.gather_root["seismic"][(slice(None), offsets) + window]
+        scalers = self.gather_root["scalers"][window]
+        return dequantize(
+            traces, scalers[..., 0], scalers[..., 1], mask_val=mask_val, dtype=dtype
+        )
+
+    def gather(self, inline, crossline, mask_val=np.nan, dtype=np.float32):
+        """
+        Read the prestack gather at an inline/crossline, a single chunk fetch.
+
+        Returns
+        -------
+        traces : 2-D float array (ns, n_offsets), the offsets are in self.offsets.
+        mask : 2-D boolean array, True value indicated data that has been added by padding.
+        """
+        traces, mask = self._gathers(
+            (inline, inline), (crossline, crossline), slice(None), mask_val, dtype
+        )
+        return traces[:, :, 0, 0], mask[:, :, 0, 0]
+
+    def gathers(self, inlines, crosslines, mask_val=np.nan, dtype=np.float32):
+        """
+        Read a neighbourhood of prestack gathers, e.g. for a supergather.
+
+        Parameters
+        ----------
+        inlines : (first, last) inlines, inclusive.
+        crosslines : (first, last) crosslines, inclusive.
+
+        Returns
+        -------
+        traces : 4-D float array (ns, n_offsets, n_inlines, n_crosslines).
+        mask : 4-D boolean array, True value indicated data that has been added by padding.
+        """
+        return self._gathers(inlines, crosslines, slice(None), mask_val, dtype)
+
+    def offset_plane(self, offset, inlines=None, crosslines=None, mask_val=np.nan,
+                     dtype=np.float32):
+        """
+        Read one offset (or angle) of every prestack gather in an area.
+
+        A chunk holds all the offsets of its gathers, so limit the area to
+        fetch less than the whole survey.
+
+        Parameters
+        ----------
+        offset : one of self.offsets.
+        inlines : (first, last) inlines, inclusive, all by default.
+        crosslines : (first, last) crosslines, inclusive, all by default.
+
+        Returns
+        -------
+        traces : 3-D float array (ns, n_inlines, n_crosslines).
+        mask : 3-D boolean array, True value indicated data that has been added by padding.
+        """
+        if self.gather_root is None:
+            raise RuntimeError("prestack gathers not stored, ingest with the gather sort order.")
+        index = np.flatnonzero(self.offsets == offset)
+        if len(index) == 0:
+            raise RuntimeError(f"offset {offset} not stored, offsets are {self.offsets.tolist()}.")
+
+        min_inline, min_crossline, max_inline, max_crossline = self.bounds
+        inlines = (min_inline, max_inline) if inlines is None else inlines
+        crosslines = (min_crossline, max_crossline) if crosslines is None else crosslines
+        return self._gathers(inlines, crosslines, int(index[0]), mask_val, dtype)
+
+    def extract_horizon(self, horizon, window=0, reducer="rms", sort_order="inline",
+                        attribute=None, workers=None):
+        """
+        Extract amplitudes along an interpreted horizon, one pass over the
+        chunks holding its nodes, see rss.client.extract_horizon.
+
+        Parameters
+        ----------
+        horizon : float array (n_inlines, n_crosslines) indexed from the bounds,
+                  the fractional sample of every node (times in ms divided by
+                  the sample rate), NaN where the horizon is not picked.
+        window : int or (above, below), the samples either side of the horizon.
+        reducer : one of rms, mean, max or min, or a function reducing the last axis.
+        sort_order : the stored sort order to read from.
+        attribute : name of a computed attribute to read instead of the seismic.
+        workers : number of threads fetching chunks.
+
+        Returns
+        -------
+        values : float32 array (n_inlines, n_crosslines).
+        """
+        line_root = self._line_root(sort_order, attribute)
+        horizon = np.asarray(horizon, dtype=np.float64)
+
+        # the stored layout is (orthogonal line, line)
+        if sort_order.lower() == "inline":
+            horizon = horizon.T
+        values = extract_horizon(
+            line_root["seismic"], line_root["scalers"], horizon, window=window,
+            reducer=reducer, workers=workers,
+        )
+        return values.T if sort_order.lower() == "inline" else values
+
+    async def aline(self, line_number, sort_order="inline", attribute=None):
+        """
+        Read a line from the rss data without blocking the event loop, see line.
+
+        The chunks are fetched concurrently through the async interface of the
+        store (e.g. s3fs) and decoded off the event loop, so many requests in
+        flight overlap their latency.
+        """
+        line_root = self._line_root(sort_order, attribute)
+        index = line_index(self.bounds, line_number, sort_order)
+
+        if self.decoded_cache is not None:
+            key = self._decoded_key(line_root["seismic"], index)
+            try:
+                return self.decoded_cache.get(key)
+            except KeyError:
+                pass
+
+        tiles = self.tiles(sort_order)
+        if tiles is None:
+            seismic, scalers = await asyncio.gather(
+                aread(line_root["seismic"], (slice(None), slice(None), index)),
+                aread(line_root["scalers"], (index, slice(None))),
+            )
         else:
-            seismic = self.crossline_root["seismic"]
-            scalers = self.crossline_root["scalers"]
+            selections = tile_selections(line_root["seismic"], index, tiles[index])
+            scalers, *runs = await asyncio.gather(
+                aread(line_root["scalers"], (index, slice(None))),
+                *[aread(line_root["seismic"], selection) for selection in selections],
+            )
+            seismic = np.zeros(line_root["seismic"].shape[:2], dtype=np.uint16)
+            for selection, run in zip(selections, runs):
+                seismic[:, selection[1]] = run
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, dequantize, seismic, scalers[0], scalers[1]
+        )
+        if self.decoded_cache is not None:
+            self.decoded_cache.put(key, result)
+        return result
+
+    async def atrace(self, inline, crossline):
+        """
+        Read a trace from the rss data without blocking the event loop, see trace.
+        """
+        inline_index = line_index(self.bounds, inline, "inline")
+        crossline_index = line_index(self.bounds, crossline, "crossline")
 
-        return load_line(
-            seismic, scalers, self.bounds, line_number, sort_order=sort_order
+        seismic, scalers = await asyncio.gather(
+            aread(self.inline_root["seismic"],
+                  (slice(None), crossline_index, inline_index)),
+            aread(self.inline_root["scalers"], (inline_index, slice(None))),
+        )
+        return dequantize(seismic, scalers[0], scalers[1], mask_val=None)
+
+    def time_slice(self, sample, sort_order="inline", mask_val=np.nan):
+        """
+        Read a time slice from the rss data, this touches every stored line.
+
+        Parameters
+        ----------
+        sample : int, the sample index of the slice.
+        sort_order : the stored sort order to read from.
+        mask_val : scalar, a value to use in padding.
+
+        Returns
+        -------
+        traces : 2-D float array (n_inlines, n_crosslines) for the specified sample.
+        mask : 2-D boolean array, True value indicated data that has been added by padding.
+        """
+
+        line_root = self._line_root(sort_order)
+
+        seismic = line_root["seismic"]
+        if sample < 0 or sample >= seismic.shape[0]:
+            raise RuntimeError(
+                f"{sample} out of bounds [0, {seismic.shape[0] - 1}]."
+            )
+
+        scalers = line_root["scalers"][:]
+        traces, mask = dequantize(
+            seismic[sample, :, :], scalers[:, 0], scalers[:, 1], mask_val=mask_val
+        )
+
+        # the stored layout is (orthogonal line, line)
+        if sort_order.lower() == "inline":
+            return traces.T, mask.T
+        return traces, mask
+
+    def attributes(self, sort_order="inline"):
+        """
+        Names of the attributes computed for a sort order.
+        """
+        line_root = self.root[sort_order.lower()]
+        if "attributes" not in line_root:
+            return []
+        return sorted(line_root["attributes"].group_keys())
+
+    def to_dask(self, sort_order="inline", mask_val=np.nan, dtype=np.float32):
+        """
+        A lazy view of the whole volume for out of core computation.
+
+        Parameters
+        ----------
+        sort_order : one of 'inline' or 'crossline' depending on your preference.
+        mask_val : scalar, a value to use in padding.
+        dtype : floating point type of the output.
+
+        Returns
+        -------
+        volume : dask array (ns, n_orth, n_lines), one chunk per stored line.
+        """
+
+        line_root = self._line_root(sort_order)
+
+        return to_dask_array(
+            line_root["seismic"], line_root["scalers"], mask_val=mask_val, dtype=dtype
         )
 
     def trace(self, inline, crossline):
@@ -224,12 +1105,221 @@ class rssClient:
         seismic = self.inline_root["seismic"]
         scalers = self.inline_root["scalers"]
 
+        if not self.is_live(inline, crossline):
+            # padding, answer without fetching the line
+            index = line_index(self.bounds, inline, "inline")
+            line_index(self.bounds, crossline, "crossline")
+            min_val, max_val = scalers[index, :]
+            trace = np.zeros(seismic.shape[0], dtype=np.uint16)
+            return dequantize(trace, min_val, max_val, mask_val=None)
+
         return load_trace(seismic, scalers, self.bounds, inline, crossline)
 
+    def footprint(self):
+        """
+        The il/xl cells of the survey that hold a live trace.
+
+        Returns
+        -------
+        live : 2-D boolean array (n_inlines, n_crosslines), indexed from the
+               minimum inline/crossline in bounds.
+        """
+        with self._live_lock:
+            if self._live is None:
+                if "live" in self.root:
+                    self._live = unpack_live(
+                        self._meta("live"), self.root["live"].attrs["num_crosslines"]
+                    )
+                else:
+                    # older stores, rebuild it from the trace coordinates
+                    min_inline, min_crossline, max_inline, max_crossline = self.bounds
+                    live = np.zeros(
+                        (max_inline - min_inline + 1, max_crossline - min_crossline + 1),
+                        dtype=bool,
+                    )
+                    live[self.ilxl[:, 0] - min_inline, self.ilxl[:, 1] - min_crossline] = True
+                    self._live = live
+            return self._live
+
+    def is_live(self, inline, crossline):
+        """
+        Is there a trace at these coordinates, answered without reading any traces.
+
+        Parameters
+        ----------
+        inline : int or array of inline coordinates.
+        crossline : int or array of crossline coordinates.
+
+        Returns
+        -------
+        is_live : boolean or boolean array, False for padding or coordinates
+                  outside the survey.
+        """
+        live = self.footprint()
+        min_inline, min_crossline = self.bounds[0], self.bounds[1]
+
+        il = np.asarray(inline) - min_inline
+        xl = np.asarray(crossline) - min_crossline
+        inside = (il >= 0) & (il < live.shape[0]) & (xl >= 0) & (xl < live.shape[1])
+
+        result = np.zeros(np.broadcast(il, xl).shape, dtype=bool)
+        il, xl, inside = np.broadcast_arrays(il, xl, inside)
+        result[inside] = live[il[inside], xl[inside]]
+        return result if result.ndim else bool(result)
+
+    def outline(self):
+        """
+        The live traces on the edge of the survey footprint.
+
+        Returns
+        -------
+        ilxl : (n, 2) int array of inline/crossline coordinates of live traces
+               with a dead or missing neighbour.
+        """
+        live = self.footprint()
+        padded = np.pad(live, 1)
+        interior = (
+            padded[:-2, 1:-1] & padded[2:, 1:-1] & padded[1:-1, :-2] & padded[1:-1, 2:]
+        )
+        il, xl = np.nonzero(live & ~interior)
+        return np.stack([il + self.bounds[0], xl + self.bounds[1]], axis=1)
+
+    def polygon_traces(self, xy_polygon):
+        """
+        The traces whose cdp x/y lies inside a polygon, from the stored coords.
+
+        Parameters
+        ----------
+        xy_polygon : (n, 2) array of the easting/northing of the vertices.
+
+        Returns
+        -------
+        index : int array of the traces, in the order of the SEGY file, see self.ilxl.
+        """
+        return np.flatnonzero(points_in_polygon(self.xy, xy_polygon))
+
+    def _polygon_blocks(self, ilxl, samples, sort_order, prefetch):
+        """ The clipped traces of every line holding some, prefetch lines ahead. """
+        line_root = self._line_root(sort_order)
+        seismic = line_root["seismic"]
+        scalers = line_root["scalers"][:]
+
+        axis = 0 if sort_order.lower() == "inline" else 1
+        min_orth = self.bounds[1 - axis]
+
+        # the cells inside the polygon grouped by line
+        cells = np.unique(ilxl, axis=0)
+        cells = cells[np.lexsort((cells[:, 1 - axis], cells[:, axis]))]
+        starts = np.flatnonzero(np.diff(cells[:, axis], prepend=cells[0, axis] - 1))
+        groups = np.split(cells[:, 1 - axis], starts[1:])
+
+        def read(line_number, orth_lines):
+            index = line_index(self.bounds, line_number, sort_order)
+            first, last = orth_lines[0] - min_orth, orth_lines[-1] - min_orth + 1
+            block = seismic[samples[0] : samples[1], first:last, index]
+            traces, _ = dequantize(
+                block[:, orth_lines - min_orth - first], scalers[index, 0], scalers[index, 1],
+                mask_val=None, dtype=np.float32,
+            )
+            return int(line_number), orth_lines, traces
+
+        with ThreadPoolExecutor(max_workers=prefetch) as executor:
+            pending = deque()
+            for line_number, orth_lines in zip(cells[starts, axis], groups):
+                pending.append(executor.submit(read, line_number, orth_lines))
+                if len(pending) > prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def extract_polygon(self, xy_polygon, t_range=None, sort_order="inline", output=None,
+                        prefetch=4):
+        """
+        Clip the survey to a polygon in x/y, e.g. a lease, streaming the lines
+        holding traces inside it. Only their chunks are read, a line at a time
+        with prefetch lines in flight, so memory is bounded whatever the size
+        of the polygon.
+
+        Parameters
+        ----------
+        xy_polygon : (n, 2) array of the easting/northing of the vertices.
+        t_range : (first, last) samples, inclusive, all by default.
+        sort_order : the stored sort order to read from.
+        output : None for a generator of blocks, or the path or zarr store of a
+                 new rss store to write the clipped traces to, in this sort order.
+        prefetch : int, lines fetched ahead of the consumer.
+
+        Returns
+        -------
+        blocks : generator of (line_number, orth_lines, traces), traces is a
+                 float32 array (n_samples, len(orth_lines)) of the clipped traces
+                 of every line, or the root group of the new store.
+        """
+        ns = self._line_root(sort_order)["seismic"].shape[0]
+        first, last = (0, ns - 1) if t_range is None else t_range
+        if first < 0 or last >= ns or first > last:
+            raise RuntimeError(f"t_range {t_range} out of bounds [0, {ns - 1}].")
+
+        index = self.polygon_traces(xy_polygon)
+        if len(index) == 0:
+            raise RuntimeError("no traces inside the polygon.")
+
+        blocks = self._polygon_blocks(self.ilxl[index], (first, last + 1), sort_order, prefetch)
+        if output is None:
+            return blocks
+
+        from rss.api import write_clipped
+
+        binary_header = dict(self.root.attrs.get("binary_header", {}), ns=last - first + 1)
+        return write_clipped(output, blocks, self.ilxl[index], self.xy[index], binary_header,
+                             sort_order=sort_order)
+
+    def traces(self, ilxl, sort_order="inline", mask_val=np.nan):
+        """
+        Read many traces, grouped so each stored line is fetched once and
+        dead traces are not fetched at all.
+
+        Parameters
+        ----------
+        ilxl : (n, 2) array of inline/crossline coordinates.
+        sort_order : the stored sort order to read from.
+        mask_val : scalar, a value to use in padding.
+
+        Returns
+        -------
+        traces : 2-D float array (ns, n), in the order of ilxl.
+        mask : 1-D boolean array, True for padding or coordinates outside the survey.
+        """
+        ilxl = np.atleast_2d(np.asarray(ilxl, dtype=int))
+        line_root = self._line_root(sort_order)
+        seismic = line_root["seismic"]
+        scalers = line_root["scalers"]
+
+        live = self.is_live(ilxl[:, 0], ilxl[:, 1])
+        out = np.full((seismic.shape[0], len(ilxl)), mask_val, dtype=float)
+
+        if sort_order.lower() == "inline":
+            lines = ilxl[:, 0] - self.bounds[0]
+            orth = ilxl[:, 1] - self.bounds[1]
+        else:
+            lines = ilxl[:, 1] - self.bounds[1]
+            orth = ilxl[:, 0] - self.bounds[0]
+
+        for index in np.unique(lines[live]):
+            selected = np.flatnonzero(live & (lines == index))
+            min_val, max_val = scalers[index, :]
+            block = seismic.get_orthogonal_selection(
+                (slice(None), orth[selected], int(index))
+            )
+            out[:, selected] = dequantize(block, min_val, max_val, mask_val=mask_val)[0]
+
+        return out, ~live
+
 
 class rssFromS3(rssClient):
     def __init__(
-        self, filename, client_kwargs=None, cache_size=512 * (1024 ** 2)
+        self, filename, client_kwargs=None, cache_size=512 * (1024 ** 2),
+        s3=None, cache=None, name=None, decoded_cache=None,
     ):
         """
         An object for accessing rss data from s3 blob storage.
@@ -240,31 +1330,44 @@ class rssFromS3(rssClient):
         client_kwargs : dict containing aws_access_key_id and aws_secret_access_key or None.
         If this variable is none, anonymous access is assumed.
         cache_size : max size of the LRU cache.
+        s3 : an existing s3fs.S3FileSystem to share, client_kwargs is ignored.
+        cache : a shared cache, see rssClient.
+        name : the namespace of this store in a shared cache, defaults to filename.
+        decoded_cache : a cache of dequantized lines, see rssClient.
         """
-        print("Establishing Connection, may take a minute ......")
+        import s3fs
 
-        anon = client_kwargs is None
+        if s3 is None:
+            print("Establishing Connection, may take a minute ......")
 
-        s3 = s3fs.S3FileSystem(anon=anon, client_kwargs=client_kwargs)
+            anon = client_kwargs is None
 
-        clear_output()
-        print("Connected to S3.")
+            s3 = s3fs.S3FileSystem(anon=anon, client_kwargs=client_kwargs)
+
+            clear_output()
+            print("Connected to S3.")
 
         store = s3fs.S3Map(root=filename, s3=s3, check=False)
 
-        super().__init__(store, cache_size=cache_size)
+        super().__init__(store, cache_size=cache_size, cache=cache,
+                         name=name or filename, decoded_cache=decoded_cache)
 
 
 class rssFromFile(rssClient):
-    def __init__(self, filename, cache_size=512 * (1024 ** 2)):
+    def __init__(self, filename, cache_size=512 * (1024 ** 2), cache=None, name=None,
+                 decoded_cache=None):
         """
         An object for accessing rss data from s3 blob storage.
 
         Parameters
         ----------
         filename : path to rss data object on disk.
+        cache : a shared cache, see rssClient.
+        name : the namespace of this store in a shared cache, defaults to filename.
+        decoded_cache : a cache of dequantized lines, see rssClient.
         """
 
         store = zarr.DirectoryStore(f"{filename}")
         root = zarr.open(store, mode="r")
-        super().__init__(store, cache_size=cache_size)
+        super().__init__(store, cache_size=cache_size, cache=cache,
+                         name=name or filename, decoded_cache=decoded_cache)
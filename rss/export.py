@@ -0,0 +1,249 @@
+""" Streaming SEGY export of an rss store, the reverse of read_trace_data.
+
+    Whole chunks of lines are read from the store, dequantized and encoded
+    as blocks of traces (samples and trace headers at once), so the cost per
+    trace is a few array copies. Blocks are encoded by a pool of threads and
+    either appended in order through a large write buffer or written straight
+    to their byte range with os.pwrite, the offset of every line being known
+    up front from the live trace bitmap.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import numpy as np
+import tqdm
+import zarr
+
+from rss.api import byte_locations as default_byte_locations
+from rss.client import dequantize, unpack_live
+from rss.segy import (encode_samples, headers_offset, make_binary_header,
+                      make_text_header, pack_headers, trace_header_size)
+
+
+trace_locations = {
+    "tracl": (1, 4, ">i"),
+    "ns": (115, 2, ">H"),
+    "dt": (117, 2, ">H"),
+}
+
+
+def from_coord(x, scalco):
+    """ The inverse of rss.api.to_coord, integer header values of coordinates. """
+    if scalco > 0:
+        return np.rint(x / scalco).astype(np.int64)
+    return np.rint(x * abs(scalco)).astype(np.int64)
+
+
+def _live_grid(root):
+    """ The live bitmap (n_inlines, n_crosslines) and per cell trace index. """
+    bounds = root["bounds"][:]
+    inlines = root["coords"]["inlines"][:]
+    crosslines = root["coords"]["crosslines"][:]
+
+    shape = (bounds[2] - bounds[0] + 1, bounds[3] - bounds[1] + 1)
+    trace_index = np.full(shape, -1, dtype=np.int64)
+    trace_index[inlines - bounds[0], crosslines - bounds[1]] = np.arange(len(inlines))
+
+    if "live" in root:
+        live = unpack_live(root["live"][:], root["live"].attrs["num_crosslines"])
+    else:
+        live = trace_index >= 0
+    return bounds, live, trace_index
+
+
+class _Exporter:
+    def __init__(self, root, sort_order, binary_format, sample_rate_ms,
+                 byte_locations, scalco):
+        self.seismic = root[sort_order]["seismic"]
+        self.scalers = root[sort_order]["scalers"][:]
+        self.sort_order = sort_order
+        self.binary_format = binary_format
+        # trace sequence number, number of samples and sample interval too
+        self.byte_locations = dict(trace_locations, **byte_locations)
+        self.scalco = scalco
+        self.dt = int(round(sample_rate_ms * 1000))
+
+        self.bounds, live, trace_index = _live_grid(root)
+        self.cdpx = root["coords"]["cdpx"][:]
+        self.cdpy = root["coords"]["cdpy"][:]
+
+        # (n_lines, n_orth) in the stored sort order
+        if sort_order == "inline":
+            self.live, self.trace_index = live, trace_index
+        else:
+            self.live, self.trace_index = live.T, trace_index.T
+
+        self.ns = self.seismic.shape[0]
+        self.trace_size = trace_header_size + 4 * self.ns
+
+        # first trace of every line in the output file
+        num_live = self.live.sum(axis=1)
+        self.first_trace = np.concatenate([[0], np.cumsum(num_live)])
+
+    @property
+    def num_traces(self):
+        return int(self.first_trace[-1])
+
+    def encode(self, start, stop):
+        """ The SEGY bytes of the live traces of lines [start, stop). """
+        live = self.live[start:stop]
+        if not live.any():
+            return b""
+
+        # (ns, n_orth, n_lines) -> (n_lines, n_orth, ns), traces in file order
+        block = self.seismic[..., start:stop].transpose(2, 1, 0)[live]
+        line = np.nonzero(live)[0]
+        traces, _ = dequantize(
+            block,
+            self.scalers[start + line, :1],
+            self.scalers[start + line, 1:],
+            mask_val=None,
+            dtype=np.float32,
+        )
+
+        num_traces = len(traces)
+        trace_index = self.trace_index[start:stop][live]
+
+        line_number, orth_number = np.nonzero(live)
+        line_number = line_number + start
+        if self.sort_order == "inline":
+            inline = line_number + self.bounds[0]
+            crossline = orth_number + self.bounds[1]
+        else:
+            inline = orth_number + self.bounds[0]
+            crossline = line_number + self.bounds[1]
+
+        values = {
+            "inline": inline,
+            "crossline": crossline,
+            "cdpx": from_coord(self.cdpx[trace_index], self.scalco),
+            "cdpy": from_coord(self.cdpy[trace_index], self.scalco),
+            "scalco": self.scalco,
+            "tracl": self.first_trace[start] + np.arange(1, num_traces + 1),
+            "ns": self.ns,
+            "dt": self.dt,
+        }
+        values = {key: val for key, val in values.items() if key in self.byte_locations}
+
+        record = np.empty((num_traces, self.trace_size), dtype=np.uint8)
+        record[:, :trace_header_size] = pack_headers(values, num_traces, self.byte_locations)
+
+        record[:, trace_header_size:] = encode_samples(traces, self.binary_format)
+        return record.data
+
+
+def export_segy(
+    store,
+    segy_file,
+    sort_order="inline",
+    binary_format=None,
+    sample_rate_ms=None,
+    byte_locations=default_byte_locations,
+    scalco=None,
+    text_header=None,
+    lines_per_batch=16,
+    workers=None,
+    parallel_write=False,
+    buffer_size=64 * (1024 ** 2),
+):
+    """
+    Write the live traces of an rss store to a SEGY file.
+
+    Parameters
+    ----------
+    store : path to an rss folder or a zarr store.
+    segy_file : str, the output file.
+    sort_order : the stored sort order to stream, traces are written in this order.
+    binary_format : 1 for IBM or 5 for IEEE floating-point, defaults to the
+                    format of the ingested file when it is one of these and
+                    IEEE for files ingested from integer formats.
+    sample_rate_ms : sample interval, defaults to the one of the ingested file.
+    byte_locations : trace header locations, as in rss.api.byte_locations.
+    scalco : coordinate scalar written to the headers, defaults to 1 for
+             integer coordinates and -100 otherwise.
+    text_header : list of up to 40 lines for the EBCDIC header.
+    lines_per_batch : number of lines encoded at a time, a multiple of the
+                      stored chunks reads each chunk once.
+    workers : number of threads encoding batches, defaults to os.cpu_count().
+    parallel_write : write every batch to its own byte range with os.pwrite
+                     rather than appending in order through a buffer.
+    buffer_size : int, bytes of the write buffer for ordered writes.
+
+    Returns
+    -------
+    num_traces : int, the number of traces written.
+    """
+    sort_order = sort_order.lower()
+    if sort_order not in ("inline", "crossline"):
+        raise RuntimeError(
+            f"{sort_order} not supported, sort order should be on of inline or crossline."
+        )
+
+    if isinstance(store, str):
+        store = zarr.DirectoryStore(store)
+    root = zarr.open(store, mode="r")
+
+    ingested = root.attrs.get("binary_header", {})
+    if binary_format is None:
+        binary_format = ingested.get("float_format", 5)
+        # the dequantized samples are floating point, whatever they were ingested from
+        if binary_format not in (1, 5):
+            binary_format = 5
+    if sample_rate_ms is None:
+        sample_rate_ms = ingested.get("sample_rate_ms")
+        if sample_rate_ms is None:
+            raise RuntimeError("sample_rate_ms is not stored, pass it to export_segy.")
+
+    if scalco is None:
+        coords = np.concatenate([root["coords"]["cdpx"][:], root["coords"]["cdpy"][:]])
+        scalco = 1 if np.all(coords == np.rint(coords)) else -100
+
+    exporter = _Exporter(root, sort_order, binary_format, sample_rate_ms,
+                         byte_locations, scalco)
+
+    if text_header is None:
+        text_header = [
+            "SEGY exported from rss",
+            f"sort order {sort_order}, {exporter.num_traces} traces, {exporter.ns} samples",
+        ]
+        text_header += [f"{key} bytes {val[0]}-{val[0] + val[1] - 1}"
+                        for key, val in byte_locations.items()]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    num_lines = exporter.live.shape[0]
+    batches = [(i, min(i + lines_per_batch, num_lines))
+               for i in range(0, num_lines, lines_per_batch)]
+
+    with open(segy_file, "wb", buffering=buffer_size) as fp:
+        fp.write(make_text_header(text_header))
+        fp.write(make_binary_header(sample_rate_ms, exporter.ns, binary_format,
+                                    ingested.get("units", "meters")))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            if parallel_write:
+                fp.truncate(headers_offset + exporter.num_traces * exporter.trace_size)
+                fp.flush()
+                fd = fp.fileno()
+
+                def write(start, stop):
+                    offset = headers_offset + exporter.first_trace[start] * exporter.trace_size
+                    os.pwrite(fd, exporter.encode(start, stop), int(offset))
+
+                futures = [executor.submit(write, *batch) for batch in batches]
+                for future in tqdm.tqdm(futures):
+                    future.result()
+            else:
+                # encode ahead of the writer, but keep a bounded number of batches in memory
+                ahead = 2 * workers
+                pending = deque()
+                for batch in tqdm.tqdm(batches):
+                    pending.append(executor.submit(exporter.encode, *batch))
+                    if len(pending) > ahead:
+                        fp.write(pending.popleft().result())
+                while pending:
+                    fp.write(pending.popleft().result())
+
+    return exporter.num_traces
@@ -1,11 +1,12 @@
-from rss.api import (parse_ebcdic, parse_binary_header, read_trace_data_unstructured)
+from rss.api import (consolidate, parse_ebcdic, parse_binary_header,
+                     read_trace_data_unstructured)
+from rss.forge_client import make_time_index
+from rss.segy import trace_header_fields
 
 from numcodecs import LZ4
 import numpy as np
 import os
-import s3fs
 import shutil
-from wget import download
 import zarr
 
 compressor = LZ4()
@@ -16,8 +17,14 @@ byte_locations={'RECTVD' : (41, 4, '>i'),
                 'FIBREDIST' : (197, 4, '>i'),
                 'RECMD' : (237, 4, '>i')}
 
+# every trace header column stored, the standard ones and the FORGE fields
+header_fields = dict(trace_header_fields, RECTVD=(41, 'i4'), NSAMPTRC=(115, 'i2'),
+                     FIBREDIST=(197, 'i4'), RECMD=(237, 'i4'))
+
 
 def get_forge_root_s3(zarr_file):
+    import s3fs
+
     s3 = s3fs.S3FileSystem()
     store = s3fs.S3Map(root=zarr_file, s3=s3, check=False)
     root = zarr.group(store)
@@ -36,7 +43,57 @@ def make_forge_zarr(root, **config):
     
     # these are events we know about at the time of ingestion:
     num_events = config['num_events']    
-    events = root.zeros("sample_events", shape=(num_events, 2), dtype=np.int, overwrite=True)
+    events = root.zeros("sample_events", shape=(num_events, 2), dtype=int, overwrite=True)
 
     return root
 
+
+
+def write_time_index(root):
+    """
+    Store the (start time, line) of every recording, parsed from the UTC stamp
+    of segy_filenames and sorted by time, see rssFORGEClient.stream.
+    """
+    index = make_time_index(root["segy_filenames"][:])
+    root.create_dataset("time_index", data=index, dtype=np.int64, overwrite=True)
+    return index
+
+
+def extend_forge_zarr(root, num_lines, filenames=None, commands=None):
+    """
+    Make room for more recordings in a FORGE store, in place.
+
+    The per recording arrays grow along the line axis without rewriting any
+    stored chunk, the new lines read as padding until they are ingested.
+
+    Parameters
+    ----------
+    root : zarr group created by make_forge_zarr.
+    num_lines : int, the number of recordings to add.
+    filenames : optional list of the SEGY filenames of the new recordings.
+    commands : optional list of the download commands of the new recordings.
+
+    Returns
+    -------
+    first_line : int, the index of the first new recording.
+    """
+    num_traces, ns, first_line = root["seismic"].shape
+    total = first_line + num_lines
+
+    root["seismic"].resize(num_traces, ns, total)
+    root["scalers"].resize(total, 2)
+
+    # the ingestion script spells it get_all_silixa
+    for key, values in (("segy_filenames", filenames),
+                        ("get_all_silixia", commands),
+                        ("get_all_silixa", commands)):
+        if key not in root:
+            continue
+        root[key].resize(total)
+        if values is not None:
+            root[key][first_line:] = values
+
+    if filenames is not None:
+        write_time_index(root)
+    consolidate(root)
+    return first_line
@@ -1,19 +1,56 @@
-from IPython.display import clear_output
-import matplotlib
-import matplotlib.pylab as plt
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 import numpy as np
-import s3fs
 import os
-from scipy.signal import butter, lfilter, medfilt
+import re
 import zarr
 
+from rss.aio import aread
+from rss.cache import CachedStore, CoalescingStore
+from rss.client import dequantize, load_lines, open_root, query_headers, to_dask_array
+
 def parse_silxia_name(line):
     url = line.split(" ")[-1].rstrip()
     segy_file = os.path.basename(url)
     return url, segy_file
 
+def parse_start_time(segy_file):
+    """ The UTC start of a recording in seconds since the epoch, from the
+        yymmddHHMMSS stamp of its filename (e.g. ..._UTC190428070138.sgy),
+        None when there is none.
+    """
+    if isinstance(segy_file, bytes):
+        segy_file = segy_file.decode()
+    match = re.search(r"UTC(\d{12})", segy_file)
+    if match is None:
+        return None
+    start = datetime.strptime(match.group(1), "%y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+    return int(start.timestamp())
+
+
+def make_time_index(segy_filenames):
+    """ A (n, 2) int array of (start time, line) of the recordings with a
+        time stamp, sorted by start time, for a binary search by time.
+    """
+    times = [(parse_start_time(name), line) for line, name in enumerate(segy_filenames)]
+    index = np.array([i for i in times if i[0] is not None], dtype=np.int64).reshape(-1, 2)
+    return index[np.argsort(index[:, 0], kind="stable")]
+
+
+def to_epoch(t):
+    """ Seconds since the epoch of a datetime (naive ones are UTC) or a number. """
+    if isinstance(t, datetime):
+        if t.tzinfo is None:
+            t = t.replace(tzinfo=timezone.utc)
+        return t.timestamp()
+    return float(t)
+
+
 def butter_bandpass(lowcut, highcut, fs, order=5):
     """license: see scipy-cookbook-notice.txt"""
+    from scipy.signal import butter
+
     nyq = 0.5 * fs
     low = lowcut / nyq
     high = highcut / nyq
@@ -23,6 +60,8 @@ def butter_bandpass(lowcut, highcut, fs, order=5):
 
 def butter_bandpass_filter(data, lowcut, highcut, fs, order=5):
     """license: see scipy-cookbook-notice.txt"""    
+    from scipy.signal import lfilter
+
     b, a = butter_bandpass(lowcut, highcut, fs, order=order)
     y = lfilter(b, a, data)
     return y
@@ -30,12 +69,8 @@ def butter_bandpass_filter(data, lowcut, highcut, fs, order=5):
 
 def from_uint16(traces, scalers):
     """ Converts a das data back into float format."""
-    mask = traces < 1
     min_val, max_val = scalers
-    traces -= 1
-    traces = traces.astype(float) * max_val / (65535 - 1)
-    traces += min_val
-    return traces, mask
+    return dequantize(traces, min_val, max_val, mask_val=None)
 
 
 def load_das(das, iline):
@@ -44,10 +79,12 @@ def load_das(das, iline):
     return from_uint16(traces, scalers)
 
 
-def load_meta(das):
-    meta_data = das['binary_header']
+def load_meta(das, packed=None):
+    """ packed : optional dict of the arrays packed by rss.api.consolidate. """
+    packed = packed or {}
+    meta_data = packed['binary_header'] if 'binary_header' in packed else das['binary_header']
     meta_data = {key:val for i in meta_data for key,val in i.items()}
-    recmd = das['RECMD'][:]/1000.    
+    recmd = (packed['RECMD'] if 'RECMD' in packed else das['RECMD'][:])/1000.    
     time_seconds = np.arange(meta_data['ns']) * meta_data['sample_rate_ms']/1000.
     return meta_data, recmd, time_seconds
 
@@ -58,6 +95,9 @@ def plot(data, time=None, depth=None,
     """ Without some processing/clipping it will be hard to see the 
         microseismic events in the data.        
     """
+    import matplotlib
+    import matplotlib.pylab as plt
+
     font = {'family' : 'DejaVu Sans',
             'weight' : 'normal',
             'size'   : 22}
@@ -99,6 +139,8 @@ def process(inp):
         A. Lellouch et~al.
         https://arxiv.org/abs/2006.15197
     """
+    from scipy.signal import medfilt
+
     #median
     outp = inp - medfilt(inp,(21,1))
     #
@@ -108,22 +150,200 @@ def process(inp):
     return outp
 
 class rssFORGEClient:
-    def __init__(self, store, cache_size=128 * (1024 ** 2)):
-        # don't cache meta-data read once
-        self.cache = zarr.LRUStoreCache(store, max_size=cache_size)
+    def __init__(self, store, cache_size=128 * (1024 ** 2), cache=None, name=None,
+                 decoded_cache=None):
+        """ cache : optional cache shared with other clients (rss.cache.SharedLRUCache)
+                    used instead of a private LRU cache of cache_size bytes.
+            name : the namespace of this store in a shared cache.
+            decoded_cache : optional rss.cache.DecodedCache of dequantized recordings
+                            and windows, returned read-only.
+        """
+        # kept to open the store again, see reopen
+        self._store = store
+        self._open_kwargs = dict(cache_size=cache_size, cache=cache, name=name,
+                                 decoded_cache=decoded_cache)
+
+        # concurrent misses on the same chunk share one fetch
+        if cache is None:
+            self.cache = zarr.LRUStoreCache(CoalescingStore(store), max_size=cache_size)
+        else:
+            self.cache = cache.mount(CoalescingStore(store), name=name)
+
+        # a consolidated store opens in two requests
+        self.root, self.meta = open_root(self.cache)
 
-        self.root = zarr.open(self.cache, mode="r")
+        # hot recordings come back without decompressing them again
+        self.decoded_cache = decoded_cache
+        if decoded_cache is not None:
+            self._decoded_name = decoded_cache.namespace(name)
 
-        meta_data, recmd, time_seconds = load_meta(self.root)
+        meta_data, recmd, time_seconds = load_meta(self.root, self.meta)
         
         self.depth = recmd
         self.time_seconds = time_seconds
-        self.sample_events = self.root["sample_events"][:]
-        self.segy_filenames = self.root["segy_filenames"][:]
-        
+        self.sample_events = self._meta("sample_events")
+        self.segy_filenames = self._meta("segy_filenames")
+        self.sample_rate = meta_data["sample_rate_ms"] / 1000.
+
+        # (start time, line) sorted by time, parsed here for older stores
+        if "time_index" in self.meta or "time_index" in self.root:
+            self.time_index = self._meta("time_index")
+        else:
+            self.time_index = make_time_index(self.segy_filenames)
+
+    def _meta(self, key):
+        """ A small array read on open, from the packed blob when there is one. """
+        if key in self.meta:
+            return self.meta[key]
+        return self.root[key][:]
+
+    def reopen(self):
+        """ A new client of the same store reading its metadata again, e.g. after
+            recordings were appended in place, the chunks and recordings cached
+            for this store are dropped.
+        """
+        if isinstance(self.cache, CachedStore):
+            self.cache.cache.invalidate(self.cache.name)
+        if self.decoded_cache is not None:
+            self.decoded_cache.invalidate(self._decoded_name)
+        return rssFORGEClient(self._store, **self._open_kwargs)
+
+    def _decoded_key(self, *index):
+        """ The key of a dequantized result in the decoded cache, slices and
+            arrays of indices as tuples.
+        """
+        index = tuple(
+            (i.start, i.stop, i.step) if isinstance(i, slice)
+            else ("take",) + tuple(np.asarray(i).tolist()) if np.ndim(i)
+            else i
+            for i in index
+        )
+        return (self._decoded_name, "seismic", index, np.dtype(float).str)
+
     def line(self, line_number):
-        return load_das(self.root, line_number)
+        if self.decoded_cache is None:
+            return load_das(self.root, line_number)
+        return self.decoded_cache.cached(
+            self._decoded_key(line_number), lambda: load_das(self.root, line_number)
+        )
+
+    def query(self, where, workers=None):
+        """ The channels whose stored trace headers meet every condition of where,
+            see rss.client.query_headers, e.g. {'RECMD': (1000000, 2000000)}.
+        """
+        if "headers" not in self.root:
+            raise RuntimeError("trace headers not stored, ingest a recording again to keep them.")
+        return query_headers(self.root["headers"], where, workers=workers)
+
+    def lines(self, isets, dtype=np.float32, workers=None):
+        """ Read many recordings at once into a (num_traces, ns, len(isets)) cube,
+            in request order, fetching their chunks concurrently.
+            workers : number of threads fetching chunks.
+        """
+        num_lines = self.root["seismic"].shape[-1]
+        isets = np.asarray(isets, dtype=np.int64)
+        if np.any((isets < 0) | (isets >= num_lines)):
+            raise RuntimeError(f"recordings out of bounds [0, {num_lines - 1}].")
+        return load_lines(self.root["seismic"], self.root["scalers"], isets,
+                          mask_val=None, dtype=dtype, workers=workers)
+
+    def stream(self, t_start, t_end, channels=slice(None), mask_val=np.nan,
+               dtype=np.float32, workers=None):
+        """ Continuous data between two times, stitched from the consecutive
+            recordings it spans, which are found by a binary search of the
+            time index and fetched concurrently.
+
+            Parameters
+            ----------
+            t_start, t_end : datetime (naive ones are UTC) or seconds since the epoch.
+            channels : slice or int array of the channels to read.
+            mask_val : written where no recording, or an unloaded one, covers the time.
+            dtype : floating point type of the output.
+            workers : number of threads fetching recordings.
+
+            Returns
+            -------
+            traces : float array (n_channels, n_samples).
+            times : float array (n_samples,), seconds since the epoch of every sample.
+        """
+        t_start, t_end = to_epoch(t_start), to_epoch(t_end)
+        if t_end <= t_start:
+            raise RuntimeError(f"t_end {t_end} should be after t_start {t_start}.")
+
+        seismic, scalers = self.root["seismic"], self.root["scalers"]
+        num_traces, ns, _ = seismic.shape
+        num_samples = int(round((t_end - t_start) / self.sample_rate))
+        times = t_start + np.arange(num_samples) * self.sample_rate
+        num_channels = len(np.arange(num_traces)[channels])
+        traces = np.full((num_channels, num_samples), mask_val, dtype=dtype)
+
+        # the recordings overlapping the window, the first one may start before it
+        starts = self.time_index[:, 0]
+        first = max(np.searchsorted(starts, t_start, side="right") - 1, 0)
+        last = np.searchsorted(starts, t_end, side="left")
+
+        tasks = []
+        for start, line in self.time_index[first:last]:
+            # the samples of the recording and where they go in the output
+            offset = int(round((start - t_start) / self.sample_rate))
+            begin, end = max(-offset, 0), min(ns, num_samples - offset)
+            if begin < end:
+                tasks.append((int(line), begin, end, offset))
+
+        def read(line, begin, end, offset):
+            block = seismic.get_orthogonal_selection((channels, slice(begin, end), line))
+            min_val, max_val = scalers[line, :]
+            dequantize(block, min_val, max_val, mask_val=mask_val,
+                       out=traces[:, begin + offset : end + offset])
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(read, *task) for task in tasks]:
+                future.result()
+        return traces, times
+
+    async def aline(self, line_number):
+        """ Read a recording without blocking the event loop, see line. """
+        return await self.awindow(line_number)
+
+    async def awindow(self, line_number, channels=slice(None), samples=slice(None)):
+        """ Read a window (channels, samples) of a recording without blocking
+            the event loop, channels a slice or an array of channels. Chunks are
+            fetched concurrently through the async interface of the store and
+            decoded off the event loop.
+        """
+        if self.decoded_cache is not None:
+            key = self._decoded_key(line_number, channels, samples)
+            try:
+                return self.decoded_cache.get(key)
+            except KeyError:
+                pass
+
+        # an array of channels is read as the range covering it
+        selection = channels
+        if np.ndim(channels):
+            channels = np.arange(self.root["seismic"].shape[0])[channels]
+            first = int(channels.min())
+            selection = slice(first, int(channels.max()) + 1)
+
+        seismic, scalers = await asyncio.gather(
+            aread(self.root["seismic"], (selection, samples, line_number)),
+            aread(self.root["scalers"], (line_number, slice(None))),
+        )
+        if np.ndim(channels):
+            seismic = seismic[channels - first]
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, from_uint16, seismic, scalers)
+        if self.decoded_cache is not None:
+            self.decoded_cache.put(key, result)
+        return result
     
+    def to_dask(self, mask_val=np.nan, dtype=np.float32):
+        """ A lazy (num_traces, ns, num_lines) view of every recording, one
+            chunk per recording, for out of core computation.
+        """
+        return to_dask_array(self.root["seismic"], self.root["scalers"],
+                             mask_val=mask_val, dtype=dtype)
+
     def get_sample_events(self):
         """ Returns a the time of the event (in samples), and the index 
             of the event or (line number).
@@ -149,7 +369,8 @@ class rssFORGEClient:
         
 class rssFORGEFromS3(rssFORGEClient):
     def __init__(
-        self, filename, client_kwargs=None, cache_size=128 * (1024 ** 2)
+        self, filename, client_kwargs=None, cache_size=128 * (1024 ** 2),
+        s3=None, cache=None, name=None, decoded_cache=None,
     ):
         """
         An object for accessing rss data from s3 blob storage.
@@ -160,16 +381,24 @@ class rssFORGEFromS3(rssFORGEClient):
         client_kwargs : dict containing aws_access_key_id and aws_secret_access_key or None.
         If this variable is none, anonymous access is assumed.
         cache_size : max size of the LRU cache.
+        s3 : an existing s3fs.S3FileSystem to share, client_kwargs is ignored.
+        cache : a shared cache, see rssFORGEClient.
+        name : the namespace of this store in a shared cache, defaults to filename.
+        decoded_cache : a cache of dequantized recordings, see rssFORGEClient.
         """
-        print("Establishing Connection, may take a minute ......")
+        import s3fs
 
-        if client_kwargs is None:
-            s3 = s3fs.S3FileSystem()
-        else:
-            s3 = s3fs.S3FileSystem(client_kwargs=client_kwargs)
+        if s3 is None:
+            print("Establishing Connection, may take a minute ......")
+
+            if client_kwargs is None:
+                s3 = s3fs.S3FileSystem()
+            else:
+                s3 = s3fs.S3FileSystem(client_kwargs=client_kwargs)
             
         store = s3fs.S3Map(root=filename, s3=s3, check=False)
 
-        super().__init__(store, cache_size=cache_size)
+        super().__init__(store, cache_size=cache_size, cache=cache,
+                         name=name or filename, decoded_cache=decoded_cache)
   
         
\ No newline at end of file
@@ -0,0 +1,332 @@
+""" Matched-filter (template matching) detection for the FORGE DAS data.
+
+    The catalogued events in rssFORGEClient.sample_events are cut out as
+    multi-channel templates, their spectra are computed once, and every
+    recording is correlated against them with overlap-save FFTs. The
+    normalized correlation is stacked across channels at a common lag, so
+    the moveout of the event across the array is preserved.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import os
+from scipy import fft as sp_fft
+import time
+
+# a template is cut from (it - pre, it + post) around the catalogued pick
+template_pre = 200
+template_post = 600
+
+# one row of the detection catalog
+detection_dtype = [("iset", int), ("it", int), ("template", int), ("score", float)]
+
+
+def extract_templates(client, events=None, channels=None,
+                      pre=template_pre, post=template_post):
+    """
+    Cut multi-channel templates from the catalogued sample events.
+
+    Parameters
+    ----------
+    client : rssFORGEClient, the data to cut the templates from.
+    events : (n, 2) int array of (it, iset), defaults to client.sample_events.
+    channels : slice or index array of channels to keep, defaults to all.
+    pre : int, number of samples before the pick.
+    post : int, number of samples after the pick.
+
+    Returns
+    -------
+    templates : 3-D float32 array (n_templates, n_channels, pre + post).
+    events : (n_templates, 2) int array, the events the templates came from.
+    """
+    if events is None:
+        events = client.sample_events
+    events = np.atleast_2d(events)
+
+    if channels is None:
+        channels = slice(None)
+
+    templates = []
+    kept = []
+    for it, iset in events:
+        data, mask = client.line(iset)
+        if np.all(mask):
+            # recording not ingested
+            continue
+        if it - pre < 0 or it + post > data.shape[1]:
+            continue
+        window = data[channels, it - pre : it + post]
+        templates.append(np.asarray(window, dtype=np.float32))
+        kept.append((it, iset))
+
+    if not templates:
+        raise RuntimeError("no templates could be extracted from the events.")
+
+    return np.stack(templates), np.array(kept, dtype=int)
+
+
+def moving_sum(x, width):
+    """ Sum of every window of length width along the last axis. """
+    c = np.cumsum(x, axis=-1, dtype=np.float64)
+    c = np.concatenate([np.zeros(x.shape[:-1] + (1,)), c], axis=-1)
+    return c[..., width:] - c[..., :-width]
+
+
+class TemplateBank:
+    def __init__(self, templates, events=None, pre=template_pre, nfft=None,
+                 batch_size=128):
+        """
+        Precomputed template spectra for overlap-save correlation.
+
+        Parameters
+        ----------
+        templates : (n_templates, n_channels, nt) array of templates.
+        events : optional (n_templates, 2) array of the source events.
+        pre : int, samples between the start of a template and its pick.
+        nfft : FFT length, defaults to the next fast length >= 4 * nt.
+        batch_size : number of channels transformed at a time.
+        """
+        templates = np.asarray(templates, dtype=np.float32)
+        if templates.ndim == 2:
+            templates = templates[np.newaxis]
+
+        self.num_templates, self.num_channels, self.nt = templates.shape
+        self.events = events
+        self.pre = pre
+        self.batch_size = batch_size
+
+        if nfft is None:
+            nfft = sp_fft.next_fast_len(4 * self.nt, real=True)
+        if nfft < self.nt:
+            raise RuntimeError(f"nfft {nfft} shorter than the templates {self.nt}.")
+        self.nfft = nfft
+        # number of valid correlation lags per overlap-save block
+        self.step = nfft - self.nt + 1
+
+        # zero mean, unit norm channels: dead channels drop out of the stack
+        templates = templates - templates.mean(axis=-1, keepdims=True)
+        norm = np.linalg.norm(templates, axis=-1, keepdims=True)
+        self.live = norm[..., 0] > 0
+        templates = np.divide(templates, norm, out=np.zeros_like(templates),
+                              where=norm > 0)
+
+        # conjugate spectra, computed once: correlation is D * conj(T)
+        self.spectra = np.conj(
+            sp_fft.rfft(templates, n=nfft, axis=-1)
+        ).astype(np.complex64)
+
+    def _blocks(self, data):
+        """ Overlapping blocks of length nfft with a hop of step samples. """
+        nlags = data.shape[-1] - self.nt + 1
+        num_blocks = -(-nlags // self.step)
+        padded_length = (num_blocks - 1) * self.step + self.nfft
+        padded = np.zeros(data.shape[:-1] + (padded_length,), dtype=np.float32)
+        padded[..., : data.shape[-1]] = data
+        blocks = np.lib.stride_tricks.sliding_window_view(
+            padded, self.nfft, axis=-1
+        )[..., :: self.step, :]
+        return blocks, nlags
+
+    def correlate(self, data, workers=-1):
+        """
+        Channel-stacked normalized cross-correlation of data with every template.
+
+        Parameters
+        ----------
+        data : (n_channels, ns) array, a recording as returned by client.line.
+        workers : number of threads used by the FFTs (-1 for all cores).
+
+        Returns
+        -------
+        stack : (n_templates, ns - nt + 1) float32 array of the mean normalized
+                correlation across channels, in [-1, 1].
+        """
+        data = np.asarray(data, dtype=np.float32)
+        if data.shape[0] != self.num_channels:
+            raise RuntimeError(
+                f"data has {data.shape[0]} channels, templates have {self.num_channels}."
+            )
+        if data.shape[-1] < self.nt:
+            raise RuntimeError("data is shorter than the templates.")
+
+        nlags = data.shape[-1] - self.nt + 1
+        stack = np.zeros((self.num_templates, nlags), dtype=np.float32)
+
+        for c0 in range(0, self.num_channels, self.batch_size):
+            c1 = min(c0 + self.batch_size, self.num_channels)
+            batch = data[c0:c1]
+
+            # demeaned window energy of the data for every lag
+            s1 = moving_sum(batch, self.nt)
+            s2 = moving_sum(batch.astype(np.float64) ** 2, self.nt)
+            energy = np.maximum(s2 - s1 ** 2 / self.nt, 0.0)
+            inv_norm = np.divide(1.0, np.sqrt(energy), out=np.zeros_like(energy),
+                                 where=energy > 1e-12).astype(np.float32)
+
+            # the data spectrum is shared by all the templates
+            blocks, _ = self._blocks(batch)
+            spectrum = sp_fft.rfft(blocks, axis=-1, workers=workers)
+
+            for k in range(self.num_templates):
+                xcorr = sp_fft.irfft(
+                    spectrum * self.spectra[k, c0:c1, np.newaxis, :],
+                    n=self.nfft, axis=-1, workers=workers,
+                )[..., : self.step]
+                xcorr = xcorr.reshape(c1 - c0, -1)[:, :nlags]
+                stack[k] += np.einsum("ij,ij->j", xcorr, inv_norm)
+
+        num_live = np.maximum(self.live.sum(axis=-1), 1)
+        stack /= num_live[:, np.newaxis]
+        return stack
+
+
+def pick_detections(stack, threshold=None, mad_multiple=8.0, separation=None):
+    """
+    Pick peaks of the stacked correlation above a threshold.
+
+    Parameters
+    ----------
+    stack : (n_templates, n_lags) array from TemplateBank.correlate.
+    threshold : absolute threshold, if None median + mad_multiple * MAD per template.
+    mad_multiple : number of median absolute deviations above the median.
+    separation : minimum samples between detections of one template.
+
+    Returns
+    -------
+    detections : list of (lag, template, score) tuples.
+    """
+    detections = []
+    for k, cc in enumerate(stack):
+        if threshold is None:
+            median = np.median(cc)
+            mad = np.median(np.abs(cc - median))
+            level = median + mad_multiple * mad
+        else:
+            level = threshold
+
+        above = np.flatnonzero(cc > level)
+        if not len(above):
+            continue
+
+        gap = separation if separation is not None else 1
+        # split into runs of nearby samples and keep the peak of each run
+        breaks = np.flatnonzero(np.diff(above) > gap) + 1
+        for run in np.split(above, breaks):
+            lag = run[np.argmax(cc[run])]
+            detections.append((int(lag), k, float(cc[lag])))
+    return detections
+
+
+# per process state for the pool workers
+_worker_client = None
+_worker_bank = None
+
+
+def _init_worker(client_factory, bank):
+    global _worker_client, _worker_bank
+    _worker_client = client_factory()
+    _worker_bank = bank
+
+
+def _detect_lines(isets, channels, mad_multiple, separation):
+    rows = []
+    num_correlations = 0
+    for iset in isets:
+        data, mask = _worker_client.line(iset)
+        if np.all(mask):
+            continue
+        if channels is not None:
+            data = data[channels]
+        stack = _worker_bank.correlate(data, workers=1)
+        num_correlations += stack.size * _worker_bank.num_channels
+        for lag, k, score in pick_detections(
+            stack, mad_multiple=mad_multiple, separation=separation
+        ):
+            # report the time of the pick, not the start of the window
+            rows.append((int(iset), lag + _worker_bank.pre, k, score))
+    return rows, num_correlations
+
+
+def detect(client_factory, bank, line_numbers, channels=None, workers=None,
+           lines_per_task=8, mad_multiple=8.0, separation=None):
+    """
+    Run the template bank over many recordings in a process pool.
+
+    Parameters
+    ----------
+    client_factory : picklable callable returning an rssFORGEClient, called
+                     once in each worker, e.g. functools.partial(rssFORGEFromS3, uri).
+    bank : TemplateBank.
+    line_numbers : iterable of recording indices to scan.
+    channels : the channel selection used when the templates were extracted.
+    workers : number of processes, defaults to os.cpu_count().
+    lines_per_task : recordings handed to a worker at a time.
+    mad_multiple, separation : see pick_detections.
+
+    Returns
+    -------
+    catalog : (n, 4) structured array of iset, it, template, score.
+    stats : dict with the elapsed time and correlations per second.
+    """
+    line_numbers = list(line_numbers)
+    if separation is None:
+        separation = bank.nt
+
+    tasks = [
+        line_numbers[i : i + lines_per_task]
+        for i in range(0, len(line_numbers), lines_per_task)
+    ]
+
+    rows = []
+    num_correlations = 0
+    tic = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(client_factory, bank),
+    ) as pool:
+        futures = [
+            pool.submit(_detect_lines, task, channels, mad_multiple, separation)
+            for task in tasks
+        ]
+        for future in futures:
+            task_rows, task_correlations = future.result()
+            rows.extend(task_rows)
+            num_correlations += task_correlations
+    elapsed = time.perf_counter() - tic
+
+    catalog = np.array(rows, dtype=detection_dtype)
+    stats = {
+        "elapsed_seconds": elapsed,
+        "num_lines": len(line_numbers),
+        "correlations_per_second": num_correlations / max(elapsed, 1e-9),
+    }
+    return catalog, stats
+
+
+
+def write_catalog(catalog, filename, segy_filenames=None):
+    """
+    Write detections in the same layout as FORGE-Microseismic-Lookup.txt,
+    "segy_file it iset", with the template index and score appended.
+    """
+    with open(filename, "w") as fp:
+        fp.write("segy_file it iset template score\n")
+        for row in np.sort(catalog, order=["iset", "it"]):
+            name = "unknown"
+            if segy_filenames is not None:
+                name = segy_filenames[row["iset"]]
+                if isinstance(name, bytes):
+                    name = name.decode()
+            fp.write(
+                f"{name} {row['it']} {row['iset']} {row['template']} {row['score']:.4f}\n"
+            )
+
+
+def read_catalog(filename):
+    """ Read a catalog written by write_catalog. """
+    rows = []
+    with open(filename, "r") as fp:
+        for line in fp.readlines()[1:]:
+            _, it, iset, template, score = line.split(" ")
+            rows.append((int(iset), int(it), int(template), float(score)))
+    return np.array(rows, dtype=detection_dtype)
@@ -0,0 +1,254 @@
+""" Per stage timing and byte counts for ingestion.
+
+    The ingestion functions take an optional profiler and wrap each of their
+    stages (read, decode, headers, quantize, compress, write ...) in
+    profiler.stage(name, bytes_in, bytes_out). Stages nest, the time of a
+    stage excludes the stages running inside it, so the report adds up to the
+    wall clock time of a sequential ingest.
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+import json
+import sys
+import threading
+import time
+
+from zarr.storage import Store, listdir, rmdir
+
+
+class _Stage:
+    __slots__ = ("calls", "seconds", "bytes_in", "bytes_out")
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+
+class StageProfiler:
+    def __init__(self, sampler=None):
+        """
+        Collects time and bytes per ingestion stage.
+
+        Parameters
+        ----------
+        sampler : optional sampling profiler, any object with start() and
+                  stop() methods (e.g. StackSampler or pyinstrument.Profiler),
+                  run between start() and stop() of this profiler.
+        """
+        self.sampler = sampler
+        self.stages = defaultdict(_Stage)
+        self._mutex = threading.Lock()
+        self._local = threading.local()
+        self.started = self.stopped = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.sampler is not None:
+            self.sampler.start()
+        return self
+
+    def stop(self):
+        if self.sampler is not None:
+            self.sampler.stop()
+        self.stopped = time.perf_counter()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name, bytes_in=0, bytes_out=0):
+        """
+        Time a stage, counting the bytes it consumes and produces.
+
+        Parameters
+        ----------
+        name : str, the stage.
+        bytes_in, bytes_out : int, may also be set on the yielded object once
+                              known, e.g. stage.bytes_out = len(result).
+        """
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        record = _Stage()
+        record.bytes_in, record.bytes_out = bytes_in, bytes_out
+        children = [0.0]
+        stack.append(children)
+        tic = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - tic
+            stack.pop()
+            if stack:
+                stack[-1][0] += elapsed
+            self.add(name, elapsed - children[0], record.bytes_in, record.bytes_out)
+
+    def add(self, name, seconds, bytes_in=0, bytes_out=0):
+        """ Account for a stage timed elsewhere. """
+        with self._mutex:
+            stage = self.stages[name]
+            stage.calls += 1
+            stage.seconds += seconds
+            stage.bytes_in += bytes_in
+            stage.bytes_out += bytes_out
+
+    def store(self, store, name="write"):
+        """ Wrap a zarr store so its writes are timed as a stage. """
+        return ProfiledStore(store, self, name)
+
+    @property
+    def wall_seconds(self):
+        if self.started is None:
+            return sum(i.seconds for i in self.stages.values())
+        stopped = self.stopped if self.stopped is not None else time.perf_counter()
+        return stopped - self.started
+
+    def as_dict(self):
+        """ The machine readable profile. """
+        wall = self.wall_seconds
+        with self._mutex:
+            stages = {
+                name: {
+                    "calls": stage.calls,
+                    "seconds": stage.seconds,
+                    "fraction": stage.seconds / wall if wall else 0.0,
+                    "bytes_in": stage.bytes_in,
+                    "bytes_out": stage.bytes_out,
+                    "mb_per_s_in": stage.bytes_in / stage.seconds / 1e6 if stage.seconds else 0.0,
+                    "mb_per_s_out": stage.bytes_out / stage.seconds / 1e6 if stage.seconds else 0.0,
+                }
+                for name, stage in self.stages.items()
+            }
+        accounted = sum(i["seconds"] for i in stages.values())
+        # seconds are summed over threads, overlapping stages are not a critical path
+        slowest_stages = sorted(stages, key=lambda name: -stages[name]["seconds"])
+
+        result = {
+            "wall_seconds": wall,
+            "unaccounted_seconds": max(wall - accounted, 0.0),
+            "slowest_stages": slowest_stages,
+            "stages": stages,
+        }
+        if self.sampler is not None and hasattr(self.sampler, "as_dict"):
+            result["samples"] = self.sampler.as_dict()
+        return result
+
+    def to_json(self, path):
+        with open(path, "w") as fp:
+            json.dump(self.as_dict(), fp, indent=2)
+
+    def summary(self):
+        """ The profile as a table, slowest stage first. """
+        profile = self.as_dict()
+        lines = [
+            f"{'stage':<16}{'seconds':>10}{'share':>8}{'calls':>10}"
+            f"{'MB in':>10}{'MB/s in':>10}{'MB out':>10}{'MB/s out':>10}"
+        ]
+        for name in profile["slowest_stages"]:
+            stage = profile["stages"][name]
+            lines.append(
+                f"{name:<16}{stage['seconds']:>10.2f}{100 * stage['fraction']:>7.1f}%"
+                f"{stage['calls']:>10}"
+                f"{stage['bytes_in'] / 1e6:>10.1f}{stage['mb_per_s_in']:>10.1f}"
+                f"{stage['bytes_out'] / 1e6:>10.1f}{stage['mb_per_s_out']:>10.1f}"
+            )
+        lines.append(
+            f"wall {profile['wall_seconds']:.2f} s, unaccounted "
+            f"{profile['unaccounted_seconds']:.2f} s"
+        )
+        if profile["slowest_stages"]:
+            lines.append("slowest stages: " + ", ".join(profile["slowest_stages"][:3]))
+
+        samples = profile.get("samples")
+        if samples:
+            lines.append("hottest functions (samples):")
+            for function, count in samples["top"][:10]:
+                lines.append(f"  {count:>8}  {function}")
+        return "\n".join(lines)
+
+
+def stage(profiler, name, bytes_in=0, bytes_out=0):
+    """ profiler.stage(...), or a no-op when profiler is None. """
+    if profiler is None:
+        return nullcontext(_Stage())
+    return profiler.stage(name, bytes_in, bytes_out)
+
+
+class ProfiledStore(Store):
+    def __init__(self, store, profiler, name="write"):
+        """ A zarr store whose writes are timed as a stage of a StageProfiler. """
+        self._store = store
+        self.profiler = profiler
+        self.name = name
+
+    def __getitem__(self, key):
+        return self._store[key]
+
+    def __setitem__(self, key, value):
+        with self.profiler.stage(self.name, bytes_in=memoryview(value).nbytes):
+            self._store[key] = value
+
+    def __delitem__(self, key):
+        del self._store[key]
+
+    def __contains__(self, key):
+        return key in self._store
+
+    def __iter__(self):
+        return iter(self._store)
+
+    def __len__(self):
+        return len(self._store)
+
+    def listdir(self, path=None):
+        return listdir(self._store, path)
+
+    def rmdir(self, path=None):
+        rmdir(self._store, path)
+
+
+class StackSampler:
+    def __init__(self, interval=0.005, thread=None):
+        """
+        A minimal sampling profiler, counting the innermost function of a
+        thread every interval seconds.
+
+        Parameters
+        ----------
+        interval : float, seconds between samples.
+        thread : the threading.Thread to sample, the one calling start() by default.
+        """
+        self.interval = interval
+        self.thread = thread
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._worker = None
+
+    def start(self):
+        ident = (self.thread or threading.current_thread()).ident
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                frame = sys._current_frames().get(ident)
+                if frame is not None:
+                    code = frame.f_code
+                    self.counts[f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"] += 1
+
+        self._worker = threading.Thread(target=run, daemon=True)
+        self._worker.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+
+    def as_dict(self):
+        return {"interval": self.interval, "top": self.counts.most_common(50)}
@@ -0,0 +1,339 @@
+""" Random patches of rss volumes and FORGE recordings for training models.
+
+    Patches are drawn in blocks: a block of consecutive stored lines (whole
+    chunks) is fetched and dequantized once, then many patches are cut from
+    it, so every chunk read serves a run of samples instead of one. Batches
+    are produced either in process or by background worker processes, each
+    with its own client, writing into shared memory slots that the training
+    loop reads without pickling the patches.
+"""
+import multiprocessing
+from multiprocessing import shared_memory
+import queue
+import time
+
+import numpy as np
+import zarr
+
+from rss.client import load_lines
+
+
+class PatchSampler:
+    def __init__(
+        self,
+        store,
+        patch_shape,
+        kind="rss",
+        sort_order="inline",
+        patches_per_block=16,
+        max_padding=0.5,
+        event_fraction=0.0,
+        event_jitter=None,
+        cache_size=64 * (1024 ** 2),
+    ):
+        """
+        Draws random patches from a stored volume, many per fetched block.
+
+        Parameters
+        ----------
+        store : zarr store or path of a local rss or FORGE folder, picklable
+                so worker processes can open their own client.
+        patch_shape : tuple of 3 ints, (samples, traces, lines) for rss in
+                      the stored (ns, n_orth, n_lines) order or
+                      (channels, samples, recordings) for FORGE.
+        kind : one of 'rss' or 'forge'.
+        sort_order : the stored sort order to sample, rss only.
+        patches_per_block : patches cut from every fetched block of lines.
+        max_padding : float, the largest fraction of padding in an rss patch.
+        event_fraction : float, the share of FORGE patches centred on one of
+                         the sample_events, the rest are drawn uniformly.
+        event_jitter : int, the largest shift in samples of an event from the
+                       patch centre, a quarter of the patch by default.
+        cache_size : max size of the LRU cache of the client, in bytes.
+        """
+        kind = kind.lower()
+        if kind not in ("rss", "forge"):
+            raise RuntimeError(f"{kind} not supported, kind should be one of rss or forge.")
+        if len(patch_shape) != 3:
+            raise RuntimeError(f"patch_shape {patch_shape} should have 3 dimensions.")
+        if kind == "forge" and not 0 <= event_fraction <= 1:
+            raise RuntimeError(f"event_fraction {event_fraction} should be in [0, 1].")
+
+        if isinstance(store, str):
+            store = zarr.DirectoryStore(store)
+        self.store = store
+        self.patch_shape = tuple(int(i) for i in patch_shape)
+        self.kind = kind
+        self.sort_order = sort_order.lower()
+        self.patches_per_block = int(patches_per_block)
+        self.max_padding = max_padding
+        self.event_fraction = event_fraction
+        self.event_jitter = (
+            self.patch_shape[1] // 4 if event_jitter is None else int(event_jitter)
+        )
+        self.cache_size = cache_size
+
+        self._client = None
+        self.blocks = 0
+
+    def __getstate__(self):
+        # every process opens its own client
+        state = self.__dict__.copy()
+        state["_client"] = None
+        return state
+
+    @property
+    def client(self):
+        if self._client is None:
+            if self.kind == "rss":
+                from rss.client import rssClient
+
+                self._client = rssClient(self.store, cache_size=self.cache_size)
+            else:
+                from rss.forge_client import rssFORGEClient
+
+                self._client = rssFORGEClient(self.store, cache_size=self.cache_size)
+
+            shape = self._arrays()[0].shape
+            if any(p > s for p, s in zip(self.patch_shape, shape)):
+                raise RuntimeError(
+                    f"patch_shape {self.patch_shape} larger than the stored {shape}."
+                )
+        return self._client
+
+    def _arrays(self):
+        if self.kind == "rss":
+            line_root = self._client._line_root(self.sort_order)
+        else:
+            line_root = self._client.root
+        return line_root["seismic"], line_root["scalers"]
+
+    def _block(self, rng):
+        """ The first line of a random block and, for events, the sample to centre on. """
+        seismic, _ = self._arrays()
+        num_lines = seismic.shape[-1] - self.patch_shape[-1] + 1
+        if self.kind == "forge" and self.event_fraction > 0:
+            events = self.client.sample_events
+            events = events[events[:, 1] < num_lines]
+            if len(events) and rng.random() < self.event_fraction:
+                it, iset = events[rng.integers(len(events))]
+                return int(iset), int(it)
+        return int(rng.integers(num_lines)), None
+
+    def _origins(self, rng, block_shape, mask, centre, count):
+        """ Random patch origins inside a block, (count, 2) along its first two axes. """
+        size = self.patch_shape[:2]
+        high = [b - p + 1 for b, p in zip(block_shape[:2], size)]
+        origins = np.stack([rng.integers(h, size=count) for h in high], axis=1)
+
+        if centre is not None:
+            shift = rng.integers(-self.event_jitter, self.event_jitter + 1, size=count)
+            origins[:, 1] = np.clip(centre - size[1] // 2 + shift, 0, high[1] - 1)
+
+        if self.kind == "rss" and self.max_padding < 1:
+            # redraw the patches that are mostly padding, a few times at most
+            padding = mask.mean(axis=2)
+            summed = np.pad(padding.cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+            for _ in range(8):
+                a, b = origins[:, 0], origins[:, 1]
+                fraction = (
+                    summed[a + size[0], b + size[1]] - summed[a, b + size[1]]
+                    - summed[a + size[0], b] + summed[a, b]
+                ) / (size[0] * size[1])
+                bad = fraction > self.max_padding
+                if not bad.any():
+                    break
+                origins[bad] = np.stack(
+                    [rng.integers(h, size=bad.sum()) for h in high], axis=1
+                )
+        return origins
+
+    def sample(self, batch_size, rng=None, out=None, origins=None):
+        """
+        Draw a batch of patches.
+
+        Parameters
+        ----------
+        batch_size : int, the number of patches.
+        rng : numpy Generator, a fresh one when None.
+        out : optional float32 array (batch_size, *patch_shape) to write into.
+        origins : optional int array (batch_size, 3) to write into.
+
+        Returns
+        -------
+        patches : float32 array (batch_size, *patch_shape), padding is zero.
+        origins : int array (batch_size, 3), the index of the first sample,
+                  trace and line of every patch in the stored array.
+        """
+        rng = np.random.default_rng() if rng is None else rng
+        if out is None:
+            out = np.empty((batch_size,) + self.patch_shape, dtype=np.float32)
+        if origins is None:
+            origins = np.empty((batch_size, 3), dtype=np.int64)
+
+        client = self.client
+        seismic, scalers = self._arrays()
+        tiles = client.tiles(self.sort_order) if self.kind == "rss" else None
+        mask_val = 0.0 if self.kind == "rss" else None
+
+        a, b, depth = self.patch_shape
+        for start in range(0, batch_size, self.patches_per_block):
+            count = min(self.patches_per_block, batch_size - start)
+            line, centre = self._block(rng)
+            block, mask = load_lines(
+                seismic, scalers, range(line, line + depth), mask_val=mask_val,
+                tiles=tiles,
+            )
+            self.blocks += 1
+
+            block_origins = self._origins(rng, block.shape, mask, centre, count)
+            for i, (a0, b0) in enumerate(block_origins):
+                out[start + i] = block[a0 : a0 + a, b0 : b0 + b]
+            origins[start : start + count, 0] = block_origins[:, 0]
+            origins[start : start + count, 1] = block_origins[:, 1]
+            origins[start : start + count, 2] = line
+        return out, origins
+
+
+def _worker(sampler, batch_size, names, free, ready, stop, worker, seed):
+    """ Fill free shared memory slots with batches until stopped. """
+    rng = np.random.default_rng(seed)
+    slots = [shared_memory.SharedMemory(name=name) for name in names]
+    patches_shape = (batch_size,) + sampler.patch_shape
+    patches_size = int(np.prod(patches_shape)) * 4
+    try:
+        while not stop.is_set():
+            try:
+                slot = free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            buffer = slots[slot].buf
+            out = np.ndarray(patches_shape, dtype=np.float32, buffer=buffer)
+            origins = np.ndarray((batch_size, 3), dtype=np.int64, buffer=buffer,
+                                 offset=patches_size)
+            sampler.sample(batch_size, rng, out=out, origins=origins)
+            del out, origins
+            ready.put((slot, worker, sampler.blocks))
+    finally:
+        for shm in slots:
+            shm.close()
+
+
+class PatchLoader:
+    def __init__(self, sampler, batch_size, workers=2, prefetch=2, seed=None,
+                 context="spawn"):
+        """
+        Batches of patches, prefetched by worker processes through shared memory.
+
+        Parameters
+        ----------
+        sampler : PatchSampler.
+        batch_size : int, patches per batch.
+        workers : int, background processes, 0 samples in this process.
+        prefetch : int, batches in flight per worker.
+        seed : int, seeds the workers (or this process) for reproducible draws.
+        context : multiprocessing start method of the workers.
+
+        Usage
+        -----
+        with PatchLoader(PatchSampler(path, (128, 64, 1)), batch_size=32) as loader:
+            for step, (patches, origins) in zip(range(1000), loader):
+                ...
+            print(loader.stats())
+        """
+        self.sampler = sampler
+        self.batch_size = int(batch_size)
+        self.workers = int(workers)
+        self.samples = 0
+        self.seconds = 0.0
+        self._blocks = {}
+        self._seeds = np.random.SeedSequence(seed).spawn(max(self.workers, 1))
+        self._rng = np.random.default_rng(self._seeds[0])
+        self._slots = []
+        self._processes = []
+
+        if self.workers > 0:
+            patches_size = 4 * self.batch_size * int(np.prod(sampler.patch_shape))
+            slot_size = patches_size + 8 * 3 * self.batch_size
+            self._slots = [
+                shared_memory.SharedMemory(create=True, size=slot_size)
+                for _ in range(self.workers * max(int(prefetch), 1))
+            ]
+            ctx = multiprocessing.get_context(context)
+            self._free, self._ready, self._stop = ctx.Queue(), ctx.Queue(), ctx.Event()
+            for slot in range(len(self._slots)):
+                self._free.put(slot)
+            names = [shm.name for shm in self._slots]
+            for i in range(self.workers):
+                process = ctx.Process(
+                    target=_worker,
+                    args=(sampler, self.batch_size, names, self._free, self._ready,
+                          self._stop, i, self._seeds[i]),
+                    daemon=True,
+                )
+                process.start()
+                self._processes.append(process)
+        self._started = time.perf_counter()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        tic = time.perf_counter()
+        if self.workers == 0:
+            patches, origins = self.sampler.sample(self.batch_size, self._rng)
+            self._blocks[0] = self.sampler.blocks
+        else:
+            while True:
+                try:
+                    slot, worker, blocks = self._ready.get(timeout=1.0)
+                    break
+                except queue.Empty:
+                    if not any(p.is_alive() for p in self._processes):
+                        raise RuntimeError("the patch sampling workers exited.")
+            self._blocks[worker] = blocks
+            buffer = self._slots[slot].buf
+            patches_shape = (self.batch_size,) + self.sampler.patch_shape
+            patches = np.ndarray(patches_shape, dtype=np.float32, buffer=buffer).copy()
+            origins = np.ndarray((self.batch_size, 3), dtype=np.int64, buffer=buffer,
+                                 offset=patches.nbytes).copy()
+            self._free.put(slot)
+        self.seconds += time.perf_counter() - tic
+        self.samples += self.batch_size
+        return patches, origins
+
+    def stats(self):
+        """
+        Returns
+        -------
+        stats : dict, samples delivered, samples per second since the loader
+                started, seconds the caller waited for batches and the blocks
+                of lines fetched (prefetched batches included).
+        """
+        elapsed = time.perf_counter() - self._started
+        return {
+            "samples": self.samples,
+            "samples_per_second": self.samples / elapsed if elapsed else 0.0,
+            "seconds_waiting": self.seconds,
+            "blocks": sum(self._blocks.values()),
+            "workers": self.workers,
+        }
+
+    def close(self):
+        if self._processes:
+            self._stop.set()
+            for process in self._processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            self._processes = []
+        for shm in self._slots:
+            shm.close()
+            shm.unlink()
+        self._slots = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,386 @@
+""" Header only scans of SEGY files, to infer the geometry before ingestion.
+
+    Only the 240 byte trace headers are read, through a strided memory map of
+    the file, either all of them or blocks of consecutive traces spread over
+    the file. Every 2 and 4-byte integer field of the header is then scored
+    as a candidate inline/crossline (a line number constant over runs of
+    traces, with a faster one stepping regularly within each run and
+    repeating from run to run, every pair unique) or cdpx/cdpy (an affine
+    function of the inline/crossline grid).
+"""
+import numpy as np
+
+from rss.api import byte_locations as default_byte_locations
+from rss.api import parse_binary_header, to_coord
+from rss.segy import headers_offset, trace_header_size
+
+# tie breaks between fields holding the same values
+standard_coords = [(181, 185), (73, 77), (81, 85)]
+
+
+def read_headers(segy_file, binary_header, num_samples=None, block_size=256):
+    """
+    Read trace headers without touching the samples.
+
+    Parameters
+    ----------
+    segy_file : str, the SEGY file.
+    binary_header : dict, see rss.api.parse_binary_header.
+    num_samples : int, the number of headers to read, in blocks of consecutive
+                  traces spread evenly over the file, None reads all of them.
+    block_size : int, traces per block when sampling.
+
+    Returns
+    -------
+    index : int array, the trace numbers read.
+    headers : uint8 array (n, 240).
+    """
+    num_traces = binary_header["num_traces"]
+    traces = np.memmap(
+        segy_file,
+        dtype=np.uint8,
+        mode="r",
+        offset=headers_offset,
+        shape=(num_traces, binary_header["size_of_trace"]),
+    )
+
+    if num_samples is None or num_samples >= num_traces:
+        index = np.arange(num_traces)
+        return index, np.array(traces[:, :trace_header_size])
+
+    # at least 8 blocks, to see both ends of the file
+    block_size = max(min(block_size, num_samples // 8), 2)
+    num_blocks = max(num_samples // block_size, 1)
+    starts = np.linspace(0, num_traces - block_size, num_blocks).astype(int)
+    index = np.unique((starts[:, None] + np.arange(block_size)).ravel())
+    return index, traces[index, :trace_header_size]
+
+
+def header_column(headers, byte, size, fmt):
+    """ One field of every header, byte is 1-based as in rss.api.byte_locations. """
+    field = np.ascontiguousarray(headers[:, byte - 1 : byte - 1 + size])
+    return field.view(np.dtype(fmt))[:, 0].astype(np.int64)
+
+
+def candidate_columns(headers, byteorder=">"):
+    """
+    Every distinct 2 and 4-byte integer field of the headers.
+
+    Returns
+    -------
+    columns : dict of (byte, size, fmt) to int array. Fields holding the same
+              values as a preferred one (a standard location, 4 bytes, word
+              aligned) are dropped, as are the 2-byte halves of varying 4-byte
+              fields.
+    """
+    # inline, crossline, cdpx, cdpy and scalco first
+    standard = [(val[0], val[1]) for val in default_byte_locations.values()]
+
+    def priority(loc):
+        position = standard.index(loc[:2]) if loc[:2] in standard else len(standard)
+        return (position, (loc[0] - 1) % 4, -loc[1], loc[0])
+
+    locations = sorted(
+        [
+            (byte, size, byteorder + fmt)
+            for size, fmt in ((4, "i"), (2, "h"))
+            for byte in range(1, trace_header_size - size + 2, 2)
+        ],
+        key=priority,
+    )
+
+    def varies(byte):
+        column = header_column(headers, byte, 2, byteorder + "h")
+        return column.min() != column.max()
+
+    # both halves of a word vary, it holds a 4-byte field
+    halves = set()
+    for byte in range(1, trace_header_size, 4):
+        if varies(byte) and varies(byte + 2):
+            halves.update([byte, byte + 2])
+
+    columns, seen = {}, set()
+    for location in locations:
+        if location[1] == 2 and location[0] in halves:
+            continue
+        column = header_column(headers, *location)
+        key = column.tobytes()
+        if key in seen:
+            continue
+        seen.add(key)
+        columns[location] = column
+    return columns
+
+
+def overlaps(a, b):
+    """ Do two byte locations share bytes. """
+    return a[0] < b[0] + b[1] and b[0] < a[0] + a[1]
+
+
+def line_roles(slow_loc, fast_loc):
+    """
+    Which of the slow and fast line numbers is the inline, from their byte
+    locations: one at the standard inline or crossline bytes decides, else
+    the inline comes first in the header, as in the 9/21 and 189/193 conventions.
+
+    Returns
+    -------
+    inline_loc, crossline_loc : the byte locations of the inline and crossline.
+    """
+    inline_byte = default_byte_locations["inline"][0]
+    crossline_byte = default_byte_locations["crossline"][0]
+    if slow_loc[0] == inline_byte or fast_loc[0] == crossline_byte:
+        return slow_loc, fast_loc
+    if slow_loc[0] == crossline_byte or fast_loc[0] == inline_byte:
+        return fast_loc, slow_loc
+    if slow_loc[0] < fast_loc[0]:
+        return slow_loc, fast_loc
+    return fast_loc, slow_loc
+
+
+def pair_keys(slow, fast):
+    """
+    The (slow, fast) pairs as single integers, far cheaper to np.unique than
+    the stacked pairs.
+
+    Returns
+    -------
+    keys : uint64 array.
+    width : the multiplier of slow, keys % width is fast - fast.min().
+    """
+    slow = (slow.astype(np.int64) - slow.min()).astype(np.uint64)
+    fast = (fast.astype(np.int64) - fast.min()).astype(np.uint64)
+    width = fast.max() + np.uint64(1)
+    return slow * width + fast, width
+
+
+def slow_score(column, contiguous):
+    """ A line number sorted first: constant for runs of traces, monotonic. """
+    step = np.diff(column)[contiguous]
+    if step.size == 0:
+        return 0.0
+    same = np.mean(step == 0)
+    monotonic = max(np.mean(step >= 0), np.mean(step <= 0))
+    return float(same * monotonic)
+
+
+def pair_score(slow, fast, contiguous):
+    """
+    A line number varying within the runs of the slow one by a regular
+    increment, with the same numbers repeating from one slow line to the next
+    (unlike trace counters), every pair unique.
+    """
+    step = np.diff(fast)[contiguous & (np.diff(slow) == 0)]
+    if step.size == 0:
+        return 0.0
+    monotonic = max(np.mean(step > 0), np.mean(step < 0))
+    values, counts = np.unique(step, return_counts=True)
+    regular = counts.max() / step.size
+
+    keys, width = pair_keys(slow, fast)
+    keys = np.unique(keys)
+    unique = len(keys) / len(slow)
+
+    repeat = 1.0
+    if len(np.unique(slow)) > 1:
+        _, lines_per_value = np.unique(keys % width, return_counts=True)
+        repeat = np.mean(lines_per_value > 1)
+    return float(monotonic * regular * unique * repeat)
+
+
+def affine_fit(column, inlines, crosslines):
+    """
+    Least squares fit of column = a + b * inline + c * crossline.
+
+    Returns
+    -------
+    score : float in [0, 1], one minus the relative rms residual.
+    coeffs : (a, b, c) about the mean inline and crossline, b or c is zero
+             when the scan holds a single line.
+    """
+    design = np.stack(
+        [np.ones(len(inlines)), inlines - inlines.mean(), crosslines - crosslines.mean()],
+        axis=1,
+    )
+    coeffs, *_ = np.linalg.lstsq(design, column.astype(float), rcond=None)
+    residual = column - design @ coeffs
+    score = 1.0 - np.sqrt(np.mean(residual ** 2)) / max(np.std(column), 1e-12)
+    return float(max(score, 0.0)), coeffs
+
+
+def scan_segy(segy_file, binary_header=None, num_samples=10000, block_size=256,
+              max_candidates=8):
+    """
+    Infer the geometry of a SEGY file from its trace headers.
+
+    Parameters
+    ----------
+    segy_file : str, the SEGY file.
+    binary_header : dict, see rss.api.parse_binary_header, read if None.
+    num_samples : int, the number of headers to read, spread over the file so
+                  the scan takes the same time for any file, None reads all of them.
+    block_size : int, consecutive traces per block when sampling.
+    max_candidates : int, the number of best candidates paired up per field.
+
+    Returns
+    -------
+    report : dict with the inferred byte_locations (usable by read_trace_data),
+             their scores in [0, 1], the order of the traces in the file, the bounds
+             [min_il, min_xl, max_il, max_xl], the (estimated when sampling)
+             number of live traces, the fill of the bounding box, bin sizes and
+             the uncompressed size of the dense and sparse rss layouts.
+    """
+    if binary_header is None:
+        binary_header = parse_binary_header(segy_file)
+    byteorder = binary_header.get("byteorder", ">")
+
+    index, headers = read_headers(segy_file, binary_header, num_samples, block_size)
+    if len(index) < 2:
+        raise RuntimeError("not enough traces to scan.")
+    contiguous = np.diff(index) == 1
+
+    columns = candidate_columns(headers, byteorder)
+
+    # line numbers sorted first, a constant one only wins for single line files
+    def rank(column):
+        if column.min() == column.max():
+            return 0.5
+        return slow_score(column, contiguous)
+
+    slow = sorted(((rank(col), loc) for loc, col in columns.items()), key=lambda i: -i[0])
+
+    best = (0.0, None, None)
+    for score, slow_loc in slow[:max_candidates]:
+        if score == 0.0:
+            continue
+        for fast_loc, fast in columns.items():
+            if overlaps(fast_loc, slow_loc) or fast.min() == fast.max():
+                continue
+            fast_score = pair_score(columns[slow_loc], fast, contiguous)
+            if score * fast_score > best[0]:
+                best = (score * fast_score, slow_loc, fast_loc)
+    _, slow_loc, fast_loc = best
+    if slow_loc is None:
+        raise RuntimeError("no inline/crossline structure found in the trace headers.")
+
+    slow_col, fast_col = columns[slow_loc], columns[fast_loc]
+    line_scores = [
+        1.0 if slow_col.min() == slow_col.max() else slow_score(slow_col, contiguous),
+        pair_score(slow_col, fast_col, contiguous),
+    ]
+
+    # the order of the traces in the file, the slow line number is the one sorted
+    inline_loc, crossline_loc = line_roles(slow_loc, fast_loc)
+    sort_order = "inline" if inline_loc == slow_loc else "crossline"
+    if sort_order == "crossline":
+        line_scores.reverse()
+    inlines, crosslines = columns[inline_loc], columns[crossline_loc]
+
+    locations = {"inline": inline_loc, "crossline": crossline_loc}
+    scores = {"inline": line_scores[0], "crossline": line_scores[1]}
+
+    # coordinates, affine in the grid
+    fits = {}
+    for loc, col in columns.items():
+        if loc[1] != 4 or col.min() == col.max():
+            continue
+        if overlaps(loc, inline_loc) or overlaps(loc, crossline_loc):
+            continue
+        fits[loc] = affine_fit(col, inlines, crosslines)
+    coords = sorted(fits, key=lambda loc: -fits[loc][0])[:max_candidates]
+    single_line = inlines.min() == inlines.max() or crosslines.min() == crosslines.max()
+
+    def coords_rank(x_loc, y_loc):
+        (x_score, x_coeffs), (y_score, y_coeffs) = fits[x_loc], fits[y_loc]
+        if not single_line:
+            # x and y should span the plane
+            jacobian = np.array([x_coeffs[1:], y_coeffs[1:]])
+            if abs(np.linalg.det(jacobian)) < 1e-6 * np.abs(jacobian).max() ** 2:
+                return None
+        positions = (x_loc[0], y_loc[0])
+        standard = -standard_coords.index(positions) if positions in standard_coords else -len(standard_coords)
+        return (round(min(x_score, y_score), 3), standard, -x_loc[0])
+
+    ranked = []
+    for x_loc in coords:
+        for y_loc in coords:
+            if x_loc[0] < y_loc[0] and not overlaps(x_loc, y_loc):
+                key = coords_rank(x_loc, y_loc)
+                if key is not None and key[0] > 0.9:
+                    ranked.append((key, (x_loc, y_loc)))
+
+    scalco_loc = default_byte_locations["scalco"]
+    scalco_loc = (scalco_loc[0], scalco_loc[1], byteorder + scalco_loc[2].lstrip("<>!=@"))
+    scalcos, counts = np.unique(header_column(headers, *scalco_loc), return_counts=True)
+    scalco = int(scalcos[counts.argmax()]) or 1
+
+    bin_size = None
+    if ranked:
+        _, (cdpx_loc, cdpy_loc) = max(ranked, key=lambda i: i[0])
+        locations["cdpx"], locations["cdpy"] = cdpx_loc, cdpy_loc
+        scores["cdpx"], scores["cdpy"] = fits[cdpx_loc][0], fits[cdpy_loc][0]
+
+        x_coeffs, y_coeffs = fits[cdpx_loc][1], fits[cdpy_loc][1]
+        bin_size = [
+            float(to_coord(np.hypot(x_coeffs[1], y_coeffs[1]), scalco)),
+            float(to_coord(np.hypot(x_coeffs[2], y_coeffs[2]), scalco)),
+        ]
+    locations["scalco"] = scalco_loc
+
+    bounds = [int(inlines.min()), int(crosslines.min()),
+              int(inlines.max()), int(crosslines.max())]
+    num_cells = (bounds[2] - bounds[0] + 1) * (bounds[3] - bounds[1] + 1)
+
+    pairs = len(np.unique(pair_keys(inlines, crosslines)[0]))
+    live_traces = int(round(binary_header["num_traces"] * pairs / len(index)))
+
+    ns = binary_header["ns"]
+    return {
+        "num_traces": binary_header["num_traces"],
+        "scanned_traces": len(index),
+        "byte_locations": locations,
+        "scores": scores,
+        "sort_order": sort_order,
+        "bounds": bounds,
+        "live_traces": live_traces,
+        "fill": min(live_traces / num_cells, 1.0),
+        "scalco": scalco,
+        "bin_size": bin_size,
+        "dense_size_bytes": 2 * ns * num_cells,
+        "sparse_size_bytes": 2 * ns * live_traces,
+    }
+
+
+def format_report(report):
+    """ The report of scan_segy as text, with the matching ingestion.py options. """
+    lines = []
+    sampled = report["scanned_traces"] < report["num_traces"]
+    lines.append(
+        f"scanned {report['scanned_traces']} of {report['num_traces']} trace headers"
+        + (" (estimates)" if sampled else "")
+    )
+    for key, (byte, size, fmt) in report["byte_locations"].items():
+        score = report["scores"].get(key)
+        score = "" if score is None else f" score {score:.3f}"
+        lines.append(f"  {key:<10} bytes {byte}-{byte + size - 1} ({fmt}){score}")
+    min_il, min_xl, max_il, max_xl = report["bounds"]
+    lines.append(f"  traces in the file sorted by {report['sort_order']}")
+    lines.append(f"  inlines {min_il}-{max_il}, crosslines {min_xl}-{max_xl}")
+    lines.append(f"  live traces {report['live_traces']}, {100 * report['fill']:.1f}% of the grid")
+    if report["bin_size"] is not None:
+        lines.append(f"  bin size {report['bin_size'][0]:.2f} x {report['bin_size'][1]:.2f}, scalco {report['scalco']}")
+    lines.append(
+        f"  rss size per sort order before compression: dense "
+        f"{report['dense_size_bytes'] / 1024 ** 2:.1f} MB, sparse "
+        f"{report['sparse_size_bytes'] / 1024 ** 2:.1f} MB"
+    )
+
+    options = [
+        f"--{key}='{byte}-{byte + size - 1}'"
+        for key, (byte, size, _) in report["byte_locations"].items()
+        if key != "scalco"
+    ]
+    lines.append("  ingestion.py " + " ".join(options))
+    # whatever the order of the file, every stored sort order is a separate ingestion
+    lines.append("  then --sort_order='inline' and/or --sort_order='crossline' for the stored layouts")
+    return "\n".join(lines)
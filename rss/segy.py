@@ -0,0 +1,259 @@
+""" Vectorized SEGY decoding and encoding, whole blocks of traces at a time. """
+import numpy as np
+
+# SEGY definitions
+headers_offset = 3600
+trace_header_size = 240
+binary_header_size = 400
+
+# the standard (rev 1) trace header fields, SU names: 1-based byte and type
+trace_header_fields = {
+    "tracl": (1, "i4"), "tracr": (5, "i4"), "fldr": (9, "i4"), "tracf": (13, "i4"),
+    "ep": (17, "i4"), "cdp": (21, "i4"), "cdpt": (25, "i4"), "trid": (29, "i2"),
+    "nvs": (31, "i2"), "nhs": (33, "i2"), "duse": (35, "i2"), "offset": (37, "i4"),
+    "gelev": (41, "i4"), "selev": (45, "i4"), "sdepth": (49, "i4"), "gdel": (53, "i4"),
+    "sdel": (57, "i4"), "swdep": (61, "i4"), "gwdep": (65, "i4"), "scalel": (69, "i2"),
+    "scalco": (71, "i2"), "sx": (73, "i4"), "sy": (77, "i4"), "gx": (81, "i4"),
+    "gy": (85, "i4"), "counit": (89, "i2"), "wevel": (91, "i2"), "swevel": (93, "i2"),
+    "sut": (95, "i2"), "gut": (97, "i2"), "sstat": (99, "i2"), "gstat": (101, "i2"),
+    "tstat": (103, "i2"), "laga": (105, "i2"), "lagb": (107, "i2"), "delrt": (109, "i2"),
+    "muts": (111, "i2"), "mute": (113, "i2"), "ns": (115, "u2"), "dt": (117, "u2"),
+    "gain": (119, "i2"), "igc": (121, "i2"), "igi": (123, "i2"), "corr": (125, "i2"),
+    "sfs": (127, "i2"), "sfe": (129, "i2"), "slen": (131, "i2"), "styp": (133, "i2"),
+    "stas": (135, "i2"), "stae": (137, "i2"), "tatyp": (139, "i2"), "afilf": (141, "i2"),
+    "afils": (143, "i2"), "nofilf": (145, "i2"), "nofils": (147, "i2"), "lcf": (149, "i2"),
+    "hcf": (151, "i2"), "lcs": (153, "i2"), "hcs": (155, "i2"), "year": (157, "i2"),
+    "day": (159, "i2"), "hour": (161, "i2"), "minute": (163, "i2"), "sec": (165, "i2"),
+    "timbas": (167, "i2"), "trwf": (169, "i2"), "grnors": (171, "i2"),
+    "grnofr": (173, "i2"), "grnlof": (175, "i2"), "gaps": (177, "i2"), "otrav": (179, "i2"),
+    "cdpx": (181, "i4"), "cdpy": (185, "i4"), "inline": (189, "i4"),
+    "crossline": (193, "i4"), "sp": (197, "i4"), "scalsp": (201, "i2"),
+    "trunit": (203, "i2"), "tdmant": (205, "i4"), "tdexp": (209, "i2"),
+    "tunit": (211, "i2"), "devid": (213, "i2"), "tscalar": (215, "i2"),
+    "stype": (217, "i2"), "smmant": (225, "i4"), "smexp": (229, "i2"),
+    "smunit": (231, "i2"),
+}
+
+# stored sample type per binary format, IBM floats are decoded from their bits
+sample_dtypes = {
+    1: "u4",
+    2: "i4",
+    3: "i2",
+    5: "f4",
+    8: "i1",
+}
+
+
+def sample_dtype(binary_format, byteorder=">"):
+    """
+    The numpy dtype of the samples of a binary format.
+
+    Parameters
+    ----------
+    binary_format : int, the format code of the binary header.
+    byteorder : '>' for big-endian (the standard) or '<' for little-endian
+                or byte-swapped files.
+
+    Returns
+    -------
+    dtype : numpy dtype.
+    """
+    if binary_format not in sample_dtypes:
+        raise RuntimeError(f"binary format {binary_format} not supported.")
+    return np.dtype(byteorder + sample_dtypes[binary_format])
+
+
+def decode_samples(samples, binary_format, ns, byteorder=">", out=None):
+    """
+    Decodes SEGY samples of a block of traces to float32.
+
+    Parameters
+    ----------
+    samples : bytes or uint8 array holding the samples of whole traces, either
+              contiguous or (n_traces, ns * sample size) with trace headers
+              sliced off a block of traces.
+    binary_format : one of 1 (IBM), 2 (int32), 3 (int16), 5 (IEEE) or 8 (int8).
+    ns : int, the number of samples per trace.
+    byteorder : '>' for big-endian or '<' for little-endian samples.
+    out : optional float32 array (n_traces, ns) to decode into.
+
+    Returns
+    -------
+    traces : float32 array (n_traces, ns).
+    """
+    dtype = sample_dtype(binary_format, byteorder)
+    if isinstance(samples, np.ndarray):
+        samples = samples.view(dtype)
+    else:
+        samples = np.frombuffer(samples, dtype=dtype)
+    samples = samples.reshape(-1, ns)
+
+    if out is None:
+        out = np.empty(samples.shape, dtype=np.float32)
+
+    if binary_format == 1:
+        from ibm2ieee import ibm2float32
+
+        ibm2float32(samples, out=out)
+    else:
+        np.copyto(out, samples, casting="unsafe")
+    return out
+
+
+def decode_traces(block, binary_format, ns, byteorder=">", out=None):
+    """
+    Decodes the samples of a block of whole traces, headers included.
+
+    Parameters
+    ----------
+    block : bytes or uint8 array of consecutive traces as read from the file.
+    binary_format, ns, byteorder, out : see decode_samples.
+
+    Returns
+    -------
+    traces : float32 array (n_traces, ns).
+    """
+    trace_size = trace_header_size + ns * sample_dtype(binary_format).itemsize
+    if not isinstance(block, np.ndarray):
+        block = np.frombuffer(block, dtype=np.uint8)
+    block = block.reshape(-1, trace_size)
+    return decode_samples(block[:, trace_header_size:], binary_format, ns, byteorder, out)
+
+
+def unpack_headers(headers, fields=None, byteorder=">"):
+    """
+    Decodes the fields of a block of trace headers, a column per field.
+
+    Parameters
+    ----------
+    headers : uint8 array (n_traces, 240), or (n_traces, trace size) with the
+              samples following the headers.
+    fields : dict of field name to (1-based byte, type), trace_header_fields
+             when None.
+    byteorder : '>' for big-endian or '<' for little-endian headers.
+
+    Returns
+    -------
+    columns : dict of field name to a native integer array (n_traces,).
+    """
+    headers = np.asarray(headers, dtype=np.uint8)[:, :trace_header_size]
+    columns = {}
+    for name, (byte, fmt) in (fields or trace_header_fields).items():
+        dtype = np.dtype(byteorder + fmt)
+        field = np.ascontiguousarray(headers[:, byte - 1 : byte - 1 + dtype.itemsize])
+        columns[name] = field.view(dtype)[:, 0].astype(dtype.newbyteorder("="))
+    return columns
+
+
+def ieee2ibm(data):
+    """
+    Converts IEEE floats to 4-byte IBM floating point, the inverse of
+    ibm2ieee.ibm2float32 (the low bits of the mantissa are truncated).
+
+    Parameters
+    ----------
+    data : float array.
+
+    Returns
+    -------
+    ibm : uint32 array of IBM floats, in native byte order.
+    """
+    data = np.ascontiguousarray(data, dtype=np.float32)
+    bits = data.view(np.uint32)
+
+    sign = bits & np.uint32(0x80000000)
+    exponent = ((bits >> 23) & 0xFF).astype(np.int32)
+    mantissa = (bits & np.uint32(0x7FFFFF)) | np.uint32(0x800000)
+
+    # value = mantissa / 2**24 * 2**e, IBM wants fraction / 2**24 * 16**q
+    e = exponent - 126
+    q = -((-e) // 4)
+    shift = (4 * q - e).astype(np.uint32)
+    fraction = mantissa >> shift
+    ibm_exponent = q + 64
+
+    ibm = sign | (ibm_exponent.astype(np.uint32) << 24) | fraction
+
+    # zero, denormals and underflow become zero, overflow saturates
+    ibm = np.where((exponent == 0) | (ibm_exponent < 0), sign, ibm)
+    ibm = np.where(ibm_exponent > 127, sign | np.uint32(0x7FFFFFFF), ibm)
+    return ibm.astype(np.uint32)
+
+
+def encode_samples(traces, binary_format):
+    """
+    Encodes a block of traces as SEGY samples.
+
+    Parameters
+    ----------
+    traces : float array (n_traces, ns).
+    binary_format : 1 for IBM or 5 for IEEE floating-point.
+
+    Returns
+    -------
+    samples : uint8 array (n_traces, 4 * ns), big-endian.
+    """
+    if binary_format == 1:
+        samples = ieee2ibm(traces).astype(">u4")
+    elif binary_format == 5:
+        samples = np.ascontiguousarray(traces, dtype=">f4")
+    else:
+        raise RuntimeError(f"binary format {binary_format} not supported for export.")
+    return samples.view(np.uint8).reshape(samples.shape[0], -1)
+
+
+def pack_headers(values, num_traces, byte_locations):
+    """
+    Packs trace headers for a block of traces.
+
+    Parameters
+    ----------
+    values : dict of field name to an int array (or scalar) of header values.
+    num_traces : int, the number of traces in the block.
+    byte_locations : dict of field name to (1-based byte, size, struct format),
+                     as in rss.api.byte_locations.
+
+    Returns
+    -------
+    headers : uint8 array (num_traces, 240).
+    """
+    headers = np.zeros((num_traces, trace_header_size), dtype=np.uint8)
+    for key, val in values.items():
+        byte, size, fmt = byte_locations[key]
+        dtype = np.dtype(fmt)
+        if dtype.itemsize != size:
+            raise RuntimeError(f"header {key} format {fmt} is not {size} bytes.")
+        column = np.broadcast_to(np.asarray(val), (num_traces,)).astype(dtype)
+        headers[:, byte - 1 : byte - 1 + size] = column.view(np.uint8).reshape(
+            num_traces, size
+        )
+    return headers
+
+
+def make_text_header(lines):
+    """ A 3200 byte EBCDIC header from up to 40 lines of text. """
+    text = ""
+    for i in range(40):
+        line = lines[i] if i < len(lines) else ""
+        text += f"C{i + 1:02d} {line}"[:80].ljust(80)
+    return text.encode("cp1140")
+
+
+def make_binary_header(sample_rate_ms, ns, binary_format, units="meters"):
+    """ A 400 byte binary header, the fields read by rss.api.parse_binary_header. """
+    header = np.zeros(binary_header_size, dtype=np.uint8)
+    unit_codes = {"unknown": 0, "meters": 1, "feet": 2}
+
+    def put(offset, value, fmt=">H"):
+        header[offset : offset + np.dtype(fmt).itemsize] = np.frombuffer(
+            np.array(value, dtype=fmt).tobytes(), dtype=np.uint8
+        )
+
+    put(16, int(round(sample_rate_ms * 1000)))
+    put(20, ns)
+    put(24, binary_format)
+    put(54, unit_codes.get(units, 0))
+    # revision 1, fixed length traces
+    put(300, 0x0100)
+    put(302, 1)
+    return header.tobytes()
@@ -0,0 +1,421 @@
+""" An asyncio HTTP server for rss lines, traces, time slices and FORGE windows.
+
+    One warm process holds one client, so every viewer shares the same chunk
+    cache and KDTree. Identical requests in flight at the same time are
+    coalesced into a single read, and responses carry ETags derived from the
+    consolidated metadata of the stores. Appending traces rewrites it, the
+    server reads it again at most once per version_interval seconds and then
+    opens its clients again, so caches revalidate instead of serving stale
+    lines.
+
+    Routes (all GET):
+        /line/<sort_order>/<line_number>?format=float32|uint16
+        /trace/<inline>/<crossline>?format=float32|uint16
+        /slice/<sample>?sort_order=inline
+        /forge/<iset>?channels=a:b&samples=a:b&format=float32|uint16
+        /query?x=<easting>&y=<northing>&k=4
+        /stats
+
+    Binary responses are little-endian arrays, the shape and dtype are in the
+    X-Shape and X-Dtype headers. uint16 responses are the stored quantized
+    samples, zero for padding, and X-Scalers holds "min_val,max_val" so that
+    (q - 1) * max_val / (65535 - 1) + min_val recovers the amplitudes. float32
+    responses use NaN for padding.
+"""
+import asyncio
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import zarr
+
+from rss.client import dequantize, line_index
+
+reasons = {
+    200: "OK",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    500: "Internal Server Error",
+}
+
+formats = ("float32", "uint16")
+
+
+def store_version(store):
+    """ A digest of the metadata of a store, it changes when traces are appended. """
+    # read from the store every time, not from the metadata of an open group
+    try:
+        meta = store[".zmetadata"]
+    except KeyError:
+        # not consolidated, the array shapes grow on append
+        root = zarr.open(store, mode="r")
+        shapes = {name: array.shape for name, array in root.arrays(recurse=True)}
+        meta = json.dumps(shapes, sort_keys=True).encode()
+    return hashlib.sha1(meta).hexdigest()
+
+
+def parse_range(text, default):
+    """ Parse 'a:b' into a slice, missing ends fall back to default. """
+    if text is None:
+        return default
+    start, _, stop = text.partition(":")
+    return slice(int(start) if start else default.start,
+                 int(stop) if stop else default.stop)
+
+
+def encode(traces, fmt, scalers=None):
+    """ Serialize an array as a binary response body and headers. """
+    if fmt == "uint16":
+        body = np.ascontiguousarray(traces, dtype="<u2")
+        headers = {"X-Dtype": "uint16"}
+        if scalers is not None:
+            headers["X-Scalers"] = ",".join(repr(float(i)) for i in scalers)
+    else:
+        body = np.ascontiguousarray(traces, dtype="<f4")
+        headers = {"X-Dtype": "float32"}
+    headers["X-Shape"] = ",".join(str(i) for i in body.shape)
+    headers["Content-Type"] = "application/octet-stream"
+    return body.tobytes(), headers
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class rssServer:
+    def __init__(self, client=None, forge_client=None, name="rss", workers=8,
+                 history=10000, version_interval=10.0):
+        """
+        Serve an rssClient and/or rssFORGEClient over HTTP.
+
+        Parameters
+        ----------
+        client : rssClient or None.
+        forge_client : rssFORGEClient or None.
+        name : str, identifies the data in the ETags, e.g. the store uri.
+        workers : number of threads reading from the store.
+        history : number of latencies kept per route for the percentiles.
+        version_interval : seconds between reads of the store metadata, a changed
+                           store is opened again and gets new ETags.
+        """
+        if client is None and forge_client is None:
+            raise RuntimeError("rssServer needs a client or a forge_client.")
+
+        self.client = client
+        self.forge_client = forge_client
+        self.name = name
+        self.versions = {
+            kind: store_version(c._store)
+            for kind, c in (("client", client), ("forge_client", forge_client))
+            if c is not None
+        }
+        self.version_interval = version_interval
+        self._checked = time.monotonic()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.in_flight = {}
+        self.latency = defaultdict(lambda: deque(maxlen=history))
+        self.num_requests = 0
+        self.num_coalesced = 0
+
+        self.routes = {
+            "line": self._line,
+            "trace": self._trace,
+            "slice": self._slice,
+            "forge": self._forge,
+            "query": self._query,
+        }
+
+    # synchronous reads, run in the executor
+    def _read_line(self, sort_order, line_number, fmt):
+        if fmt == "float32":
+            traces, _ = self.client.line(line_number, sort_order=sort_order)
+            return encode(traces, fmt)
+
+        if sort_order == "inline":
+            line_root = self.client.inline_root
+        else:
+            line_root = self.client.crossline_root
+        index = line_index(self.client.bounds, line_number, sort_order)
+        return encode(line_root["seismic"][:, :, index], fmt,
+                      scalers=line_root["scalers"][index, :])
+
+    def _read_trace(self, inline, crossline, fmt):
+        if fmt == "float32":
+            trace, mask = self.client.trace(inline, crossline)
+            return encode(np.where(mask, np.nan, trace), fmt)
+
+        inline_index = line_index(self.client.bounds, inline, "inline")
+        crossline_index = line_index(self.client.bounds, crossline, "crossline")
+        line_root = self.client.inline_root
+        return encode(line_root["seismic"][:, crossline_index, inline_index], fmt,
+                      scalers=line_root["scalers"][inline_index, :])
+
+    def _read_slice(self, sample, sort_order):
+        traces, _ = self.client.time_slice(sample, sort_order=sort_order)
+        return encode(traces, "float32")
+
+    def _read_forge(self, iset, channels, samples, fmt):
+        root = self.forge_client.root
+        num_lines = root["seismic"].shape[-1]
+        if iset < 0 or iset >= num_lines:
+            raise RuntimeError(f"{iset} out of bounds [0, {num_lines - 1}].")
+
+        traces = root["seismic"][channels, samples, iset]
+        scalers = root["scalers"][iset, :]
+        if fmt == "uint16":
+            return encode(traces, fmt, scalers=scalers)
+        traces, _ = dequantize(traces, scalers[0], scalers[1], dtype=np.float32)
+        return encode(traces, fmt)
+
+    def _read_query(self, xy, k):
+        dist, ilxl = self.client.query_by_xy(xy, k=k)
+        body = json.dumps({
+            "dist": np.atleast_2d(dist).tolist(),
+            "ilxl": [np.asarray(i).tolist() for i in ilxl],
+        }).encode()
+        return body, {"Content-Type": "application/json"}
+
+    # route handlers, return a read function and its arguments
+    def _format(self, query):
+        fmt = query.get("format", "float32")
+        if fmt not in formats:
+            raise RequestError(400, f"format {fmt} should be one of {formats}.")
+        return fmt
+
+    def _require(self, client, kind):
+        if client is None:
+            raise RequestError(404, f"no {kind} data is served.")
+
+    def _line(self, args, query):
+        self._require(self.client, "rss")
+        sort_order, line_number = args
+        if sort_order not in ("inline", "crossline"):
+            raise RequestError(404, f"unknown sort order {sort_order}.")
+        return self._read_line, (sort_order, int(line_number), self._format(query))
+
+    def _trace(self, args, query):
+        self._require(self.client, "rss")
+        inline, crossline = args
+        return self._read_trace, (int(inline), int(crossline), self._format(query))
+
+    def _slice(self, args, query):
+        self._require(self.client, "rss")
+        (sample,) = args
+        sort_order = query.get("sort_order", "inline")
+        if sort_order not in ("inline", "crossline"):
+            raise RequestError(400, f"unknown sort order {sort_order}.")
+        return self._read_slice, (int(sample), sort_order)
+
+    def _forge(self, args, query):
+        self._require(self.forge_client, "FORGE")
+        (iset,) = args
+        channels = parse_range(query.get("channels"), slice(None, None))
+        samples = parse_range(query.get("samples"), slice(None, None))
+        return self._read_forge, (int(iset), channels, samples, self._format(query))
+
+    def _query(self, args, query):
+        self._require(self.client, "rss")
+        xy = [float(query["x"]), float(query["y"])]
+        return self._read_query, (xy, int(query.get("k", 4)))
+
+    @property
+    def version(self):
+        return ":".join(self.versions.values())
+
+    def _reopen(self):
+        """ Clients of the stores whose metadata changed, run in the executor. """
+        clients = {}
+        for kind, version in self.versions.items():
+            client = getattr(self, kind)
+            latest = store_version(client._store)
+            if latest != version:
+                clients[kind] = client.reopen(), latest
+        return clients
+
+    async def _check_version(self):
+        now = time.monotonic()
+        if now - self._checked < self.version_interval:
+            return
+        # concurrent requests don't check again
+        self._checked = now
+        loop = asyncio.get_running_loop()
+        clients = await loop.run_in_executor(self.executor, self._reopen)
+        for kind, (client, version) in clients.items():
+            setattr(self, kind, client)
+            self.versions[kind] = version
+
+    def etag(self, key):
+        digest = hashlib.sha1(f"{self.name}:{self.version}:{key}".encode()).hexdigest()
+        return f'"{digest}"'
+
+    async def handle(self, target, if_none_match=None):
+        """
+        Answer one GET request.
+
+        Parameters
+        ----------
+        target : str, the request path and query string.
+        if_none_match : the If-None-Match header of the request, if any.
+
+        Returns
+        -------
+        status : int, the HTTP status.
+        headers : dict of response headers.
+        body : bytes.
+        """
+        tic = time.perf_counter()
+        self.num_requests += 1
+
+        url = urlsplit(target)
+        parts = [i for i in url.path.split("/") if i]
+        query = {key: val[-1] for key, val in parse_qs(url.query).items()}
+        route = parts[0] if parts else ""
+
+        try:
+            if route == "stats":
+                return 200, {"Content-Type": "application/json"}, \
+                    json.dumps(self.stats()).encode()
+
+            if route not in self.routes:
+                raise RequestError(404, f"unknown route {url.path}.")
+
+            try:
+                read, args = self.routes[route](parts[1:], query)
+            except (ValueError, KeyError, TypeError):
+                raise RequestError(400, f"malformed request {target}.")
+
+            await self._check_version()
+
+            # the key identifies the response, independent of query order
+            key = f"{route}:{args!r}"
+            etag = self.etag(key)
+            if if_none_match == etag:
+                return 304, {"ETag": etag}, b""
+
+            # reads of a store before it changed are not shared with later ones
+            body, headers = await self._coalesce(etag, read, args)
+            headers = dict(headers, ETag=etag)
+            # stores can be appended in place, revalidate with the ETag
+            headers["Cache-Control"] = "public, no-cache"
+            return 200, headers, body
+
+        except RequestError as error:
+            return error.status, {"Content-Type": "text/plain"}, str(error).encode()
+        except RuntimeError as error:
+            # the clients raise RuntimeError for out of bounds requests
+            return 400, {"Content-Type": "text/plain"}, str(error).encode()
+        except Exception as error:
+            return 500, {"Content-Type": "text/plain"}, repr(error).encode()
+        finally:
+            self.latency[route].append(time.perf_counter() - tic)
+
+    async def _coalesce(self, key, read, args):
+        if key in self.in_flight:
+            self.num_coalesced += 1
+            return await asyncio.shield(self.in_flight[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, read, *args)
+        self.in_flight[key] = future
+        try:
+            return await future
+        finally:
+            del self.in_flight[key]
+
+    def stats(self):
+        """
+        Request counts and latency percentiles (in milliseconds) per route.
+        """
+        routes = {}
+        for route, latency in self.latency.items():
+            if not latency:
+                continue
+            p50, p90, p99 = np.percentile(np.array(latency) * 1000.0, [50, 90, 99])
+            routes[route] = {
+                "count": len(latency),
+                "p50_ms": p50,
+                "p90_ms": p90,
+                "p99_ms": p99,
+                "max_ms": max(latency) * 1000.0,
+            }
+
+        result = {
+            "requests": self.num_requests,
+            "coalesced": self.num_coalesced,
+            "in_flight": len(self.in_flight),
+            "routes": routes,
+        }
+        for kind, client in (("rss", self.client), ("forge", self.forge_client)):
+            cache = getattr(client, "cache", None)
+            if cache is not None and hasattr(cache, "hits"):
+                result[f"{kind}_cache"] = {"hits": cache.hits, "misses": cache.misses}
+        return result
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, val = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = val.strip()
+
+                if method not in ("GET", "HEAD"):
+                    status, response_headers, body = 405, {}, b""
+                else:
+                    status, response_headers, body = await self.handle(
+                        target, headers.get("if-none-match")
+                    )
+
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+
+                head = [f"HTTP/1.1 {status} {reasons[status]}"]
+                response_headers = dict(response_headers)
+                response_headers["Content-Length"] = str(len(body))
+                response_headers["Connection"] = "keep-alive" if keep_alive else "close"
+                head += [f"{key}: {val}" for key, val in response_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if method == "GET":
+                    writer.write(body)
+                await writer.drain()
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """ Start listening, returns the asyncio server. """
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+    def run(self, host="127.0.0.1", port=8080):
+        """ Serve forever. """
+
+        async def main():
+            server = await self.start(host, port)
+            async with server:
+                await server.serve_forever()
+
+        print(f"Serving {self.name} on http://{host}:{port}")
+        asyncio.run(main())
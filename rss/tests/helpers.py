@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import zarr
+
+psdn_data = os.path.join(
+    os.path.dirname(__file__), "..", "..", "data", "psdn_test_data.segy"
+)
+
+psdn_meta = {
+    "sample_rate_ms": 1.0,
+    "ns": 1501,
+    "float_format": 5,
+    "units": "meters",
+    "num_traces": 120,
+    "size_of_trace": 240 + 4 * 1501,
+}
+
+
+def make_segy(path, traces, binary_format=5, inlines=None, crosslines=None,
+              byteorder=">", sample_rate_ms=2.0):
+    """
+    A minimal SEGY file with inline/crossline/cdp headers in any format and
+    byte order, by default 4 crosslines per inline.
+    """
+    num_traces, ns = traces.shape
+    dtype = np.dtype(byteorder + {1: "u4", 2: "i4", 3: "i2", 5: "f4", 8: "i1"}[binary_format])
+
+    if inlines is None:
+        inlines = 100 + np.arange(num_traces) // 4
+    if crosslines is None:
+        crosslines = 200 + np.arange(num_traces) % 4
+
+    binary_header = np.zeros(200, dtype=byteorder + "u2")
+    binary_header[8] = int(sample_rate_ms * 1000)
+    binary_header[10] = ns
+    binary_header[12] = binary_format
+    binary_header[27] = 1
+
+    headers = np.zeros((num_traces, 60), dtype=byteorder + "i4")
+    headers[:, (181 - 1) // 4] = 1000 * np.asarray(crosslines)
+    headers[:, (185 - 1) // 4] = 1000 * np.asarray(inlines)
+    headers[:, (189 - 1) // 4] = inlines
+    headers[:, (193 - 1) // 4] = crosslines
+    # scalco 1, in the upper half of bytes 69-72
+    headers.view(byteorder + "i2")[:, (71 - 1) // 2] = 1
+
+    if binary_format == 1:
+        from rss.segy import ieee2ibm
+
+        samples = ieee2ibm(traces).astype(dtype)
+    else:
+        samples = traces.astype(dtype)
+
+    with open(path, "wb") as fp:
+        fp.write(b"\x40" * 3200)
+        fp.write(binary_header.tobytes())
+        for header, sample in zip(headers, samples):
+            fp.write(header.tobytes())
+            fp.write(sample.tobytes())
+
+
+def make_test_rss(folder, segy_file=psdn_data, binary_header=psdn_meta,
+                  sort_orders=("inline", "crossline"), **kwargs):
+    """
+    Ingest segy_file in both sort orders below folder, returns the rss path.
+    kwargs are passed to compressed_zarr, e.g. layout.
+    """
+    from rss.api import compressed_zarr, read_trace_data
+
+    cwd = os.getcwd()
+    os.chdir(folder)
+    try:
+        for sort_order in sort_orders:
+            read_trace_data(segy_file, binary_header, sort_order=sort_order)
+            compressed_zarr(segy_file, sort_order=sort_order, **kwargs)
+    finally:
+        os.chdir(cwd)
+    return os.path.join(folder, os.path.splitext(os.path.basename(segy_file))[0])
+
+
+def make_test_forge(path, data, events):
+    """ Write a small FORGE style store holding data (n_lines, n_traces, ns). """
+    from numcodecs import JSON
+    from rss.api import consolidate
+    from rss.forge_api import make_forge_zarr
+
+    num_lines, num_traces, ns = data.shape
+    root = zarr.group(zarr.DirectoryStore(path))
+    make_forge_zarr(root, num_traces=num_traces, ns=ns, num_lines=num_lines,
+                    num_events=len(events))
+
+    for iline, traces in enumerate(data):
+        min_val = traces.min()
+        max_val = traces.max() - min_val
+        root["seismic"][..., iline] = (
+            (65535 - 1) * (traces - min_val) / max_val + 1
+        ).astype(np.uint16)
+        root["scalers"][iline, :] = (min_val, max_val)
+
+    root["sample_events"][:] = events
+    root["segy_filenames"][:] = [f"line_{i}.sgy" for i in range(num_lines)]
+    root.create_dataset("RECMD", data=np.arange(num_traces) * 1000, overwrite=True)
+
+    config = {"sample_rate_ms": 0.5, "ns": ns}
+    root.empty("binary_header", shape=len(config), dtype=object,
+               object_codec=JSON(), overwrite=True)
+    for i, keyval in enumerate(config.items()):
+        root["binary_header"][i] = {keyval[0]: keyval[1]}
+    consolidate(root)
+    return root
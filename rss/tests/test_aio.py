@@ -0,0 +1,101 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import fsspec
+from fsspec.implementations.asyn_wrapper import AsyncFileSystemWrapper
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_test_forge, make_test_rss
+
+
+class TestAsyncReads(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+
+        cls.forge_path = os.path.join(cls.folder, "das.zarr")
+        data = np.random.default_rng(11).standard_normal((3, 6, 400))
+        make_test_forge(cls.forge_path, data.astype(np.float32), events=[(10, 0)])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_aread(self):
+        from rss.aio import aread
+
+        root = zarr.open(os.path.join(self.folder, "chunks.zarr"), mode="w")
+        array = root.create_dataset(
+            "a", data=np.arange(7 * 9 * 5).reshape(7, 9, 5), chunks=(3, 4, 2)
+        )
+        for selection in [
+            (slice(None), slice(None), 3),
+            (2, slice(1, 8), slice(None)),
+            (slice(2, 6), 8, 4),
+        ]:
+            np.testing.assert_array_equal(asyncio.run(aread(array, selection)),
+                                          array[selection])
+
+    def test_rss_async_filesystem(self):
+        from rss.client import rssClient
+
+        # an fsspec mapping over an async filesystem, like s3fs
+        fs = AsyncFileSystemWrapper(fsspec.filesystem("file"))
+        rss = rssClient(fs.get_mapper(self.path))
+
+        # chunks are fetched on the filesystem's loop, not through the LRU cache
+        fetched = []
+        cat_file = fs._cat_file
+
+        async def counting_cat_file(path, *args, **kwargs):
+            fetched.append(path)
+            return await cat_file(path, *args, **kwargs)
+
+        fs._cat_file = counting_cat_file
+
+        async def main():
+            crosslines = range(rss.bounds[1], rss.bounds[3] + 1)
+            lines = await asyncio.gather(
+                *[rss.aline(xl, sort_order="crossline") for xl in crosslines]
+            )
+            trace = await rss.atrace(983, rss.bounds[1] + 60)
+            inline = await rss.aline(983)
+            return lines, trace, inline
+
+        lines, trace, inline = asyncio.run(main())
+        self.assertGreater(rss.cache.misses, 0)
+        self.assertEqual(len(fetched), rss.cache.misses)
+
+        # the fetched chunks filled the LRU cache
+        hits = rss.cache.hits
+        asyncio.run(rss.aline(983))
+        self.assertGreater(rss.cache.hits, hits)
+        self.assertEqual(len(fetched), rss.cache.misses)
+
+        for k in (0, 60, 119):
+            expected = rss.line(rss.bounds[1] + k, sort_order="crossline")
+            np.testing.assert_array_equal(lines[k][0], expected[0])
+            np.testing.assert_array_equal(lines[k][1], expected[1])
+
+        expected = rss.trace(983, rss.bounds[1] + 60)
+        np.testing.assert_array_equal(trace[0], expected[0])
+        np.testing.assert_array_equal(inline[0], rss.line(983)[0])
+
+    def test_forge_awindow(self):
+        from rss.forge_client import rssFORGEClient
+
+        client = rssFORGEClient(zarr.DirectoryStore(self.forge_path))
+
+        async def main():
+            return await asyncio.gather(
+                client.aline(1), client.awindow(2, slice(1, 4), slice(100, 300))
+            )
+
+        line, window = asyncio.run(main())
+        np.testing.assert_array_equal(line[0], client.line(1)[0])
+        np.testing.assert_array_equal(window[0], client.line(2)[0][1:4, 100:300])
@@ -53,6 +53,7 @@ binary_meta = {
     "units": "meters",
     "num_traces": 1,
     "size_of_trace": 4244,
+    "byteorder": ">",
 }
 
 
@@ -0,0 +1,158 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_segy, make_test_forge, make_test_rss
+
+
+class TestAppend(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+        inlines, crosslines = np.meshgrid(np.arange(100, 108), np.arange(200, 216), indexing="ij")
+        # the first survey stops short of the last crosslines
+        first = (inlines < 104) & (crosslines < 212)
+        second = inlines >= 104
+        rng = np.random.default_rng(5)
+        traces = rng.standard_normal(inlines.shape + (20,)).astype(np.float32)
+
+        self.files = {}
+        for name, live in (("first", first), ("second", second), ("full", first | second)):
+            segy_file = os.path.join(self.folder, f"{name}.sgy")
+            make_segy(segy_file, traces[live], inlines=inlines[live], crosslines=crosslines[live])
+            self.files[name] = segy_file
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def ingest(self, name, **kwargs):
+        from rss.api import parse_binary_header
+
+        folder = os.path.join(self.folder, f"{name}-{kwargs.get('layout', 'dense')}")
+        os.makedirs(folder)
+        segy_file = self.files[name]
+        return make_test_rss(folder, segy_file, parse_binary_header(segy_file), **kwargs)
+
+    def append(self, path, name):
+        from rss.api import append_zarr, parse_binary_header, read_trace_data
+
+        segy_file = self.files[name]
+        binary_header = parse_binary_header(segy_file)
+        cwd = os.getcwd()
+        os.chdir(os.path.dirname(path))
+        try:
+            for sort_order in ("inline", "crossline"):
+                read_trace_data(segy_file, binary_header, sort_order=sort_order)
+            append_zarr(segy_file, path)
+        finally:
+            os.chdir(cwd)
+
+    def check(self, layout):
+        from rss.api import staged_headers
+        from rss.client import rssFromFile
+
+        path = self.ingest("first", layout=layout, tile_size=4)
+        self.append(path, "second")
+        appended = rssFromFile(path)
+        full = rssFromFile(self.ingest("full", layout=layout, tile_size=4))
+
+        # the staged trace headers are removed once stored
+        for name in ("first", "second"):
+            staged = os.path.join(os.path.dirname(path), name, staged_headers)
+            self.assertFalse(os.path.exists(staged))
+
+        np.testing.assert_array_equal(appended.bounds, [100, 200, 107, 215])
+        self.assertEqual(appended.root.attrs["binary_header"]["num_traces"],
+                         len(full.ilxl))
+        np.testing.assert_array_equal(appended.footprint(), full.footprint())
+        np.testing.assert_array_equal(
+            np.sort(appended.xy, axis=0), np.sort(full.xy, axis=0)
+        )
+        headers = appended.trace_headers(["inline", "crossline"])
+        np.testing.assert_array_equal(
+            np.stack([headers["inline"], headers["crossline"]], axis=1), appended.ilxl
+        )
+
+        for sort_order, (first, last) in (("inline", (100, 107)), ("crossline", (200, 215))):
+            for line_number in range(first, last + 1):
+                expected, mask = full.line(line_number, sort_order=sort_order)
+                traces, appended_mask = appended.line(line_number, sort_order=sort_order)
+                np.testing.assert_array_equal(appended_mask, mask)
+                # merged lines are quantized twice
+                step = (np.nanmax(expected) - np.nanmin(expected)) / (65535 - 1)
+                np.testing.assert_allclose(traces[~mask], expected[~mask], atol=2 * step)
+
+        return path, full
+
+    def test_append_dense(self):
+        self.check("dense")
+
+    def test_append_sparse(self):
+        from rss.client import rssFromFile
+
+        path, full = self.check("sparse")
+        appended = rssFromFile(path)
+        for sort_order in ("inline", "crossline"):
+            np.testing.assert_array_equal(appended.tiles(sort_order), full.tiles(sort_order))
+
+        chunks = [i for i in os.listdir(os.path.join(path, "inline", "seismic"))
+                  if not i.startswith(".")]
+        self.assertEqual(len(chunks), full.tiles("inline").sum())
+
+    def test_append_before_start(self):
+        path = self.ingest("second")
+        with self.assertRaises(RuntimeError):
+            self.append(path, "first")
+
+    def test_server_etag(self):
+        import asyncio
+        from rss.client import rssFromFile
+        from rss.server import rssServer
+
+        path = self.ingest("first")
+        server = rssServer(client=rssFromFile(path), version_interval=0)
+        _, headers, _ = asyncio.run(server.handle("/line/inline/100"))
+        status, _, _ = asyncio.run(server.handle("/line/inline/100", headers["ETag"]))
+        self.assertEqual(status, 304)
+
+        # the appended crosslines come back with a new ETag
+        self.append(path, "second")
+        status, appended_headers, body = asyncio.run(
+            server.handle("/line/inline/100", headers["ETag"])
+        )
+        self.assertEqual(status, 200)
+        self.assertNotEqual(appended_headers["ETag"], headers["ETag"])
+        self.assertEqual(appended_headers["X-Shape"], "20,16")
+        np.testing.assert_array_equal(server.client.bounds, [100, 200, 107, 215])
+
+
+class TestForgeAppend(unittest.TestCase):
+    def test_extend(self):
+        from rss.forge_api import extend_forge_zarr
+        from rss.forge_client import rssFORGEClient
+
+        folder = tempfile.mkdtemp()
+        try:
+            rng = np.random.default_rng(7)
+            data = rng.standard_normal((2, 4, 200)).astype(np.float32)
+            path = os.path.join(folder, "das.zarr")
+            root = make_test_forge(path, data, events=[(10, 0)])
+
+            first = extend_forge_zarr(root, 3, filenames=[f"new_{i}.sgy" for i in range(3)])
+            self.assertEqual(first, 2)
+            self.assertEqual(root["seismic"].shape, (4, 200, 5))
+            self.assertEqual(root["scalers"].shape, (5, 2))
+            self.assertEqual(root["segy_filenames"][4], b"new_2.sgy")
+
+            client = rssFORGEClient(zarr.DirectoryStore(path))
+            np.testing.assert_allclose(client.line(1)[0], data[1], atol=1e-3)
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    unittest.main()
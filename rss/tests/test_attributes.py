@@ -0,0 +1,60 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from scipy.signal import hilbert
+
+from rss.tests.helpers import make_test_rss
+
+
+class TestAttributes(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_envelope(self):
+        from rss.attributes import compute_attribute
+        from rss.client import rssFromFile
+
+        compute_attribute(self.path, "envelope", "envelope", sort_order="inline")
+
+        rss = rssFromFile(self.path)
+        self.assertEqual(rss.attributes("inline"), ["envelope"])
+
+        traces, mask = rss.line(983, sort_order="inline")
+        expected = np.abs(hilbert(np.nan_to_num(traces), axis=0))
+
+        result, result_mask = rss.line(983, sort_order="inline", attribute="envelope")
+        np.testing.assert_array_equal(mask, result_mask)
+        self.assertTrue(np.abs(result - expected).max() < 1e-4 * expected.max())
+
+    def test_halo(self):
+        from rss.attributes import compute_attribute
+        from rss.client import rssFromFile
+
+        compute_attribute(self.path, "smooth", "line_mean", sort_order="crossline",
+                          halo=1, workers=3, lines_per_task=4)
+
+        rss = rssFromFile(self.path)
+        min_crossline, max_crossline = rss.bounds[1], rss.bounds[3]
+
+        lines = [
+            np.nan_to_num(rss.line(xl, sort_order="crossline")[0])
+            for xl in range(min_crossline, max_crossline + 1)
+        ]
+        for k in (0, 60, len(lines) - 1):
+            neighbours = lines[max(k - 1, 0) : k + 2]
+            expected = np.mean(neighbours, axis=0)
+            result, _ = rss.line(min_crossline + k, sort_order="crossline",
+                                 attribute="smooth")
+            dynamic_range = expected.max() - expected.min()
+            self.assertLessEqual(np.abs(result - expected).max(), 1e-4 * dynamic_range)
+
+        with self.assertRaises(RuntimeError):
+            rss.line(983, sort_order="inline", attribute="missing")
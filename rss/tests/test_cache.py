@@ -0,0 +1,281 @@
+from concurrent.futures import ThreadPoolExecutor
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_test_rss
+
+
+class SlowStore(zarr.storage.KVStore):
+    """ A store with remote-like latency that counts reads per key. """
+
+    def __init__(self, store, delay=0.05):
+        super().__init__(store)
+        self.delay = delay
+        self.reads = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            self.reads[key] = self.reads.get(key, 0) + 1
+        time.sleep(self.delay)
+        return super().__getitem__(key)
+
+
+def read_shared(path, cache_name, delay=0.0):
+    """ Read a line in another process through a shared memory cache. """
+    from rss.cache import SharedMemoryCache
+    from rss.client import rssClient
+
+    cache = SharedMemoryCache(cache_name)
+    store = SlowStore(zarr.DirectoryStore(path), delay=delay)
+    traces, _ = rssClient(store, cache=cache).line(983)
+    cache.close()
+    chunk_reads = sum(val for key, val in store.reads.items() if "/seismic/" in key)
+    return float(np.nansum(traces)), chunk_reads
+
+
+class TestCoalescing(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_concurrent_reads(self):
+        from rss.client import rssClient, rssFromFile
+
+        store = SlowStore(zarr.DirectoryStore(self.path))
+        rss = rssClient(store)
+        expected, _ = rssFromFile(self.path).line(983)
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(lambda i: rss.line(983)[0], range(16)))
+
+        for traces in results:
+            np.testing.assert_array_equal(traces, expected)
+
+        # every thread missed the cache, only one went to the store
+        chunk_reads = [val for key, val in store.reads.items()
+                       if key.startswith("inline/seismic/0.")]
+        self.assertEqual(chunk_reads, [1])
+
+
+class TestDecodedCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_lines(self):
+        import asyncio
+        from rss.cache import DecodedCache
+        from rss.client import rssFromFile
+
+        cache = DecodedCache(max_size=2 * 1024 ** 2)
+        rss = rssFromFile(self.path, decoded_cache=cache)
+        expected, _ = rssFromFile(self.path).line(983)
+
+        traces, mask = rss.line(983)
+        np.testing.assert_array_equal(traces, expected)
+        self.assertIs(rss.line(983)[0], traces)
+        self.assertIs(asyncio.run(rss.aline(983))[0], traces)
+        self.assertEqual((cache.hits, cache.misses), (2, 1))
+
+        # shared results can't be changed under other callers
+        with self.assertRaises(ValueError):
+            traces[0, 0] = 0.0
+        self.assertFalse(mask.flags.writeable)
+
+        # the inline is 1.6MB, a crossline (one trace) 13.5KB, 40 of them evict it
+        for crossline in range(rss.bounds[1], rss.bounds[1] + 40):
+            rss.line(crossline, sort_order="crossline")
+        self.assertLessEqual(cache.current_size, cache.max_size)
+        self.assertIsNot(rss.line(983)[0], traces)
+
+        cache.invalidate()
+        self.assertEqual(cache.current_size, 0)
+
+    def test_forge(self):
+        import asyncio
+        from rss.cache import DecodedCache
+        from rss.forge_client import rssFORGEClient
+        from rss.tests.helpers import make_test_forge
+
+        path = f"{self.folder}/das.zarr"
+        make_test_forge(path, np.random.default_rng(0).standard_normal((2, 4, 50)),
+                        events=[(10, 0)])
+        cache = DecodedCache(max_size=1024 ** 2)
+        das = rssFORGEClient(zarr.DirectoryStore(path), decoded_cache=cache)
+
+        self.assertIs(das.line(1)[0], das.line(1)[0])
+        window = asyncio.run(das.awindow(0, channels=slice(1, 3)))[0]
+        self.assertIs(asyncio.run(das.awindow(0, channels=slice(1, 3)))[0], window)
+        np.testing.assert_array_equal(window, das.line(0)[0][1:3])
+        self.assertEqual(cache.hits, 2)
+
+        # arrays of channels are keyed by value
+        window = asyncio.run(das.awindow(0, channels=np.array([3, 1])))[0]
+        self.assertIs(asyncio.run(das.awindow(0, channels=[3, 1]))[0], window)
+        np.testing.assert_array_equal(window, das.line(0)[0][[3, 1]])
+
+
+class TestSharedMemoryCache(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def setUp(self):
+        import os
+        from rss.cache import SharedMemoryCache
+
+        self.name = f"rss-test-{os.getpid()}"
+        self.cache = SharedMemoryCache(self.name, size=4 * 1024 ** 2, slot_size=1024 ** 2,
+                                       ways=2)
+
+    def tearDown(self):
+        self.cache.close()
+        self.cache.unlink()
+
+    def test_processes(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        from rss.client import rssClient
+
+        rss = rssClient(zarr.DirectoryStore(self.path), cache=self.cache)
+        traces, _ = rss.line(983)
+        self.assertGreater(self.cache.current_size, 0)
+
+        # the workers find the chunk the first process fetched
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=2, mp_context=context) as pool:
+            results = list(pool.map(read_shared, [self.path] * 2, [self.name] * 2))
+        for total, chunk_reads in results:
+            self.assertEqual(chunk_reads, 0)
+            self.assertAlmostEqual(total, float(np.nansum(traces)), places=2)
+
+    def test_cold_misses(self):
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+
+        # workers missing the same chunk together fetch it once
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=3, mp_context=context) as pool:
+            results = list(pool.map(read_shared, [self.path] * 3, [self.name] * 3, [0.2] * 3))
+        self.assertEqual(sum(chunk_reads for _, chunk_reads in results), 1)
+        self.assertEqual(len({total for total, _ in results}), 1)
+
+    def test_eviction(self):
+        from rss.cache import SharedMemoryCache
+
+        self.assertEqual((self.cache.num_sets, self.cache.ways), (2, 2))
+        other = SharedMemoryCache(self.name)
+        self.assertFalse(other.created)
+        self.assertEqual(other.slot_size, 1024 ** 2)
+
+        # keys of one set, the least recently used is replaced
+        keys = [k for k in (f"0.{i}" for i in range(100))
+                if self.cache._locate("a", k)[2] == 0][:3]
+        self.cache.put("a", keys[0], b"0" * 10)
+        other.put("a", keys[1], b"1" * 10)
+        self.assertEqual(other.get("a", keys[0]), b"0" * 10)
+        self.cache.put("a", keys[2], b"2" * 10)
+        self.assertTrue(other.contains("a", keys[0]))
+        self.assertFalse(other.contains("a", keys[1]))
+        with self.assertRaises(KeyError):
+            self.cache.get("b", keys[0])
+
+        # too large for a slot
+        self.cache.put("a", "big", bytes(2 * 1024 ** 2))
+        self.assertFalse(self.cache.contains("a", "big"))
+
+        self.cache.invalidate("a", keys[0])
+        self.assertFalse(other.contains("a", keys[0]))
+        self.cache.invalidate("a")
+        self.assertEqual(other.current_size, 0)
+
+        # a chunk another process is fetching isn't evicted
+        with self.assertRaises(KeyError):
+            other.get("a", keys[0])
+        self.cache.put("a", keys[1], b"1" * 10)
+        self.cache.put("a", keys[2], b"2" * 10)
+        self.assertFalse(self.cache.contains("a", keys[1]))
+        other.put("a", keys[0], b"0" * 10)
+        self.assertEqual(self.cache.get("a", keys[0]), b"0" * 10)
+        other.close()
+
+    def test_failed_fetch(self):
+        import time
+        from rss.cache import SharedMemoryCache
+
+        class FailingStore(dict):
+            def __getitem__(self, key):
+                raise OSError("timed out")
+
+        store = self.cache.mount(FailingStore(), name="failing")
+        with self.assertRaises(OSError):
+            store["0.0"]
+
+        # the claim is released, other processes don't wait for it
+        other = SharedMemoryCache(self.name)
+        tic = time.perf_counter()
+        with self.assertRaises(KeyError):
+            other.get("failing", "0.0")
+        self.assertLess(time.perf_counter() - tic, 1.0)
+        other.close()
+
+    def test_peek(self):
+        import asyncio
+        from rss.aio import aget
+        from rss.cache import SharedMemoryCache
+
+        # this process claims the chunk, as if fetching it
+        with self.assertRaises(KeyError):
+            self.cache.get("survey", "0.0")
+
+        other = SharedMemoryCache(self.name)
+        tic = time.perf_counter()
+        with self.assertRaises(KeyError):
+            other.peek("survey", "0.0")
+        self.assertLess(time.perf_counter() - tic, 1.0)
+
+        async def main():
+            # the event loop runs while the other process waits for the chunk
+            store = other.mount({"0.0": b"1" * 10}, name="survey")
+            task = asyncio.ensure_future(aget(store, "0.0"))
+            await asyncio.sleep(0.05)
+            self.assertFalse(task.done())
+            self.cache.put("survey", "0.0", b"0" * 10)
+            return await task
+
+        self.assertEqual(asyncio.run(main()), b"0" * 10)
+        self.assertEqual(other.peek("survey", "0.0"), b"0" * 10)
+        other.close()
+
+    def test_close_mount(self):
+        from rss.cache import SharedMemoryCache
+
+        # closing a mount leaves its chunks to the other processes
+        store = self.cache.mount({"0.0": b"0" * 10}, name="survey")
+        self.assertEqual(store["0.0"], b"0" * 10)
+        store.close()
+        other = SharedMemoryCache(self.name)
+        self.assertEqual(other.get("survey", "0.0"), b"0" * 10)
+        other.close()
@@ -0,0 +1,67 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rss.tests.helpers import make_test_forge, make_test_rss
+
+
+class TestCatalog(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+
+        cls.forge_path = os.path.join(cls.folder, "das.zarr")
+        data = np.random.default_rng(5).standard_normal((3, 4, 500))
+        make_test_forge(cls.forge_path, data.astype(np.float32), events=[(10, 0)])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_shared_budget(self):
+        from rss.catalog import rssCatalog
+        from rss.client import rssFromFile
+
+        # room for about one stored inline, so the surveys evict each other
+        catalog = rssCatalog(cache_size=200 * 1024)
+        first = catalog.open("first", self.path)
+        second = catalog.open("second", self.path)
+        forge = catalog.open("das", self.forge_path, kind="forge")
+        self.assertEqual(len(catalog), 3)
+        self.assertIs(catalog.open("first", self.path), first)
+
+        expected, _ = rssFromFile(self.path).line(983)
+        for client in (first, second, first):
+            traces, _ = client.line(983)
+            np.testing.assert_array_equal(traces, expected)
+            for xl in range(client.bounds[1], client.bounds[3] + 1, 7):
+                client.line(xl, sort_order="crossline")
+        for iset in range(3):
+            forge.line(iset)
+
+        stats = catalog.stats()
+        self.assertLessEqual(stats["current_size"], stats["max_size"])
+        self.assertGreater(stats["hits"], 0)
+
+        catalog.close("first")
+        self.assertNotIn("first", catalog)
+        self.assertNotIn("first", catalog.stats()["surveys"])
+
+    def test_concurrent_open(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        from rss.catalog import rssCatalog
+
+        catalog = rssCatalog()
+        with ThreadPoolExecutor(4) as executor:
+            clients = list(executor.map(lambda i: catalog.open("survey", self.path), range(4)))
+        self.assertTrue(all(client is clients[0] for client in clients))
+        self.assertEqual(len(catalog), 1)
+
+        # a name is one survey
+        with self.assertRaises(RuntimeError):
+            catalog.open("survey", self.path + "-other")
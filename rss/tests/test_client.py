@@ -0,0 +1,338 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_segy, make_test_forge, make_test_rss
+
+
+class TestClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from rss.client import rssFromFile
+
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+        cls.rss = rssFromFile(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_to_dask(self):
+        traces, mask = self.rss.line(983, sort_order="inline")
+
+        volume = self.rss.to_dask(sort_order="inline", dtype=float)
+        self.assertEqual(volume.chunksize, (1501, 120, 1))
+        np.testing.assert_allclose(volume[..., 0].compute(), traces)
+
+        min_crossline = self.rss.bounds[1]
+        volume = self.rss.to_dask(sort_order="crossline")
+        line = self.rss.line(min_crossline + 10, sort_order="crossline")[0]
+        np.testing.assert_allclose(
+            np.nanmax(volume, axis=(0, 1)).compute()[10], np.nanmax(line), rtol=1e-5
+        )
+
+
+    def test_lines(self):
+        line_numbers = [623, 504, 505, 623]
+        traces, mask = self.rss.lines(line_numbers, sort_order="crossline", dtype=float)
+        self.assertEqual(traces.shape, (1501, 1, 4))
+        for i, line_number in enumerate(line_numbers):
+            expected, expected_mask = self.rss.line(line_number, sort_order="crossline")
+            np.testing.assert_array_equal(mask[..., i], expected_mask)
+            np.testing.assert_array_equal(traces[..., i], expected)
+
+        traces, mask = self.rss.lines([], sort_order="crossline")
+        self.assertEqual(traces.shape[-1], 0)
+
+    def test_extract_horizon(self):
+        line, _ = self.rss.line(983)
+        ns, num_crosslines = line.shape
+        horizon = np.linspace(300.25, ns - 2, num_crosslines)[None, :]
+        horizon[0, 5] = np.nan
+        horizon[0, 6] = ns + 10
+
+        values = self.rss.extract_horizon(horizon, reducer="mean")
+        self.assertEqual(values.shape, (1, num_crosslines))
+        expected = [np.interp(t, np.arange(ns), trace) for t, trace in zip(horizon[0], line.T)]
+        np.testing.assert_allclose(values[0, 7:], expected[7:], rtol=1e-4, atol=1e-6)
+        self.assertTrue(np.isnan(values[0, 5:7]).all())
+
+        rms = self.rss.extract_horizon(horizon, window=(2, 1), reducer="rms",
+                                       sort_order="crossline")
+        window = np.add.outer(horizon[0, 0], np.arange(-2, 2))
+        trace = self.rss.line(self.rss.bounds[1], sort_order="crossline")[0][:, 0]
+        samples = np.interp(window, np.arange(ns), trace)
+        np.testing.assert_allclose(rms[0, 0], np.sqrt(np.mean(samples ** 2)), rtol=1e-4)
+
+        # a window straddling the end of the trace
+        straddling = horizon.copy()
+        straddling[0, 10] = ns - 2
+        values = self.rss.extract_horizon(straddling, window=(0, 3), reducer="mean")
+        self.assertTrue(np.isnan(values[0, 10]))
+        self.assertTrue(np.isfinite(values[0, 11]))
+
+        peak = self.rss.extract_horizon(horizon, window=3, reducer=lambda x: np.nanmax(x, axis=-1))
+        np.testing.assert_allclose(peak, self.rss.extract_horizon(horizon, window=3, reducer="max"))
+
+        with self.assertRaises(RuntimeError):
+            self.rss.extract_horizon(horizon, reducer="median")
+        with self.assertRaises(RuntimeError):
+            self.rss.extract_horizon(horizon.T)
+
+    def test_extract_polygon(self):
+        from rss.client import rssFromFile
+
+        # a thin quad along the line around traces 90 to 118, the last hold signal
+        xy = self.rss.xy
+        along = (xy[-1] - xy[0]) / np.linalg.norm(xy[-1] - xy[0])
+        normal = 20 * np.array([-along[1], along[0]])
+        start, end = (xy[89] + xy[90]) / 2, (xy[118] + xy[119]) / 2
+        polygon = np.array([start - normal, end - normal, end + normal, start + normal])
+        crosslines = np.sort(self.rss.ilxl[90:119, 1])
+
+        blocks = list(self.rss.extract_polygon(polygon))
+        self.assertEqual(len(blocks), 1)
+        line_number, orth_lines, traces = blocks[0]
+        self.assertEqual(line_number, 983)
+        np.testing.assert_array_equal(orth_lines, crosslines)
+        line, _ = self.rss.line(983)
+        # float32 against float64 dequantization
+        atol = 1e-6 * np.ptp(line)
+        np.testing.assert_allclose(traces, line[:, orth_lines - self.rss.bounds[1]], atol=atol)
+
+        clipped = list(self.rss.extract_polygon(polygon, t_range=(100, 199),
+                                                sort_order="crossline", prefetch=2))
+        self.assertEqual([b[0] for b in clipped], list(crosslines))
+        expected = self.rss.line(crosslines[-3], sort_order="crossline")[0][100:200]
+        np.testing.assert_allclose(clipped[-3][2], expected, atol=atol)
+
+        path = os.path.join(self.folder, "clipped")
+        self.rss.extract_polygon(polygon, t_range=(500, 1499), output=path)
+        out = rssFromFile(path)
+        np.testing.assert_array_equal(out.bounds, [983, crosslines[0], 983, crosslines[-1]])
+        self.assertEqual(out.root.attrs["binary_header"]["ns"], 1000)
+        self.assertEqual(out.root.attrs["binary_header"]["num_traces"], len(crosslines))
+        self.assertEqual(len(out.xy), len(crosslines))
+        out_line, mask = out.line(983)
+        self.assertFalse(mask.any())
+        expected = line[500:1500, orth_lines - self.rss.bounds[1]]
+        np.testing.assert_allclose(out_line, expected, atol=1e-4 * np.ptp(expected))
+
+        with self.assertRaises(RuntimeError):
+            self.rss.extract_polygon(polygon, t_range=(0, 1501))
+        with self.assertRaises(RuntimeError):
+            self.rss.extract_polygon(polygon + 1e6)
+
+    def test_live_bitmap(self):
+        from rss.api import pack_live
+        from rss.client import unpack_live
+
+        inlines = np.array([10, 10, 11, 13, 13, 13])
+        crosslines = np.array([5, 6, 14, 5, 9, 20])
+        live = unpack_live(pack_live(inlines, crosslines), 16)
+        self.assertEqual(live.shape, (4, 16))
+        self.assertEqual(live.sum(), 6)
+        self.assertTrue(live[3, 15] and live[1, 9] and not live[2, 0])
+
+    def test_footprint(self):
+        min_inline, min_crossline, max_inline, max_crossline = self.rss.bounds
+        live = self.rss.footprint()
+        self.assertEqual(live.shape, (1, max_crossline - min_crossline + 1))
+        self.assertTrue(live.all())
+
+        self.assertTrue(self.rss.is_live(983, min_crossline))
+        np.testing.assert_array_equal(
+            self.rss.is_live([983, 983, 984], [min_crossline, max_crossline + 1, 2000]),
+            [True, False, False],
+        )
+
+        # a single inline is all edge
+        self.assertEqual(len(self.rss.outline()), live.size)
+
+    def test_traces(self):
+        from rss.client import rssFromFile
+
+        rss = rssFromFile(self.path)
+        min_crossline = rss.bounds[1]
+        line, _ = rss.line(983)
+
+        # pretend one trace is dead
+        rss.footprint()[0, 7] = False
+
+        ilxl = [(983, min_crossline + 9), (983, min_crossline + 7),
+                (990, min_crossline), (983, min_crossline + 2)]
+        traces, mask = rss.traces(ilxl)
+        np.testing.assert_array_equal(mask, [False, True, True, False])
+        np.testing.assert_array_equal(traces[:, 0], line[:, 9])
+        np.testing.assert_array_equal(traces[:, 3], line[:, 2])
+        self.assertTrue(np.isnan(traces[:, 1]).all())
+
+        trace, trace_mask = rss.trace(983, min_crossline + 7)
+        self.assertTrue(trace_mask.all())
+
+
+class TestSparseLayout(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from rss.api import parse_binary_header
+        from rss.client import rssFromFile
+
+        # a dogleg, a band of 8 crosslines drifting across 40
+        inlines, crosslines = np.meshgrid(np.arange(100, 112), np.arange(200, 240), indexing="ij")
+        live = np.abs(crosslines - 200 - 3 * (inlines - 100)) < 4
+        inlines, crosslines = inlines[live], crosslines[live]
+        rng = np.random.default_rng(3)
+        traces = rng.standard_normal((len(inlines), 30)).astype(np.float32)
+
+        cls.folder = tempfile.mkdtemp()
+        rss = {}
+        for layout in ("dense", "sparse"):
+            folder = os.path.join(cls.folder, layout)
+            os.makedirs(folder)
+            segy_file = os.path.join(folder, "dogleg.sgy")
+            make_segy(segy_file, traces, inlines=inlines, crosslines=crosslines)
+            path = make_test_rss(folder, segy_file, parse_binary_header(segy_file),
+                                 layout=layout, tile_size=4)
+            rss[layout] = (path, rssFromFile(path))
+        (cls.dense_path, cls.dense), (cls.sparse_path, cls.sparse) = rss["dense"], rss["sparse"]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_line(self):
+        self.assertIsNone(self.dense.tiles("inline"))
+        self.assertEqual(self.sparse.tiles("crossline").shape, (37, 3))
+
+        for sort_order in ("inline", "crossline"):
+            min_line = self.dense.bounds[0 if sort_order == "inline" else 1]
+            max_line = self.dense.bounds[2 if sort_order == "inline" else 3]
+            for line_number in range(min_line, max_line + 1):
+                expected, mask = self.dense.line(line_number, sort_order=sort_order)
+                traces, sparse_mask = self.sparse.line(line_number, sort_order=sort_order)
+                np.testing.assert_array_equal(sparse_mask, mask)
+                np.testing.assert_array_equal(traces, expected)
+
+        for sort_order in ("inline", "crossline"):
+            line_numbers = list(self.dense.bounds[[2, 0] if sort_order == "inline" else [3, 1]])
+            line_numbers.append(line_numbers[1] + 5)
+            expected = self.dense.lines(line_numbers, sort_order=sort_order, mask_val=None)
+            traces = self.sparse.lines(line_numbers, sort_order=sort_order, mask_val=None)
+            np.testing.assert_array_equal(traces[1], expected[1])
+            np.testing.assert_array_equal(traces[0], expected[0])
+
+        traces, mask = asyncio.run(self.sparse.aline(105, sort_order="inline"))
+        np.testing.assert_array_equal(traces, self.dense.line(105, sort_order="inline")[0])
+
+    def test_storage(self):
+        def chunks(path):
+            folder = os.path.join(path, "inline", "seismic")
+            return [i for i in os.listdir(folder) if not i.startswith(".")]
+
+        tiles = zarr.open(self.sparse_path, mode="r")["inline"]["tiles"][:]
+        self.assertEqual(len(chunks(self.sparse_path)), tiles.sum())
+        self.assertLess(tiles.sum(), tiles.size / 2)
+
+        # one chunk per inline, against tiles of 4 of the 37 crosslines
+        self.assertEqual(len(chunks(self.dense_path)), 12)
+
+
+class TestForgeClient(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        rng = np.random.default_rng(7)
+        self.data = rng.standard_normal((2, 4, 200)).astype(np.float32)
+        self.path = os.path.join(self.folder, "das.zarr")
+        make_test_forge(self.path, self.data, events=[(10, 0)])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_to_dask(self):
+        from rss.forge_client import rssFORGEClient
+
+        client = rssFORGEClient(zarr.DirectoryStore(self.path))
+        volume = client.to_dask()
+        self.assertEqual(volume.shape, (4, 200, 2))
+
+        computed = volume.compute()
+        for iline in range(2):
+            np.testing.assert_allclose(
+                computed[..., iline], client.line(iline)[0], rtol=1e-5, atol=1e-5
+            )
+            np.testing.assert_allclose(
+                computed[..., iline], self.data[iline], atol=1e-3
+            )
+
+    def test_lines(self):
+        from rss.forge_client import rssFORGEClient
+
+        client = rssFORGEClient(zarr.DirectoryStore(self.path))
+        traces, mask = client.lines([1, 0, 1], workers=2)
+        self.assertEqual(traces.shape, (4, 200, 3))
+        self.assertFalse(mask.any())
+        for i, iline in enumerate([1, 0, 1]):
+            np.testing.assert_allclose(traces[..., i], client.line(iline)[0], atol=1e-5)
+
+        with self.assertRaises(RuntimeError):
+            client.lines([2])
+
+    def test_query(self):
+        from rss.api import consolidate, staged_headers, write_headers
+        from rss.forge_api import header_fields
+        from rss.forge_client import rssFORGEClient
+
+        # staged headers of a recording, measured depths in bytes 237-240
+        headers = np.zeros((4, 240), dtype=np.uint8)
+        headers[:, 236:240] = np.array([0, 1500, 3000, 4500], dtype=">i4").view(np.uint8).reshape(4, 4)
+        headers.tofile(os.path.join(self.folder, staged_headers))
+        root = zarr.open(self.path, mode="r+")
+        write_headers(root, self.folder, fields=header_fields)
+        consolidate(root)
+
+        client = rssFORGEClient(zarr.DirectoryStore(self.path))
+        np.testing.assert_array_equal(client.query({"RECMD": (1000, 4000)}), [1, 2])
+
+    def test_stream(self):
+        from datetime import datetime, timezone
+        from rss.api import consolidate
+        from rss.forge_api import write_time_index
+        from rss.forge_client import rssFORGEClient
+
+        # three 2 second recordings starting 2, 0 and 6 seconds in, a gap at 4-6
+        rng = np.random.default_rng(3)
+        path = os.path.join(self.folder, "stream.zarr")
+        root = make_test_forge(path, rng.standard_normal((3, 4, 4000)).astype(np.float32),
+                               events=[(10, 0)])
+        root["segy_filenames"][:] = [f"FORGE_78-32_iDASv3-P11_UTC1904280701{s:02d}.sgy"
+                                     for s in (2, 0, 6)]
+        write_time_index(root)
+        consolidate(root)
+
+        client = rssFORGEClient(zarr.DirectoryStore(path))
+        t0 = datetime(2019, 4, 28, 7, 1, 0)
+        start = t0.replace(tzinfo=timezone.utc).timestamp()
+        np.testing.assert_array_equal(client.time_index[:, 1], [1, 0, 2])
+
+        traces, times = client.stream(start + 1.5, start + 6.5,
+                                      channels=slice(1, 3), workers=2)
+        self.assertEqual(traces.shape, (2, 10000))
+        self.assertAlmostEqual(times[0], start + 1.5)
+        lines = [client.line(i)[0][1:3] for i in range(3)]
+        np.testing.assert_allclose(traces[:, :1000], lines[1][:, 3000:], atol=1e-5)
+        np.testing.assert_allclose(traces[:, 1000:5000], lines[0], atol=1e-5)
+        self.assertTrue(np.isnan(traces[:, 5000:9000]).all())
+        np.testing.assert_allclose(traces[:, 9000:], lines[2][:, :1000], atol=1e-5)
+
+        # naive datetimes are UTC
+        traces, _ = client.stream(t0, datetime(2019, 4, 28, 7, 1, 1), channels=[0, 3])
+        np.testing.assert_allclose(traces, client.line(1)[0][[0, 3], :2000], atol=1e-5)
+
+        with self.assertRaises(RuntimeError):
+            client.stream(t0, t0)
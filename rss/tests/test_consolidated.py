@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_test_forge, make_test_rss
+
+
+class CountingStore(zarr.storage.KVStore):
+    """ Records every key read, one per request on a remote store. """
+
+    def __init__(self, store):
+        super().__init__(store)
+        self.gets = []
+        self.sets = []
+
+    def __getitem__(self, key):
+        self.gets.append(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self.sets.append(key)
+        super().__setitem__(key, value)
+
+
+def unconsolidated_copy(path):
+    copy = path + "_unconsolidated"
+    shutil.copytree(path, copy)
+    os.remove(os.path.join(copy, ".zmetadata"))
+    os.remove(os.path.join(copy, "meta.npz"))
+    return copy
+
+
+class TestConsolidated(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+
+        rng = np.random.default_rng(0)
+        cls.forge_path = os.path.join(cls.folder, "forge")
+        make_test_forge(cls.forge_path, rng.normal(size=(3, 8, 50)).astype(np.float32),
+                        events=[(10, 0)])
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_rss_open(self):
+        from rss.client import rssClient
+
+        store = CountingStore(zarr.DirectoryStore(self.path))
+        rss = rssClient(store)
+        self.assertEqual(store.gets, ["meta.npz", ".zmetadata"])
+
+        rss.footprint()
+        rss.line(rss.bounds[1], sort_order="crossline")
+        self.assertFalse([i for i in store.gets[2:] if os.path.basename(i).startswith(".z")])
+
+        slow_store = CountingStore(zarr.DirectoryStore(unconsolidated_copy(self.path)))
+        slow = rssClient(slow_store)
+        self.assertGreater(len(slow_store.gets), 10)
+
+        np.testing.assert_array_equal(rss.bounds, slow.bounds)
+        np.testing.assert_array_equal(rss.xy, slow.xy)
+        np.testing.assert_array_equal(rss.footprint(), slow.footprint())
+        for sort_order, line_number in (("inline", rss.bounds[2]), ("crossline", rss.bounds[1])):
+            expected, expected_mask = slow.line(line_number, sort_order=sort_order)
+            traces, mask = rss.line(line_number, sort_order=sort_order)
+            np.testing.assert_array_equal(mask, expected_mask)
+            np.testing.assert_array_equal(traces[~mask], expected[~mask])
+
+    def test_write_order(self):
+        from rss.api import consolidate
+
+        # readers take the blob first, the shapes it indexes must be there already
+        store = CountingStore(zarr.DirectoryStore(self.path))
+        consolidate(zarr.open_group(store, mode="r+"))
+        self.assertEqual(store.sets, [".zmetadata", "meta.npz"])
+
+    def test_forge_open(self):
+        from rss.forge_client import rssFORGEClient
+
+        store = CountingStore(zarr.DirectoryStore(self.forge_path))
+        das = rssFORGEClient(store)
+        self.assertEqual(store.gets, ["meta.npz", ".zmetadata"])
+
+        slow = rssFORGEClient(zarr.DirectoryStore(unconsolidated_copy(self.forge_path)))
+        np.testing.assert_array_equal(das.depth, slow.depth)
+        np.testing.assert_array_equal(das.time_seconds, slow.time_seconds)
+        np.testing.assert_array_equal(das.segy_filenames, slow.segy_filenames)
+        np.testing.assert_array_equal(das.sample_events, slow.sample_events)
+        np.testing.assert_array_equal(das.line(1), slow.line(1))
+
+
+if __name__ == "__main__":
+    unittest.main()
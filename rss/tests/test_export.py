@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rss.tests.helpers import make_segy, make_test_rss
+
+
+class TestExport(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from rss.client import rssFromFile
+
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+        cls.rss = rssFromFile(cls.path)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def roundtrip(self, name, **kwargs):
+        from rss.api import parse_binary_header
+        from rss.client import rssFromFile
+        from rss.export import export_segy
+
+        folder = tempfile.mkdtemp(dir=self.folder)
+        segy_file = os.path.join(folder, f"{name}.segy")
+        num_traces = export_segy(self.path, segy_file, **kwargs)
+
+        binary_header = parse_binary_header(segy_file)
+        self.assertEqual(binary_header["num_traces"], num_traces)
+        self.assertEqual(binary_header["ns"], 1501)
+        self.assertEqual(binary_header["sample_rate_ms"], 1.0)
+
+        return binary_header, rssFromFile(make_test_rss(folder, segy_file, binary_header))
+
+    def assert_same(self, other):
+        np.testing.assert_array_equal(other.bounds, self.rss.bounds)
+        np.testing.assert_array_equal(other.footprint(), self.rss.footprint())
+
+        for line_number in range(self.rss.bounds[0], self.rss.bounds[2] + 1):
+            expected, mask = self.rss.line(line_number, sort_order="inline")
+            traces, other_mask = other.line(line_number, sort_order="inline")
+            np.testing.assert_array_equal(other_mask, mask)
+            # one quantization step, the traces are quantized twice
+            step = (np.nanmax(expected) - np.nanmin(expected)) / (65535 - 1)
+            np.testing.assert_allclose(traces[~mask], expected[~mask], atol=2 * step)
+
+        np.testing.assert_allclose(
+            np.sort(other.xy, axis=0), np.sort(self.rss.xy, axis=0)
+        )
+
+    def test_export_ieee(self):
+        binary_header, other = self.roundtrip("ieee", lines_per_batch=1)
+        self.assertEqual(binary_header["float_format"], 5)
+        self.assert_same(other)
+
+    def test_export_ibm_parallel(self):
+        binary_header, other = self.roundtrip(
+            "ibm", binary_format=1, sort_order="crossline", parallel_write=True,
+            workers=4, lines_per_batch=3,
+        )
+        self.assertEqual(binary_header["float_format"], 1)
+        self.assert_same(other)
+
+    def test_export_integer_format(self):
+        from rss.api import parse_binary_header
+        from rss.client import rssFromFile
+        from rss.export import export_segy
+
+        folder = tempfile.mkdtemp(dir=self.folder)
+        traces = np.random.default_rng(2).integers(-3000, 3000, (12, 50)).astype(np.float32)
+        segy_file = os.path.join(folder, "int16.segy")
+        make_segy(segy_file, traces, binary_format=3)
+        path = make_test_rss(folder, segy_file, parse_binary_header(segy_file))
+
+        out_file = os.path.join(folder, "exported.segy")
+        self.assertEqual(export_segy(path, out_file), 12)
+        binary_header = parse_binary_header(out_file)
+        self.assertEqual(binary_header["float_format"], 5)
+
+        exported = rssFromFile(make_test_rss(tempfile.mkdtemp(dir=self.folder), out_file,
+                                             binary_header))
+        step = np.ptp(traces) / (65535 - 1)
+        for i, inline in enumerate(range(100, 103)):
+            line, _ = exported.line(inline)
+            np.testing.assert_allclose(line, traces[4 * i : 4 * i + 4].T, atol=3 * step)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import functools
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_test_forge
+
+
+class TestForgeDetect(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        rng = np.random.default_rng(42)
+
+        self.nt = 80
+        self.wavelet = rng.standard_normal((12, self.nt)).astype(np.float32)
+
+        data = rng.standard_normal((3, 12, 3000)).astype(np.float32)
+        data[0, :, 1000 : 1000 + self.nt] += 4 * self.wavelet
+        data[2, :, 2200 : 2200 + self.nt] += 4 * self.wavelet
+        self.data = data
+
+        self.path = os.path.join(self.folder, "das.zarr")
+        make_test_forge(self.path, data, events=[(1000 + 20, 0)])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_correlate_matches_direct(self):
+        from rss.forge_detect import TemplateBank
+
+        bank = TemplateBank(self.wavelet, batch_size=5)
+        stack = bank.correlate(self.data[2])
+
+        template = self.wavelet - self.wavelet.mean(axis=-1, keepdims=True)
+        template /= np.linalg.norm(template, axis=-1, keepdims=True)
+        windows = np.lib.stride_tricks.sliding_window_view(
+            self.data[2], self.nt, axis=-1
+        )
+        windows = windows - windows.mean(axis=-1, keepdims=True)
+        direct = np.einsum("cki,ci->ck", windows, template)
+        direct /= np.linalg.norm(windows, axis=-1)
+
+        np.testing.assert_allclose(stack[0], direct.mean(axis=0), atol=1e-5)
+        self.assertEqual(stack[0].argmax(), 2200)
+
+    def test_detect_catalog(self):
+        from rss.forge_client import rssFORGEClient
+        from rss.forge_detect import (TemplateBank, detect, extract_templates,
+                                      read_catalog, write_catalog)
+
+        client = rssFORGEClient(zarr.DirectoryStore(self.path))
+        templates, events = extract_templates(client, pre=20, post=60)
+        np.testing.assert_array_equal(events, [(1020, 0)])
+
+        bank = TemplateBank(templates, events=events, pre=20)
+        factory = functools.partial(rssFORGEClient, zarr.DirectoryStore(self.path))
+        catalog, stats = detect(factory, bank, range(3), workers=2,
+                                lines_per_task=1)
+
+        self.assertGreater(stats["correlations_per_second"], 0)
+        found = {(row["iset"], row["it"]) for row in catalog}
+        self.assertIn((0, 1020), found)
+        self.assertIn((2, 2220), found)
+
+        output_file = os.path.join(self.folder, "detections.txt")
+        write_catalog(catalog, output_file, segy_filenames=client.segy_filenames)
+        np.testing.assert_array_equal(read_catalog(output_file)["it"],
+                                      np.sort(catalog, order=["iset", "it"])["it"])
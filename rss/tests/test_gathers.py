@@ -0,0 +1,102 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_segy, make_test_rss
+
+
+class TestGathers(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from rss.api import parse_binary_header
+        from rss.client import rssFromFile
+
+        cls.offsets = np.array([100, 200, 300, 400])
+        inlines, crosslines, offsets = np.meshgrid(
+            np.arange(10, 15), np.arange(20, 25), cls.offsets, indexing="ij"
+        )
+        keep = np.ones(inlines.shape, dtype=bool)
+        keep[1, 2, 3] = False  # a missing offset
+        keep[3, 4, :] = False  # a missing gather
+        cls.keep = keep
+        inlines, crosslines, offsets = inlines[keep], crosslines[keep], offsets[keep]
+
+        rng = np.random.default_rng(7)
+        cls.traces = rng.standard_normal((len(inlines), 32)).astype(np.float32)
+
+        cls.folder = tempfile.mkdtemp()
+        cls.segy_file = segy_file = os.path.join(cls.folder, "gathers.sgy")
+        make_segy(segy_file, cls.traces, inlines=inlines, crosslines=crosslines)
+
+        # offsets in bytes 37-40 of every trace header
+        trace_size = 240 + 4 * 32
+        segy = np.memmap(segy_file, dtype=np.uint8, mode="r+", offset=3600).reshape(-1, trace_size)
+        segy[:, 36:40] = offsets.astype(">i4").view(np.uint8).reshape(-1, 4)
+        segy.flush()
+        del segy
+
+        cls.path = make_test_rss(cls.folder, segy_file, parse_binary_header(segy_file),
+                                 sort_orders=("gather",))
+        cls.rss = rssFromFile(cls.path)
+
+        cls.cube = np.full(keep.shape + (32,), np.nan, dtype=np.float32)
+        cls.cube[keep] = cls.traces
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_layout(self):
+        seismic = zarr.open(self.path, mode="r")["gather/seismic"]
+        self.assertEqual(seismic.shape, (32, 4, 5, 5))
+        self.assertEqual(seismic.chunks, (32, 4, 2, 2))
+        np.testing.assert_array_equal(self.rss.offsets, self.offsets)
+
+    def test_gather(self):
+        traces, mask = self.rss.gather(11, 22)
+        self.assertEqual(traces.shape, (32, 4))
+        np.testing.assert_array_equal(mask[0], [False, False, False, True])
+        np.testing.assert_allclose(traces[:, :3], self.cube[1, 2, :3].T, atol=1e-4)
+
+        traces, mask = self.rss.gather(13, 24)
+        self.assertTrue(mask.all())
+
+        traces, mask = self.rss.gathers((10, 12), (20, 21))
+        self.assertEqual(traces.shape, (32, 4, 3, 2))
+        np.testing.assert_allclose(
+            traces, self.cube[:3, :2].transpose(3, 2, 0, 1), atol=1e-4
+        )
+
+        with self.assertRaises(RuntimeError):
+            self.rss.gather(15, 20)
+        with self.assertRaises(RuntimeError):
+            self.rss.line(10)
+
+    def test_offset_plane(self):
+        traces, mask = self.rss.offset_plane(400)
+        self.assertEqual(traces.shape, (32, 5, 5))
+        np.testing.assert_array_equal(mask[0], ~self.keep[..., 3])
+        np.testing.assert_allclose(traces, self.cube[..., 3, :].transpose(2, 0, 1), atol=1e-4)
+
+        traces, _ = self.rss.offset_plane(100, inlines=(12, 13), crosslines=(20, 20))
+        np.testing.assert_allclose(traces[:, :, 0], self.cube[2:4, 0, 0].T, atol=1e-4)
+
+        with self.assertRaises(RuntimeError):
+            self.rss.offset_plane(150)
+
+    def test_duplicate_offsets(self):
+        from rss.api import parse_binary_header
+
+        # 200 and 300 fall in the bins of 100 and 400
+        folder = tempfile.mkdtemp(dir=self.folder)
+        with self.assertRaises(RuntimeError):
+            make_test_rss(folder, self.segy_file, parse_binary_header(self.segy_file),
+                          sort_orders=("gather",), offsets=[100, 400])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rss.tests.helpers import make_segy, make_test_rss
+
+
+class TestTraceHeaders(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from rss.api import parse_binary_header
+        from rss.client import rssFromFile
+
+        inlines, crosslines = np.meshgrid(np.arange(10, 16), np.arange(20, 30), indexing="ij")
+        inlines, crosslines = inlines.ravel(), crosslines.ravel()
+        rng = np.random.default_rng(11)
+        traces = rng.standard_normal((len(inlines), 16)).astype(np.float32)
+        cls.offsets = rng.integers(0, 3000, len(inlines))
+
+        cls.folder = tempfile.mkdtemp()
+        segy_file = os.path.join(cls.folder, "offsets.sgy")
+        make_segy(segy_file, traces, inlines=inlines, crosslines=crosslines, byteorder="<")
+
+        # offsets in bytes 37-40 of every trace header
+        trace_size = 240 + 4 * 16
+        segy = np.memmap(segy_file, dtype=np.uint8, mode="r+", offset=3600).reshape(-1, trace_size)
+        segy[:, 36:40] = cls.offsets.astype("<i4").view(np.uint8).reshape(-1, 4)
+        segy.flush()
+        del segy
+
+        cls.rss = rssFromFile(make_test_rss(cls.folder, segy_file, parse_binary_header(segy_file)))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_columns(self):
+        from rss.segy import trace_header_fields
+
+        headers = self.rss.trace_headers()
+        self.assertEqual(set(headers), set(trace_header_fields))
+        np.testing.assert_array_equal(headers["offset"], self.offsets)
+        np.testing.assert_array_equal(headers["inline"], self.rss.ilxl[:, 0])
+        np.testing.assert_array_equal(headers["scalco"], 1)
+
+        headers = self.rss.trace_headers(["offset"], index=[5, 0])
+        np.testing.assert_array_equal(headers["offset"], self.offsets[[5, 0]])
+
+    def test_query(self):
+        near = (self.offsets <= 1000) & (self.rss.ilxl[:, 0] == 12)
+        np.testing.assert_array_equal(
+            self.rss.query({"offset": (0, 1000), "inline": 12}), self.rss.ilxl[near]
+        )
+        np.testing.assert_array_equal(
+            self.rss.query({"offset": lambda x: x <= 1000, "inline": [12]}, output="index"),
+            np.nonzero(near)[0],
+        )
+        self.assertEqual(len(self.rss.query({"inline": 99})), 0)
+
+        with self.assertRaises(RuntimeError):
+            self.rss.query({"not_a_header": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,25 @@
+import subprocess
+import sys
+import unittest
+
+heavy_modules = ["IPython", "scipy", "s3fs", "fsspec", "matplotlib", "tqdm", "ebcdic", "ibm2ieee"]
+
+
+def loaded_modules(module):
+    """ The top level packages loaded by importing module in a fresh interpreter. """
+    code = f"import sys, {module}; print(' '.join(sys.modules))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    return {i.split(".")[0] for i in out.split()}
+
+
+class TestImports(unittest.TestCase):
+    def test_read_path_is_light(self):
+        for module in ("rss.client", "rss.api", "rss.forge_client", "rss.catalog", "rss.aio"):
+            with self.subTest(module=module):
+                self.assertFalse(loaded_modules(module) & set(heavy_modules))
+
+
+if __name__ == "__main__":
+    unittest.main()
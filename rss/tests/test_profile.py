@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from rss.profile import StackSampler, StageProfiler, stage
+from rss.tests.helpers import psdn_data, psdn_meta
+
+
+class TestStageProfiler(unittest.TestCase):
+    def test_nested_stages(self):
+        profiler = StageProfiler()
+        with profiler:
+            with profiler.stage("outer", bytes_in=10) as outer:
+                time.sleep(0.02)
+                with profiler.stage("inner", bytes_out=5):
+                    time.sleep(0.05)
+                outer.bytes_out = 20
+
+        profile = profiler.as_dict()
+        outer, inner = profile["stages"]["outer"], profile["stages"]["inner"]
+        # the outer stage excludes the time of the inner one
+        self.assertLess(outer["seconds"], inner["seconds"])
+        self.assertEqual((outer["bytes_in"], outer["bytes_out"]), (10, 20))
+        self.assertEqual((inner["bytes_in"], inner["bytes_out"]), (0, 5))
+        self.assertEqual(profile["slowest_stages"], ["inner", "outer"])
+        self.assertGreaterEqual(
+            profile["wall_seconds"], outer["seconds"] + inner["seconds"]
+        )
+
+    def test_no_profiler(self):
+        with stage(None, "read", bytes_in=1) as record:
+            record.bytes_out = 2
+
+    def test_sampler(self):
+        profiler = StageProfiler(StackSampler(interval=0.001))
+        with profiler:
+            end = time.perf_counter() + 0.1
+            while time.perf_counter() < end:
+                pass
+        self.assertTrue(profiler.as_dict()["samples"]["top"])
+        self.assertIn("hottest functions", profiler.summary())
+
+
+class TestProfiledIngest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.folder)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.folder)
+
+    def test_ingest_stages(self):
+        import zarr
+
+        from rss.api import compressed_zarr, read_trace_data
+
+        profiler = StageProfiler()
+        with profiler:
+            read_trace_data(psdn_data, psdn_meta, profiler=profiler)
+            compressed_zarr(psdn_data, profiler=profiler)
+
+        stages = profiler.as_dict()["stages"]
+        for name in ("read", "decode", "headers", "stage", "quantize", "compress", "write"):
+            self.assertIn(name, stages)
+        num_traces, ns = psdn_meta["num_traces"], psdn_meta["ns"]
+        self.assertEqual(stages["decode"]["bytes_out"], 4 * num_traces * ns)
+        self.assertEqual(stages["headers"]["calls"], num_traces)
+        self.assertGreater(stages["write"]["bytes_in"], 0)
+
+        profiler.to_json("profile.json")
+        with open("profile.json") as fp:
+            self.assertEqual(json.load(fp)["slowest_stages"], profiler.as_dict()["slowest_stages"])
+
+        # profiling leaves the store as is
+        seismic = zarr.open("psdn_test_data", mode="r")["inline"]["seismic"][:]
+        self.assertEqual(np.count_nonzero(seismic.any(axis=0)), num_traces)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_test_forge, make_test_rss
+
+
+class TestPatchSampler(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from rss.client import rssFromFile
+
+        cls.folder = tempfile.mkdtemp()
+        cls.path = make_test_rss(cls.folder)
+        cls.rss = rssFromFile(cls.path)
+
+        rng = np.random.default_rng(5)
+        cls.forge_path = os.path.join(cls.folder, "forge")
+        cls.events = np.array([(100, 2), (40, 5)])
+        make_test_forge(cls.forge_path, rng.normal(size=(6, 8, 300)).astype(np.float32),
+                        events=cls.events)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def assert_patches(self, patches, origins, volume):
+        a, b, c = patches.shape[1:]
+        for patch, (a0, b0, c0) in zip(patches, origins):
+            np.testing.assert_array_equal(patch, volume[a0 : a0 + a, b0 : b0 + b, c0 : c0 + c])
+
+    def test_rss(self):
+        from rss.sampler import PatchSampler
+
+        sampler = PatchSampler(self.path, (64, 1, 2), sort_order="crossline",
+                               patches_per_block=4)
+        patches, origins = sampler.sample(10, np.random.default_rng(0))
+        self.assertEqual(patches.shape, (10, 64, 1, 2))
+        # one block of lines per 4 patches
+        self.assertEqual(sampler.blocks, 3)
+
+        lines = range(self.rss.bounds[1], self.rss.bounds[3] + 1)
+        volume, _ = self.rss.lines(lines, sort_order="crossline", mask_val=0.0)
+        self.assert_patches(patches, origins, volume)
+
+        with self.assertRaises(RuntimeError):
+            PatchSampler(self.path, (64, 16, 2), sort_order="inline").sample(1)
+
+    def test_forge_events(self):
+        from rss.forge_client import rssFORGEClient
+        from rss.sampler import PatchSampler
+
+        sampler = PatchSampler(self.forge_path, (4, 50, 1), kind="forge",
+                               event_fraction=1.0, event_jitter=5, patches_per_block=2)
+        patches, origins = sampler.sample(16, np.random.default_rng(1))
+
+        events = {iset: it for it, iset in self.events}
+        for a0, b0, iset in origins:
+            self.assertIn(iset, events)
+            self.assertLessEqual(abs(b0 + 25 - events[iset]), 5)
+
+        das = rssFORGEClient(zarr.DirectoryStore(self.forge_path))
+        volume, _ = das.lines(range(6))
+        self.assert_patches(patches, origins, volume)
+
+    def test_loader(self):
+        from rss.sampler import PatchLoader, PatchSampler
+
+        sampler = PatchSampler(self.path, (32, 8, 1), sort_order="inline")
+        with PatchLoader(sampler, batch_size=8, workers=2, seed=3) as loader:
+            batches = [next(loader) for _ in range(4)]
+            stats = loader.stats()
+        self.assertEqual(stats["samples"], 32)
+        self.assertGreater(stats["samples_per_second"], 0)
+        self.assertGreaterEqual(stats["blocks"], 2)
+
+        volume, _ = self.rss.lines([self.rss.bounds[0]], sort_order="inline", mask_val=0.0)
+        for patches, origins in batches:
+            self.assertEqual(patches.shape, (8, 32, 8, 1))
+            self.assert_patches(patches, origins, volume)
+
+        in_process = PatchLoader(sampler, batch_size=8, workers=0, seed=3)
+        patches, origins = next(in_process)
+        self.assert_patches(patches, origins, volume)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from rss.tests.helpers import make_segy, psdn_data
+
+
+def write_headers(path, fields, ns=10):
+    """ A SEGY file of empty traces holding the given (byte, size) header fields. """
+    num_traces = len(next(iter(fields.values())))
+    headers = np.zeros((num_traces, 60), dtype=">i4")
+    for (byte, size), values in fields.items():
+        if size == 4:
+            headers[:, (byte - 1) // 4] = values
+        else:
+            headers.view(">i2")[:, (byte - 1) // 2] = values
+
+    binary_header = np.zeros(200, dtype=">u2")
+    binary_header[8], binary_header[10], binary_header[12] = 2000, ns, 5
+
+    samples = np.zeros((num_traces, ns), dtype=">f4")
+    with open(path, "wb") as fp:
+        fp.write(b"\x40" * 3200)
+        fp.write(binary_header.tobytes())
+        fp.write(np.concatenate([headers.view(np.uint8), samples.view(np.uint8)], axis=1).tobytes())
+
+
+class TestScan(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_psdn(self):
+        from rss.api import byte_locations
+        from rss.scan import format_report, scan_segy
+
+        report = scan_segy(psdn_data)
+        self.assertEqual(report["byte_locations"], byte_locations)
+        self.assertEqual(report["bounds"], [983, 504, 983, 623])
+        self.assertEqual(report["live_traces"], 120)
+        self.assertAlmostEqual(report["bin_size"][1], 12.5, places=1)
+        self.assertIn("--inline='189-192'", format_report(report))
+
+    def test_non_standard_locations(self):
+        from rss.scan import scan_segy
+
+        # a rotated dogleg with the line numbers and coordinates moved
+        inlines, crosslines = np.meshgrid(np.arange(1000, 1060), np.arange(2000, 2200), indexing="ij")
+        live = crosslines - 2000 < 100 + 1.5 * (inlines - 1000)
+        inlines, crosslines = inlines[live], crosslines[live]
+        theta = np.deg2rad(30)
+        x = 500000 + 12.5 * (inlines - 1000) * np.cos(theta) - 25 * (crosslines - 2000) * np.sin(theta)
+        y = 6000000 + 12.5 * (inlines - 1000) * np.sin(theta) + 25 * (crosslines - 2000) * np.cos(theta)
+        num_traces = len(inlines)
+
+        segy_file = os.path.join(self.folder, "moved.sgy")
+        write_headers(segy_file, {
+            (1, 4): np.arange(1, num_traces + 1),
+            (9, 4): inlines,
+            (21, 4): crosslines,
+            (71, 2): np.full(num_traces, -100),
+            (73, 4): np.rint(100 * x),
+            (77, 4): np.rint(100 * y),
+            (115, 2): np.full(num_traces, 10),
+        })
+
+        for num_samples in (None, 2000):
+            report = scan_segy(segy_file, num_samples=num_samples, block_size=200)
+            locations = report["byte_locations"]
+            self.assertEqual(locations["inline"], (9, 4, ">i"))
+            self.assertEqual(locations["crossline"], (21, 4, ">i"))
+            self.assertEqual(locations["cdpx"], (73, 4, ">i"))
+            self.assertEqual(locations["cdpy"], (77, 4, ">i"))
+            self.assertEqual(report["bounds"], [1000, 2000, 1059, 2188])
+            self.assertEqual(report["live_traces"], num_traces)
+            np.testing.assert_allclose(report["bin_size"], [12.5, 25.0], rtol=1e-3)
+
+        self.assertEqual(report["scanned_traces"], 2000)
+
+    def test_crossline_sorted(self):
+        from rss.scan import format_report, scan_segy
+
+        crosslines, inlines = np.meshgrid(np.arange(10, 20), np.arange(1, 8), indexing="ij")
+        segy_file = os.path.join(self.folder, "crossline.sgy")
+        make_segy(segy_file, np.zeros((inlines.size, 5), dtype=np.float32),
+                  inlines=inlines.ravel(), crosslines=crosslines.ravel())
+
+        report = scan_segy(segy_file)
+        self.assertEqual(report["sort_order"], "crossline")
+        self.assertEqual(report["byte_locations"]["inline"][0], 189)
+        self.assertEqual(report["bounds"], [1, 10, 7, 19])
+
+        # moved line numbers, the inline comes first in the header
+        segy_file = os.path.join(self.folder, "moved_crossline.sgy")
+        write_headers(segy_file, {(9, 4): inlines.ravel(), (21, 4): crosslines.ravel()})
+        report = scan_segy(segy_file)
+        self.assertEqual(report["sort_order"], "crossline")
+        self.assertEqual(report["byte_locations"]["inline"], (9, 4, ">i"))
+        self.assertEqual(report["bounds"], [1, 10, 7, 19])
+        hint = [i for i in format_report(report).splitlines() if "ingestion.py" in i][0]
+        self.assertNotIn("--sort_order", hint)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from ibm2ieee import ibm2float32
+import numpy as np
+
+from rss.tests.helpers import make_segy
+
+
+class TestSegy(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.traces = rng.integers(-120, 120, (12, 50)).astype(np.float32)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_ieee2ibm(self):
+        from rss.segy import ieee2ibm
+
+        rng = np.random.default_rng(0)
+        data = rng.standard_normal(10000) * 10.0 ** rng.integers(-20, 20, 10000)
+        data = np.concatenate([[0.0, 1.0, -1.0, 0.5, 16.0, -118.625], data]).astype(np.float32)
+
+        back = ibm2float32(ieee2ibm(data))
+        np.testing.assert_array_equal(back[:6], data[:6])
+        np.testing.assert_allclose(back, data, rtol=1e-6)
+
+    def test_decode_traces(self):
+        from rss.segy import decode_traces
+
+        for binary_format in (1, 2, 3, 5, 8):
+            for byteorder in (">", "<"):
+                segy_file = os.path.join(self.folder, "test.sgy")
+                make_segy(segy_file, self.traces, binary_format, byteorder=byteorder)
+                with open(segy_file, "rb") as fp:
+                    fp.seek(3600)
+                    block = fp.read()
+
+                out = np.empty(self.traces.shape, dtype=np.float32)
+                traces = decode_traces(block, binary_format, 50, byteorder, out=out)
+                self.assertIs(traces, out)
+                np.testing.assert_array_equal(traces, self.traces)
+
+    def test_little_endian_file(self):
+        from rss.api import parse_binary_header, read_trace_data_unstructured
+
+        segy_file = os.path.join(self.folder, "little.sgy")
+        make_segy(segy_file, self.traces, 3, byteorder="<")
+
+        binary_header = parse_binary_header(segy_file)
+        self.assertEqual(binary_header["byteorder"], "<")
+        self.assertEqual(binary_header["float_format"], 3)
+        self.assertEqual(binary_header["size_of_trace"], 240 + 2 * 50)
+        self.assertEqual(binary_header["num_traces"], 12)
+        self.assertEqual(binary_header["sample_rate_ms"], 2.0)
+
+        cwd = os.getcwd()
+        os.chdir(self.folder)
+        try:
+            read_trace_data_unstructured(segy_file, binary_header)
+        finally:
+            os.chdir(cwd)
+
+        output = os.path.join(self.folder, "little")
+        np.testing.assert_array_equal(
+            np.load(os.path.join(output, "inline.npy")), 100 + np.arange(12) // 4
+        )
+        traces = np.fromfile(os.path.join(output, "data", "traces.bin"), dtype="<f4")
+        np.testing.assert_array_equal(traces.reshape(12, 50), self.traces)
+
+    def test_unsupported_format(self):
+        from rss.api import parse_binary_header
+
+        segy_file = os.path.join(self.folder, "fixed.sgy")
+        make_segy(segy_file, self.traces, 5)
+        with open(segy_file, "r+b") as fp:
+            fp.seek(3224)
+            fp.write(np.array(4, dtype=">u2").tobytes())
+
+        with self.assertRaises(RuntimeError):
+            parse_binary_header(segy_file)
+
+
+if __name__ == "__main__":
+    unittest.main()
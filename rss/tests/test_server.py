@@ -0,0 +1,119 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import zarr
+
+from rss.tests.helpers import make_test_forge, make_test_rss
+
+
+async def get(port, target, headers=None):
+    """ Minimal HTTP/1.1 GET, returns status, headers and body. """
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    request = f"GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+    for key, val in (headers or {}).items():
+        request += f"{key}: {val}\r\n"
+    writer.write((request + "\r\n").encode())
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        key, _, val = line.decode().partition(":")
+        response_headers[key.strip().lower()] = val.strip()
+    body = await reader.readexactly(int(response_headers["content-length"]))
+    writer.close()
+    return status, response_headers, body
+
+
+def to_array(headers, body):
+    shape = tuple(int(i) for i in headers["x-shape"].split(","))
+    dtype = "<f4" if headers["x-dtype"] == "float32" else "<u2"
+    return np.frombuffer(body, dtype=dtype).reshape(shape)
+
+
+class TestServer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from rss.client import rssFromFile
+        from rss.forge_client import rssFORGEClient
+
+        cls.folder = tempfile.mkdtemp()
+        cls.rss = rssFromFile(make_test_rss(cls.folder))
+
+        forge_path = os.path.join(cls.folder, "das.zarr")
+        data = np.random.default_rng(3).standard_normal((2, 4, 100))
+        make_test_forge(forge_path, data.astype(np.float32), events=[(10, 1)])
+        cls.forge = rssFORGEClient(zarr.DirectoryStore(forge_path))
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.folder)
+
+    def test_routes(self):
+        from rss.client import dequantize
+        from rss.server import rssServer
+
+        server = rssServer(client=self.rss, forge_client=self.forge, name="test")
+
+        async def main():
+            listener = await server.start(port=0)
+            port = listener.sockets[0].getsockname()[1]
+
+            # identical concurrent requests share one read
+            responses = await asyncio.gather(
+                *[get(port, "/line/inline/983") for i in range(8)]
+            )
+            self.assertTrue(all(status == 200 for status, _, _ in responses))
+            self.assertGreaterEqual(server.num_coalesced, 1)
+
+            _, headers, body = responses[0]
+            expected, _ = self.rss.line(983, sort_order="inline")
+            np.testing.assert_allclose(to_array(headers, body), expected, rtol=1e-6)
+
+            status, _, _ = await get(port, "/line/inline/983",
+                                     {"If-None-Match": headers["etag"]})
+            self.assertEqual(status, 304)
+
+            etag = server.etag("line:('inline', 983, 'float32')")
+            self.assertEqual(etag, headers["etag"])
+            self.assertEqual(headers["cache-control"], "public, no-cache")
+
+            status, headers, body = await get(port, "/line/inline/983?format=uint16")
+            min_val, max_val = [float(i) for i in headers["x-scalers"].split(",")]
+            traces, _ = dequantize(to_array(headers, body), min_val, max_val)
+            np.testing.assert_allclose(traces, expected)
+
+            crossline = self.rss.bounds[1] + 60
+            status, headers, body = await get(port, f"/trace/983/{crossline}")
+            np.testing.assert_allclose(to_array(headers, body), expected[:, 60],
+                                       rtol=1e-6)
+
+            status, headers, body = await get(port, "/slice/700")
+            np.testing.assert_allclose(to_array(headers, body)[0], expected[700],
+                                       rtol=1e-6)
+
+            status, headers, body = await get(port, "/forge/1?channels=1:3&samples=5:50")
+            line, _ = self.forge.line(1)
+            np.testing.assert_allclose(to_array(headers, body), line[1:3, 5:50],
+                                       rtol=1e-5, atol=1e-6)
+
+            status, _, _ = await get(port, "/line/inline/10")
+            self.assertEqual(status, 400)
+
+            status, _, _ = await get(port, "/nothing")
+            self.assertEqual(status, 404)
+
+            status, _, body = await get(port, "/stats")
+            self.assertIn("p99_ms", body.decode())
+
+            listener.close()
+            await listener.wait_closed()
+
+        asyncio.run(main())
@@ -0,0 +1,57 @@
+import argparse
+import time
+
+import numpy as np
+
+from rss.segy import decode_traces, ieee2ibm, sample_dtype, sample_dtypes, trace_header_size
+
+
+def make_block(num_traces, ns, binary_format, byteorder):
+    """ Random traces encoded as a block of SEGY traces, headers included. """
+    rng = np.random.default_rng(0)
+    traces = rng.integers(-100, 100, (num_traces, ns)).astype(np.float32)
+    dtype = sample_dtype(binary_format, byteorder)
+    if binary_format == 1:
+        samples = ieee2ibm(traces).astype(dtype)
+    else:
+        samples = traces.astype(dtype)
+
+    block = np.zeros((num_traces, trace_header_size + ns * dtype.itemsize), dtype=np.uint8)
+    block[:, trace_header_size:] = samples.view(np.uint8).reshape(num_traces, -1)
+    return block.tobytes()
+
+
+if __name__ == "__main__":
+    """ usage:
+    python benchmark-decode.py --num_traces=4096 --ns=1501
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--num_traces', nargs='?', type=int, default=4096,
+                        help='traces per decoded block.')
+
+    parser.add_argument('--ns', nargs='?', type=int, default=1501,
+                        help='samples per trace.')
+
+    parser.add_argument('--repeats', nargs='?', type=int, default=10,
+                        help='timed decodes per format.')
+
+    args = parser.parse_args()
+
+    out = np.empty((args.num_traces, args.ns), dtype=np.float32)
+
+    print(f"{'format':>8} {'order':>6} {'MB/s in':>10} {'Msamples/s':>11} {'traces/s':>10}")
+    for binary_format in sample_dtypes:
+        for byteorder in ('>', '<'):
+            block = make_block(args.num_traces, args.ns, binary_format, byteorder)
+            decode_traces(block, binary_format, args.ns, byteorder, out=out)
+
+            tic = time.perf_counter()
+            for _ in range(args.repeats):
+                decode_traces(block, binary_format, args.ns, byteorder, out=out)
+            elapsed = (time.perf_counter() - tic) / args.repeats
+
+            print(f"{binary_format:>8} {byteorder:>6} "
+                  f"{len(block) / elapsed / 1e6:>10.0f} "
+                  f"{out.size / elapsed / 1e6:>11.0f} "
+                  f"{args.num_traces / elapsed:>10.0f}")
@@ -0,0 +1,56 @@
+import argparse
+import json
+import subprocess
+import sys
+
+# only loaded on first use, never by importing the read path
+heavy_modules = ['IPython', 'scipy', 's3fs', 'fsspec', 'matplotlib',
+                 'tqdm', 'ebcdic', 'ibm2ieee', 'dask']
+
+measure = """
+import json, sys, time
+tic = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - tic
+heavy = sorted({{i.split('.')[0] for i in sys.modules}} & set({heavy}))
+print(json.dumps({{'seconds': elapsed, 'heavy': heavy}}))
+"""
+
+
+def import_time(module, repeats=5):
+    """ The best import time of module over fresh interpreters, and the heavy modules it loads. """
+    results = []
+    for _ in range(repeats):
+        out = subprocess.run([sys.executable, '-c', measure.format(module=module, heavy=heavy_modules)],
+                             check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.splitlines()[-1]))
+    return min(i['seconds'] for i in results), results[0]['heavy']
+
+
+if __name__ == "__main__":
+    """ usage:
+    python benchmark-import.py --max_seconds=0.5
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('modules', nargs='*',
+                        default=['rss.client', 'rss.api', 'rss.forge_client', 'rss.catalog'],
+                        help='modules to import.')
+
+    parser.add_argument('--repeats', nargs='?', type=int, default=5,
+                        help='fresh interpreters per module, the fastest counts.')
+
+    parser.add_argument('--max_seconds', nargs='?', type=float,
+                        help='fail when an import takes longer.')
+
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':>18} {'seconds':>8}  heavy modules loaded")
+    for module in args.modules:
+        seconds, heavy = import_time(module, args.repeats)
+        print(f"{module:>18} {seconds:>8.3f}  {', '.join(heavy) or '-'}")
+        if heavy or (args.max_seconds is not None and seconds > args.max_seconds):
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,55 @@
+import argparse
+import time
+
+import zarr
+
+from rss.client import packed_meta_key, rssClient
+from rss.forge_client import rssFORGEClient
+
+
+class LatencyStore(zarr.storage.KVStore):
+    """ A local store paying a fixed latency per read, like one GET to s3. """
+
+    def __init__(self, store, latency, consolidated=True):
+        super().__init__(store)
+        self.latency = latency
+        self.hidden = () if consolidated else ('.zmetadata', packed_meta_key)
+        self.gets = 0
+
+    def __getitem__(self, key):
+        if key in self.hidden:
+            raise KeyError(key)
+        self.gets += 1
+        time.sleep(self.latency)
+        return super().__getitem__(key)
+
+
+if __name__ == "__main__":
+    """ usage:
+    python benchmark-open.py psdn11_TbsdmF_full_w_AGC_Nov11 --latency_ms=30
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store', type=str,
+                        help='rss or FORGE folder, written by the ingestion scripts.')
+
+    parser.add_argument('--latency_ms', nargs='?', type=float, default=30.0,
+                        help='simulated latency of every read.')
+
+    parser.add_argument('--forge', action='store_true',
+                        help='open with rssFORGEClient.')
+
+    args = parser.parse_args()
+
+    client = rssFORGEClient if args.forge else rssClient
+
+    results = []
+    for consolidated in (False, True):
+        store = LatencyStore(zarr.DirectoryStore(args.store), args.latency_ms / 1000,
+                             consolidated=consolidated)
+        tic = time.perf_counter()
+        client(store)
+        results.append((consolidated, store.gets, time.perf_counter() - tic))
+
+    print(f"{'consolidated':>12} {'requests':>9} {'seconds':>8}")
+    for consolidated, gets, seconds in results:
+        print(f"{str(consolidated):>12} {gets:>9} {seconds:>8.3f}")
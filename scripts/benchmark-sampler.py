@@ -0,0 +1,59 @@
+import argparse
+import time
+
+from rss.sampler import PatchLoader, PatchSampler
+
+
+if __name__ == "__main__":
+    """ usage:
+    python benchmark-sampler.py psdn11_TbsdmF_full_w_AGC_Nov11 --patch=128,64,1 --workers=0,2,4
+    python benchmark-sampler.py das.zarr --kind=forge --patch=256,2000,1 --event_fraction=0.5
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('store', type=str,
+                        help='rss or FORGE folder to sample.')
+
+    parser.add_argument('--kind', nargs='?', type=str, default='rss',
+                        help='rss or forge.')
+
+    parser.add_argument('--sort_order', nargs='?', type=str, default='inline',
+                        help='sort order to sample, rss only.')
+
+    parser.add_argument('--patch', nargs='?', type=str, default='128,64,1',
+                        help='comma separated patch shape.')
+
+    parser.add_argument('--batch_size', nargs='?', type=int, default=32,
+                        help='patches per batch.')
+
+    parser.add_argument('--patches_per_block', nargs='?', type=int, default=16,
+                        help='patches cut from every fetched block of lines.')
+
+    parser.add_argument('--event_fraction', nargs='?', type=float, default=0.0,
+                        help='share of FORGE patches centred on sample_events.')
+
+    parser.add_argument('--workers', nargs='?', type=str, default='0,2,4',
+                        help='comma separated worker process counts.')
+
+    parser.add_argument('--batches', nargs='?', type=int, default=50,
+                        help='batches drawn per run.')
+
+    args = parser.parse_args()
+
+    sampler = PatchSampler(args.store, [int(i) for i in args.patch.split(',')],
+                           kind=args.kind, sort_order=args.sort_order,
+                           patches_per_block=args.patches_per_block,
+                           event_fraction=args.event_fraction)
+
+    for workers in [int(i) for i in args.workers.split(',')]:
+        with PatchLoader(sampler, args.batch_size, workers=workers) as loader:
+            # leave the worker start up out of the rate
+            next(loader)
+            tic = time.perf_counter()
+            for _ in range(args.batches):
+                next(loader)
+            elapsed = time.perf_counter() - tic
+            stats = loader.stats()
+
+        print(f"{workers:3d} workers: {args.batches * args.batch_size / elapsed:9.1f} samples/s, "
+              f"{stats['seconds_waiting']:.2f} s waiting for batches")
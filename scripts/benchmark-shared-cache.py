@@ -0,0 +1,84 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import time
+
+import zarr
+
+from rss.cache import SharedMemoryCache
+from rss.client import rssClient
+
+
+class LatencyStore(zarr.storage.KVStore):
+    """ A local store paying a fixed latency per read, like one GET to s3. """
+
+    def __init__(self, store, latency):
+        super().__init__(store)
+        self.latency = latency
+        self.gets = 0
+
+    def __getitem__(self, key):
+        self.gets += 1
+        time.sleep(self.latency)
+        return super().__getitem__(key)
+
+
+def read_lines(path, lines, sort_order, latency, cache_name):
+    """ Read every line in a worker, returns the reads that reached the store. """
+    store = LatencyStore(zarr.DirectoryStore(path), latency)
+    cache = SharedMemoryCache(cache_name) if cache_name else None
+    rss = rssClient(store, cache=cache)
+    gets = store.gets
+    for line in lines:
+        rss.line(line, sort_order=sort_order)
+    return store.gets - gets
+
+
+if __name__ == "__main__":
+    """ usage:
+    python benchmark-shared-cache.py psdn11_TbsdmF_full_w_AGC_Nov11 --workers=8 --num_lines=50
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument('store', type=str,
+                        help='rss folder, written by ingestion.py.')
+
+    parser.add_argument('--workers', nargs='?', type=int, default=4,
+                        help='worker processes reading the same lines.')
+
+    parser.add_argument('--num_lines', nargs='?', type=int, default=20,
+                        help='lines every worker reads.')
+
+    parser.add_argument('--sort_order', nargs='?', type=str, default='inline',
+                        help='sort order to read.')
+
+    parser.add_argument('--latency_ms', nargs='?', type=float, default=30.0,
+                        help='simulated latency of every read.')
+
+    parser.add_argument('--cache_size', nargs='?', type=int, default=1024 ** 3,
+                        help='bytes of the shared memory segment.')
+
+    args = parser.parse_args()
+
+    root = zarr.open(args.store, mode='r')
+    axis = 0 if args.sort_order == 'inline' else 1
+    first, last = root['bounds'][axis], root['bounds'][axis + 2]
+    lines = list(range(first, min(first + args.num_lines, last + 1)))
+
+    name = f"rss-benchmark-{os.getpid()}"
+    cache = SharedMemoryCache(name, size=args.cache_size)
+    context = multiprocessing.get_context('spawn')
+
+    print(f"{'cache':>8} {'store reads':>12} {'seconds':>8}")
+    try:
+        for cache_name in (None, name):
+            tic = time.perf_counter()
+            with ProcessPoolExecutor(args.workers, mp_context=context) as pool:
+                gets = sum(pool.map(read_lines, *zip(*[
+                    (args.store, lines, args.sort_order, args.latency_ms / 1000, cache_name)
+                ] * args.workers)))
+            label = 'shared' if cache_name else 'private'
+            print(f"{label:>8} {gets:>12} {time.perf_counter() - tic:>8.3f}")
+    finally:
+        cache.close()
+        cache.unlink()
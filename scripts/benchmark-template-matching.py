@@ -0,0 +1,54 @@
+import argparse
+import time
+
+import numpy as np
+
+from rss.forge_detect import TemplateBank
+
+if __name__ == "__main__":
+    """ usage:
+    python benchmark-template-matching.py --num_templates=8 --num_channels=1280
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--num_templates', nargs='?', type=int, default=8,
+                        help='number of templates in the bank.')
+
+    parser.add_argument('--num_channels', nargs='?', type=int, default=1280,
+                        help='channels per recording (1280 for FORGE).')
+
+    parser.add_argument('--ns', nargs='?', type=int, default=30000,
+                        help='samples per recording (30000 for FORGE).')
+
+    parser.add_argument('--nt', nargs='?', type=int, default=800,
+                        help='template length in samples.')
+
+    parser.add_argument('--repeat', nargs='?', type=int, default=3,
+                        help='number of recordings to correlate.')
+
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    templates = rng.standard_normal(
+        (args.num_templates, args.num_channels, args.nt)).astype(np.float32)
+    data = rng.standard_normal((args.num_channels, args.ns)).astype(np.float32)
+
+    tic = time.perf_counter()
+    bank = TemplateBank(templates)
+    print(f"template spectra: {time.perf_counter() - tic:.3f} s "
+          f"(nfft={bank.nfft}, step={bank.step})")
+
+    # a correlation is one template channel against one lag of one channel
+    lags = args.ns - args.nt + 1
+    per_recording = args.num_templates * args.num_channels * lags
+
+    bank.correlate(data)
+    tic = time.perf_counter()
+    for i in range(args.repeat):
+        bank.correlate(data)
+    elapsed = (time.perf_counter() - tic) / args.repeat
+
+    print(f"{elapsed:.3f} s per recording, "
+          f"{per_recording / elapsed:.3e} correlations per second, "
+          f"{per_recording * args.nt / elapsed:.3e} multiply-adds per second "
+          f"(direct equivalent)")
@@ -0,0 +1,70 @@
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import zarr
+
+from rss.client import rssClient
+
+
+class LatencyStore(zarr.storage.KVStore):
+    """ Adds a fixed latency to every read, to emulate blob storage. """
+
+    def __init__(self, store, latency):
+        super().__init__(store)
+        self.latency = latency
+
+    def __getitem__(self, key):
+        time.sleep(self.latency)
+        return super().__getitem__(key)
+
+
+if __name__ == "__main__":
+    """ usage:
+    python benchmark-threads.py psdn_test_data --sort_order=crossline --latency_ms=20
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('rss', type=str,
+                        help='rss folder to read.')
+
+    parser.add_argument('--sort_order', nargs='?', type=str, default='inline',
+                        help='sort order to read.')
+
+    parser.add_argument('--latency_ms', nargs='?', type=float, default=0.0,
+                        help='latency added to every store read.')
+
+    parser.add_argument('--threads', nargs='?', type=str, default='1,2,4,8,16',
+                        help='comma separated thread counts.')
+
+    parser.add_argument('--bulk', action='store_true',
+                        help='read all the lines with one rssClient.lines call instead.')
+
+    args = parser.parse_args()
+
+    store = zarr.DirectoryStore(args.rss)
+    if args.latency_ms > 0:
+        store = LatencyStore(store, args.latency_ms / 1000.0)
+
+    # a cold client per run, so every run pays for its fetches
+    bounds = zarr.open(zarr.DirectoryStore(args.rss), mode='r')['bounds'][:]
+    if args.sort_order == 'inline':
+        lines = range(bounds[0], bounds[2] + 1)
+    else:
+        lines = range(bounds[1], bounds[3] + 1)
+
+    for num_threads in [int(i) for i in args.threads.split(',')]:
+        rss = rssClient(store, cache_size=0)
+
+        tic = time.perf_counter()
+        if args.bulk:
+            traces, _ = rss.lines(lines, sort_order=args.sort_order, workers=num_threads)
+            nbytes = traces.nbytes
+        else:
+            with ThreadPoolExecutor(max_workers=num_threads) as pool:
+                nbytes = sum(traces.nbytes for traces, _ in pool.map(
+                    lambda line: rss.line(line, sort_order=args.sort_order), lines))
+        elapsed = time.perf_counter() - tic
+
+        print(f"{num_threads:3d} threads: {len(lines) / elapsed:9.1f} lines/s, "
+              f"{nbytes / elapsed / 1024 ** 2:9.1f} MB/s decoded")
@@ -0,0 +1,36 @@
+import argparse
+
+from rss.api import byte_locations
+from rss.export import export_segy
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('rss', type=str,
+                        help='rss folder to export')
+
+    parser.add_argument('segy_file', type=str,
+                        help='output segy file')
+
+    parser.add_argument('--sort_order', nargs='?', type=str, default='inline',
+                        help='sort order of the traces in the output.')
+
+    parser.add_argument('--format', nargs='?', type=int,
+                        help='1 for IBM or 5 for IEEE floats, defaults to the ingested format.')
+
+    parser.add_argument('--workers', nargs='?', type=int,
+                        help='number of encoding threads.')
+
+    parser.add_argument('--parallel_write', action='store_true',
+                        help='write batches to their byte ranges in parallel.')
+
+    args = parser.parse_args()
+
+    num_traces = export_segy(args.rss,
+                             args.segy_file,
+                             sort_order=args.sort_order,
+                             binary_format=args.format,
+                             byte_locations=byte_locations,
+                             workers=args.workers,
+                             parallel_write=args.parallel_write)
+
+    print(f"wrote {num_traces} traces to {args.segy_file}")
@@ -11,8 +11,11 @@ import zarr
 from rss.api import (parse_ebcdic, 
                          parse_binary_header, 
                              read_trace_data_unstructured)
-from rss.forge_api import (get_forge_root_s3, make_forge_zarr)
+from rss.api import consolidate, write_headers
+from rss.forge_api import (extend_forge_zarr, get_forge_root_s3, header_fields,
+                           make_forge_zarr, write_time_index)
 from rss.forge_api import byte_locations as forge_byte_locations
+from rss.profile import StageProfiler, stage
 
 forge_headers = ['RECTVD', 'NSAMPTRC', 'FIBREDIST', 'RECMD']
 
@@ -51,13 +54,17 @@ def parse_silxia_name(line):
     return url, segy_file
 
 
-def extract_line(segy_file, binary_header, byte_locations=forge_byte_locations):
+def extract_line(segy_file, binary_header, byte_locations=forge_byte_locations,
+                 profiler=None):
     filename = os.path.splitext(segy_file)[0]
     if not os.path.exists(os.path.join(filename, "data", "traces.bin")):
         read_trace_data_unstructured(segy_file, binary_header, 
-                                         byte_locations=forge_byte_locations)
-    data = np.fromfile(f'{filename}/data/traces.bin', dtype=np.float32)
-    data.shape = (-1, binary_header['ns'])    
+                                         byte_locations=forge_byte_locations,
+                                         profiler=profiler)
+    with stage(profiler, "read") as read:
+        data = np.fromfile(f'{filename}/data/traces.bin', dtype=np.float32)
+        data.shape = (-1, binary_header['ns'])    
+        read.bytes_out = data.nbytes
 
     headers = {key:np.load(f'{filename}/{key}.npy') for 
                 key in forge_headers}
@@ -72,23 +79,34 @@ def cleanup(line):
     shutil.rmtree(filename)
 
 
-def ingest_line(das, iline, line):
+def ingest_line(das, iline, line, profiler=None):
     url, segy_file = parse_silxia_name(line)
 
     if not os.path.exists(segy_file):
-        download(url)
+        with stage(profiler, "download") as downloading:
+            download(url)
+            downloading.bytes_out = os.path.getsize(segy_file)
     
     data, headers = extract_line(segy_file, config, 
-                                byte_locations=forge_byte_locations)
-    traces, scalers = to_uint16(data)
+                                byte_locations=forge_byte_locations,
+                                profiler=profiler)
+    with stage(profiler, "quantize", bytes_in=data.nbytes) as quantizing:
+        traces, scalers = to_uint16(data)
+        quantizing.bytes_out = traces.nbytes
     for key,val in headers.items():
         das.create_dataset(key, data=val, overwrite=True)
+    # all the trace headers as columns, the same channels in every recording,
+    # so they are written with the first recording ingested only
+    if "headers" not in das:
+        write_headers(das, os.path.splitext(segy_file)[0], fields=header_fields)
 
     assert(traces.shape[0] == config['num_traces'])
     assert(traces.shape[1] == config['ns'])
 
-    das["seismic"][..., iline] = traces
-    das["scalers"][iline, :] = scalers
+    # compression and the upload to s3
+    with stage(profiler, "write", bytes_in=traces.nbytes):
+        das["seismic"][..., iline] = traces
+        das["scalers"][iline, :] = scalers
 
     
 def log_success(line):
@@ -122,6 +140,12 @@ if __name__ == "__main__":
     parser.add_argument('--init_events', nargs='?', type=bool, default=True,
                             help='Preload the files with events in them.')
     
+    parser.add_argument('--append', nargs='?', type=bool, default=False,
+                            help='Add the recordings of get_all_silixa.sh beyond those in the store.')
+
+    parser.add_argument('--profile', nargs='?', type=str,
+                            help='json file for the per stage timings and bytes of the ingestion.')
+
     args = parser.parse_args()
     
     if args.init_zarr:
@@ -137,6 +161,8 @@ if __name__ == "__main__":
         das['get_all_silixa'] = lines 
 
         das['segy_filenames'] = [parse_silxia_name(i)[1] for i in lines]
+        # the recordings by start time, for access by wall-clock time
+        write_time_index(das)
 
         with open('FORGE-Microseismic-Lookup.txt', 'r') as fp:
             lines = fp.readlines()
@@ -153,19 +179,40 @@ if __name__ == "__main__":
         for i, keyval in enumerate(config.items()):
             key, val = keyval
             das['binary_header'][i] = {key : val}
+        consolidate(das)
     else:
         das = get_forge_root_s3(args.zarr_out)    
 
+    if args.append:
+        with open('get_all_silixa.sh', 'r') as fp:
+            lines = fp.readlines()
+        num_lines = das['seismic'].shape[-1]
+        new_lines = lines[num_lines:]
+        print (f"Appending {len(new_lines)} recordings.")
+        extend_forge_zarr(das, len(new_lines),
+                          filenames=[parse_silxia_name(i)[1] for i in new_lines],
+                          commands=new_lines)
+
     if args.init_events:
         load_lines = np.unique(das['sample_events'][:,1])
     else:
         load_lines = range(args.min_line, args.max_line)
         
+    profiler = StageProfiler().start() if args.profile else None
+
     lines = das['get_all_silixa']
     for il in tqdm(load_lines):
         try:
-            ingest_line(das, il, lines[il])
+            ingest_line(das, il, lines[il], profiler=profiler)
             cleanup(lines[il])
             log_success(lines[il])
         except:
             log_error(lines[il])
+
+    consolidate(das)
+
+    if profiler is not None:
+        profiler.stop()
+        print(profiler.summary())
+        profiler.to_json(args.profile)
+
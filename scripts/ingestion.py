@@ -1,9 +1,13 @@
 import argparse
 import os
 import shutil
+import sys
 
-from rss.api import (byte_locations, compressed_zarr,
+import zarr
+
+from rss.api import (append_zarr, byte_locations, compressed_zarr,
                      parse_ebcdic, parse_binary_header, read_trace_data)
+from rss.profile import StackSampler, StageProfiler
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
@@ -26,10 +30,43 @@ if __name__ == "__main__":
                         help='overrider coords scalar.')
 
     parser.add_argument('--sort_order', nargs='?', type=str, default='inline',
-                        help='sort order of zarr.')
+                        help='sort order of zarr, inline, crossline or gather for prestack data.')
+
+    parser.add_argument('--offset', nargs='?', type=str, default='37-40',
+                        help='offset, or angle, byte location of the gather sort order.')
+
+    parser.add_argument('--gathers_per_chunk', nargs='?', type=int, default=2,
+                        help='inlines and crosslines of the square of gathers in one chunk.')
+
+    parser.add_argument('--layout', nargs='?', type=str, default='dense',
+                        help='dense or sparse, sparse stores only tiles with live traces.')
+
+    parser.add_argument('--tile_size', nargs='?', type=int, default=64,
+                        help='traces per tile of the sparse layout.')
     
+    parser.add_argument('--append_to', nargs='?', type=str,
+                        help='existing rss folder to append the traces to, in every stored sort order.')
+
+    parser.add_argument('--scan', action='store_true',
+                        help='only scan the trace headers and report the geometry.')
+
+    parser.add_argument('--sample', nargs='?', type=int, default=10000,
+                        help='number of trace headers the scan reads, 10000 by default, 0 reads all of them.')
+
+    parser.add_argument('--profile', nargs='?', type=str,
+                        help='json file for the per stage timings and bytes of the ingestion.')
+
+    parser.add_argument('--sample_stacks', action='store_true',
+                        help='also sample the hottest functions into the profile.')
+
     args = parser.parse_args()
 
+    if args.scan:
+        from rss.scan import format_report, scan_segy
+
+        print(format_report(scan_segy(args.segy_file, num_samples=args.sample or None)))
+        sys.exit(0)
+
     def to_bytes(x):
         mn, mx = x.split('-')
         
@@ -58,14 +95,43 @@ if __name__ == "__main__":
     print (binary_header)
     print ("")
 
+    path = os.path.splitext(os.path.basename(args.segy_file))[0]
+
+    if args.append_to:
+        root = zarr.open(args.append_to, mode='r')
+        sort_orders = [i for i in ('inline', 'crossline') if i in root]
+        for sort_order in sort_orders:
+            read_trace_data(args.segy_file,
+                            binary_header,
+                            sort_order=sort_order,
+                            scalco=args.override_scalco,
+                            byte_locations=byte_locations)
+
+        append_zarr(args.segy_file, args.append_to)
+        shutil.rmtree(path)
+        sys.exit(0)
+
+    profiler = None
+    if args.profile:
+        profiler = StageProfiler(StackSampler() if args.sample_stacks else None)
+        profiler.start()
+
     read_trace_data(args.segy_file,
                     binary_header,
                     sort_order=args.sort_order,
                     scalco=args.override_scalco,
-                    byte_locations=byte_locations)
+                    byte_locations=byte_locations,
+                    profiler=profiler,
+                    offset_location=to_bytes(args.offset))
+
+    compressed_zarr(args.segy_file, sort_order=args.sort_order,
+                    layout=args.layout, tile_size=args.tile_size,
+                    profiler=profiler, gathers_per_chunk=args.gathers_per_chunk)
+
+    if profiler is not None:
+        profiler.stop()
+        print(profiler.summary())
+        profiler.to_json(args.profile)
 
-    compressed_zarr(args.segy_file, sort_order=args.sort_order)
-   
-    path = os.path.splitext(os.path.basename(args.segy_file))[0]
     sort_order = args.sort_order
     shutil.rmtree(os.path.join(path, f'{sort_order}s'))
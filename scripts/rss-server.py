@@ -0,0 +1,55 @@
+import argparse
+
+import zarr
+
+from rss.server import rssServer
+
+if __name__ == "__main__":
+    """ usage:
+    python rss-server.py --rss=psdn11_TbsdmF_full_w_AGC_Nov11 --port=8080
+    python rss-server.py --forge=s3://forge-das-rss/das.zarr --port=8080
+    """
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument('--rss', nargs='?', type=str,
+                        help='rss data to serve, a folder or an s3:// uri.')
+
+    parser.add_argument('--forge', nargs='?', type=str,
+                        help='FORGE DAS data to serve, a folder or an s3:// uri.')
+
+    parser.add_argument('--host', nargs='?', type=str, default='127.0.0.1',
+                        help='interface to listen on.')
+
+    parser.add_argument('--port', nargs='?', type=int, default=8080,
+                        help='port to listen on.')
+
+    parser.add_argument('--cache_size', nargs='?', type=int, default=2048,
+                        help='size of the shared chunk cache in MB.')
+
+    parser.add_argument('--workers', nargs='?', type=int, default=16,
+                        help='number of threads reading from the store.')
+
+    args = parser.parse_args()
+
+    cache_size = args.cache_size * 1024 ** 2
+
+    client = None
+    if args.rss:
+        from rss.client import rssClient, rssFromS3
+        if args.rss.startswith('s3://'):
+            client = rssFromS3(args.rss, cache_size=cache_size)
+        else:
+            client = rssClient(zarr.DirectoryStore(args.rss), cache_size=cache_size)
+
+    forge_client = None
+    if args.forge:
+        from rss.forge_client import rssFORGEClient, rssFORGEFromS3
+        if args.forge.startswith('s3://'):
+            forge_client = rssFORGEFromS3(args.forge, cache_size=cache_size)
+        else:
+            forge_client = rssFORGEClient(zarr.DirectoryStore(args.forge),
+                                          cache_size=cache_size)
+
+    server = rssServer(client=client, forge_client=forge_client,
+                       name=f"{args.rss}:{args.forge}", workers=args.workers)
+    server.run(host=args.host, port=args.port)
@@ -22,7 +22,6 @@ setup(
 
     # This is for getting through appveyor, install tensorflow_gpu if you can.
     install_requires=["numpy", 
-                      "ebcdic", 
                       "ibm2ieee", 
                       "tqdm",
                       'numcodecs', 
@@ -37,7 +36,7 @@ setup(
     #
     # Similar to `install_requires` above, these must be valid existing
     # projects.
-    extras_require={},
+    extras_require={"dask": ["dask[array]"]},
     # If there are data files included in your packages that need to be
     # installed, specify them here.
     #